@@ -0,0 +1,119 @@
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, func, or_, select
+
+from models import db, Question, Result, User
+from shards import result_shards
+
+PERCENTILES = (25, 50, 75, 90)
+
+# Строка результата для шаблонов: user/test подставляются из основной БД.
+ResultRow = namedtuple('ResultRow', 'id user_id test_id score total_questions date_completed user test')
+RESULT_COLUMNS = (Result.id, Result.user_id, Result.test_id, Result.score, Result.total_questions,
+                  Result.date_completed)
+
+
+def question_count(test_id):
+    return db.session.query(func.count(Question.id)).filter(Question.test_id == test_id).scalar()
+
+
+def _rows(test_id, stmt):
+    with result_shards.connect(test_id) as conn:
+        return conn.execute(stmt).all()
+
+
+def summary(test_id):
+    # Процент считается от числа вопросов каждой попытки: при draw_count оно
+    # меньше числа вопросов теста.
+    percent = Result.score * 100.0 / func.nullif(Result.total_questions, 0)
+    count, mean, low, high, mean_percent = _rows(test_id, (
+        select(func.count(Result.id), func.avg(Result.score), func.min(Result.score), func.max(Result.score),
+               func.avg(percent))
+        .where(Result.test_id == test_id)
+    ))[0]
+    return {'attempts': count, 'mean': mean, 'min': low, 'max': high, 'mean_percent': mean_percent}
+
+
+def percentiles(test_id, attempts, points=PERCENTILES):
+    # Nearest-rank по индексу (test_id, score): по одному LIMIT 1 OFFSET k на точку.
+    values = {}
+    if not attempts:
+        return values
+
+    for p in points:
+        offset = max(0, -(-p * attempts // 100) - 1)
+        rows = _rows(test_id, (
+            select(Result.score)
+            .where(Result.test_id == test_id)
+            .order_by(Result.score)
+            .offset(offset)
+            .limit(1)
+        ))
+        values[p] = rows[0][0] if rows else None
+    return values
+
+
+def histogram(test_id):
+    # (счет, вопросов в попытке, попыток)
+    return _rows(test_id, (
+        select(Result.score, Result.total_questions, func.count(Result.id))
+        .where(Result.test_id == test_id)
+        .group_by(Result.score, Result.total_questions)
+        .order_by(Result.total_questions, Result.score)
+    ))
+
+
+def attempts_per_day(test_id, days=30):
+    day = func.date(Result.date_completed)
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+    return _rows(test_id, (
+        select(day, func.count(Result.id))
+        .where(Result.test_id == test_id, Result.date_completed >= since)
+        .group_by(day)
+        .order_by(day)
+    ))
+
+
+def encode_cursor(result):
+    return f'{result.date_completed.isoformat()}_{result.id}'
+
+
+def decode_cursor(cursor):
+    try:
+        stamp, result_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(stamp), int(result_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def results_page(test_id, before=None, limit=50):
+    stmt = select(*RESULT_COLUMNS).where(Result.test_id == test_id)
+
+    cursor = decode_cursor(before) if before else None
+    if cursor:
+        stamp, result_id = cursor
+        stmt = stmt.where(or_(
+            Result.date_completed < stamp,
+            and_(Result.date_completed == stamp, Result.id < result_id),
+        ))
+
+    rows = _rows(test_id, stmt.order_by(Result.date_completed.desc(), Result.id.desc()).limit(limit + 1))
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    rows = rows[:limit]
+
+    users = {}
+    if rows:
+        users = {user.id: user for user in User.query.filter(User.id.in_({row.user_id for row in rows}))}
+    return [ResultRow(*row, user=users.get(row.user_id), test=None) for row in rows], next_cursor
+
+
+def test_analytics(test_id):
+    stats = summary(test_id)
+    return {
+        'question_count': question_count(test_id),
+        'summary': stats,
+        'percentiles': percentiles(test_id, stats['attempts']),
+        'histogram': histogram(test_id),
+        'attempts_per_day': attempts_per_day(test_id),
+    }
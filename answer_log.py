@@ -0,0 +1,241 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import and_, bindparam, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Answer, Question, Option, QuestionStat, OptionStat
+from shards import result_shards
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerLog:
+    # Ответы копятся в памяти и пишутся пачкой: INSERT в answers и
+    # инкременты счётчиков question_stats/option_stats в одной транзакции.
+    # С шардами ответы пишутся в шард теста, счётчики — в основную БД.
+
+    def __init__(self, max_pending=200, max_delay=2.0):
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.written = 0
+        self.dropped = 0
+        self._pending = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def record(self, attempt_id, user_id, test_id, question_id, option_id, is_correct, time_taken_ms=None):
+        with self._lock:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append({
+                'attempt_id': attempt_id,
+                'user_id': user_id,
+                'test_id': test_id,
+                'question_id': question_id,
+                'option_id': option_id,
+                'is_correct': is_correct,
+                'time_taken_ms': time_taken_ms,
+            })
+            due = (len(self._pending) >= self.max_pending
+                   or time.monotonic() - self._oldest >= self.max_delay)
+
+        if due:
+            # Ошибка записи не должна ломать ответ участнику: строки остаются
+            # в очереди до следующего сброса.
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось записать ответы, в очереди: %d', self.pending())
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+                self._oldest = None
+            if not rows:
+                return 0
+
+            groups = result_shards.split(rows)
+            if groups[0][0] is None:
+                try:
+                    self._write(rows)
+                    written = rows
+                except IntegrityError:
+                    written = self._write_valid(self._write, rows, requeue=True)
+                except Exception:
+                    self._requeue(rows)
+                    raise
+                self.written += len(written)
+                return len(rows)
+
+            # С шардами: ответы — транзакцией в каждом шарде, затем счётчики
+            # записанных ответов — одной транзакцией в основной БД. Пачки
+            # неудачных шардов возвращаются в очередь; уже записанные ответы
+            # не возвращаются, даже если не запишутся счётчики.
+            written = []
+            try:
+                for index, (engine, group) in enumerate(groups):
+                    try:
+                        with engine.begin() as conn:
+                            conn.execute(insert(Answer), group)
+                    except Exception:
+                        self._requeue([row for _, rest in groups[index:] for row in rest])
+                        raise
+                    written.extend(group)
+            finally:
+                if written:
+                    try:
+                        self._write_stats(written)
+                    except IntegrityError:
+                        # В шардах нет внешних ключей: ответы на удаленные
+                        # вопросы туда попали и убираются вслед за счётчиками.
+                        valid = self._write_valid(self._write_stats, written)
+                        kept = {id(row) for row in valid}
+                        self._forget([row for row in written if id(row) not in kept])
+                        written = valid
+                    self.written += len(written)
+            return len(rows)
+
+    def _write(self, rows):
+        question_deltas, option_deltas = self._deltas(rows)
+        with db.engine.begin() as conn:
+            conn.execute(insert(Answer), rows)
+            self._apply_question_deltas(conn, question_deltas)
+            self._apply_option_deltas(conn, option_deltas)
+
+    def _write_stats(self, rows):
+        question_deltas, option_deltas = self._deltas(rows)
+        with db.engine.begin() as conn:
+            self._apply_question_deltas(conn, question_deltas)
+            self._apply_option_deltas(conn, option_deltas)
+
+    def _write_valid(self, write, rows, requeue=False):
+        # Ошибка целостности повтором не лечится: ответы на вопросы и
+        # варианты, которых уже нет (тест удален, пока ответ ждал в очереди),
+        # отбрасываются, остальные пишутся заново. Если пачка снова не
+        # проходит, она отбрасывается целиком, чтобы не блокировать журнал.
+        try:
+            questions, options = self._existing(rows)
+        except Exception:
+            if requeue:
+                self._requeue(rows)
+            raise
+
+        valid = []
+        orphans = []
+        for row in rows:
+            if row['question_id'] in questions and (row['option_id'] is None or row['option_id'] in options):
+                valid.append(row)
+            else:
+                orphans.append(row)
+        self._drop(orphans, 'вопрос или вариант удален')
+
+        if valid:
+            try:
+                write(valid)
+            except IntegrityError:
+                logger.exception('Ошибка целостности при записи ответов')
+                self._drop(valid, 'ошибка целостности')
+                return []
+            except Exception:
+                if requeue:
+                    self._requeue(valid)
+                raise
+        return valid
+
+    def _existing(self, rows):
+        question_ids = {row['question_id'] for row in rows}
+        option_ids = {row['option_id'] for row in rows if row['option_id'] is not None}
+        with db.engine.connect() as conn:
+            questions = set(conn.scalars(select(Question.id).where(Question.id.in_(question_ids))))
+            options = set(conn.scalars(select(Option.id).where(Option.id.in_(option_ids)))) if option_ids else set()
+        return questions, options
+
+    def _drop(self, rows, reason):
+        if not rows:
+            return
+        self.dropped += len(rows)
+        for row in rows:
+            logger.warning('Ответ отброшен (%s): попытка %s, тест %s, вопрос %s, вариант %s', reason,
+                           row['attempt_id'], row['test_id'], row['question_id'], row['option_id'])
+
+    def _forget(self, rows):
+        for engine, group in result_shards.split(rows):
+            with engine.begin() as conn:
+                conn.execute(
+                    delete(Answer).where(and_(Answer.attempt_id == bindparam('a_id'),
+                                              Answer.question_id == bindparam('q_id'))),
+                    [{'a_id': row['attempt_id'], 'q_id': row['question_id']} for row in group],
+                )
+
+    def _requeue(self, rows):
+        with self._lock:
+            self._pending[:0] = rows
+            self._oldest = self._oldest or time.monotonic()
+
+    def _deltas(self, rows):
+        question_deltas = {}
+        option_deltas = {}
+        for row in rows:
+            delta = question_deltas.setdefault(row['question_id'], [0, 0, 0, 0])
+            delta[0] += 1
+            delta[1] += 1 if row['is_correct'] else 0
+            if row['time_taken_ms'] is not None:
+                delta[2] += 1
+                delta[3] += row['time_taken_ms']
+            if row['option_id'] is not None:
+                key = (row['option_id'], row['question_id'])
+                option_deltas[key] = option_deltas.get(key, 0) + 1
+        return question_deltas, option_deltas
+
+    def _apply_question_deltas(self, conn, deltas):
+        table = QuestionStat.__table__
+        existing = set(conn.scalars(select(table.c.question_id).where(table.c.question_id.in_(list(deltas)))))
+        missing = [q_id for q_id in deltas if q_id not in existing]
+        if missing:
+            conn.execute(insert(table), [
+                {'question_id': q_id, 'answers': 0, 'correct': 0, 'timed_answers': 0, 'total_time_ms': 0}
+                for q_id in missing
+            ])
+
+        conn.execute(
+            update(table)
+            .where(table.c.question_id == bindparam('q_id'))
+            .values(
+                answers=table.c.answers + bindparam('d_answers'),
+                correct=table.c.correct + bindparam('d_correct'),
+                timed_answers=table.c.timed_answers + bindparam('d_timed'),
+                total_time_ms=table.c.total_time_ms + bindparam('d_time'),
+            ),
+            [
+                {'q_id': q_id, 'd_answers': d[0], 'd_correct': d[1], 'd_timed': d[2], 'd_time': d[3]}
+                for q_id, d in deltas.items()
+            ],
+        )
+
+    def _apply_option_deltas(self, conn, deltas):
+        if not deltas:
+            return
+
+        table = OptionStat.__table__
+        option_ids = [option_id for option_id, _ in deltas]
+        existing = set(conn.scalars(select(table.c.option_id).where(table.c.option_id.in_(option_ids))))
+        missing = [(o_id, q_id) for o_id, q_id in deltas if o_id not in existing]
+        if missing:
+            conn.execute(insert(table), [
+                {'option_id': o_id, 'question_id': q_id, 'picks': 0} for o_id, q_id in missing
+            ])
+
+        conn.execute(
+            update(table)
+            .where(table.c.option_id == bindparam('o_id'))
+            .values(picks=table.c.picks + bindparam('d_picks')),
+            [{'o_id': o_id, 'd_picks': picks} for (o_id, _), picks in deltas.items()],
+        )
@@ -1,16 +1,98 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
-from models import db, User, Test, Question, Option, Result
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context, abort
+from models import db, User, Test, Question, Result, QuestionStat, OptionStat
+from importer import import_stream
+from catalogue import CatalogueCache, CataloguePage
+from attempts import make_attempt_store, StaleAnswer
+from db_engine import configure_engine
+from shards import result_shards
+from compiled import CompiledTestCache
+import analytics
+import summaries
+from querycount import install_query_budgets
+from instrumentation import Metrics, SamplingProfiler, configure_logging, install_instrumentation
+from answer_log import AnswerLog
+import migrations
+import explain
+from sqlalchemy import insert
 from sqlalchemy.orm import joinedload
 from functools import wraps
 import os
-import random
+import time
+import atexit
+import logging
 import json
+import click
+from flask.cli import AppGroup
 import config
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash
+from hashing import PasswordHasher, HashQueueFull
+from deletion import DeletionWorker, hide_test
+from deadlines import DeadlineSweeper
+import exporter
+import drafts
+import selection
+import search
+import webcache
 
 app = Flask(__name__)
 app.config.from_object(config)
+webcache.install_bytecode_cache(app, app.config['JINJA_CACHE_DIR'])
+assets = webcache.Assets(app)
+configure_logging(app.config['LOG_LEVEL'], app.config['LOG_FORMAT'])
+logger = logging.getLogger(__name__)
 db.init_app(app)
+configure_engine(app)
+result_shards.init_app(app)
+
+catalogue = CatalogueCache(max_entries=app.config['CATALOGUE_CACHE_SIZE'],
+                           ttl=app.config['CATALOGUE_CACHE_TTL'])
+attempts = make_attempt_store(app.config)
+search_cache = search.CandidateCache(max_entries=app.config['SEARCH_CACHE_SIZE'],
+                                     ttl=app.config['SEARCH_CACHE_TTL'])
+compiled_tests = CompiledTestCache(max_bytes=app.config['COMPILED_CACHE_MAX_BYTES'],
+                                   ttl=app.config['COMPILED_CACHE_TTL'])
+answer_log = AnswerLog(max_pending=app.config['ANSWER_LOG_BATCH'],
+                       max_delay=app.config['ANSWER_LOG_MAX_DELAY'])
+password_hasher = PasswordHasher(method=app.config['PASSWORD_HASH_METHOD'],
+                                 workers=app.config['PASSWORD_HASH_WORKERS'],
+                                 max_queue=app.config['PASSWORD_HASH_MAX_QUEUE'],
+                                 timeout=app.config['PASSWORD_HASH_TIMEOUT'])
+atexit.register(password_hasher.shutdown)
+deletion_worker = DeletionWorker(app, batch_size=app.config['DELETE_BATCH'], lease=app.config['DELETE_LEASE'])
+deadline_sweeper = DeadlineSweeper(app, lambda attempt_id: expire_attempt(attempt_id),
+                                   tick=app.config['SWEEPER_TICK'], slots=app.config['SWEEPER_SLOTS'])
+
+metrics = Metrics()
+profiler = None
+if app.config['PROFILER_ENABLED']:
+    profiler = SamplingProfiler(app.config['PROFILER_DIR'], interval=app.config['PROFILER_INTERVAL'])
+    profiler.start()
+
+with app.app_context():
+    install_instrumentation(app, db.engine, metrics, profiler)
+    install_query_budgets(app, db.engine,
+                          config.query_budgets(app.config['ATTEMPT_STORE'], result_shards.count),
+                          enforce=app.config['QUERY_BUDGET_ENFORCE'])
+
+metrics.gauge('catalogue_cache_hits', 'Попадания в кэш каталога.', lambda: catalogue.hits)
+metrics.gauge('catalogue_cache_misses', 'Промахи кэша каталога.', lambda: catalogue.misses)
+metrics.gauge('compiled_tests_bytes', 'Оценочный объем скомпилированных тестов.', lambda: compiled_tests.bytes)
+metrics.gauge('compiled_tests_hits', 'Попадания в кэш скомпилированных тестов.', lambda: compiled_tests.hits)
+metrics.gauge('compiled_tests_misses', 'Промахи кэша скомпилированных тестов.', lambda: compiled_tests.misses)
+metrics.gauge('password_hash_in_flight', 'Хеширований паролей в очереди и в работе.', lambda: password_hasher.in_flight)
+metrics.gauge('password_hash_rejected', 'Отклонено из-за переполнения очереди.', lambda: password_hasher.rejected)
+metrics.gauge('answer_log_pending', 'Ответов, ожидающих записи в БД.', answer_log.pending)
+metrics.gauge('answer_log_written', 'Ответов, записанных в БД.', lambda: answer_log.written)
+metrics.gauge('answer_log_dropped', 'Ответов, отброшенных из-за ошибок целостности.', lambda: answer_log.dropped)
+metrics.gauge('deletion_queue', 'Тестов в очереди на фоновое удаление.', deletion_worker.pending)
+metrics.gauge('attempt_deadlines_scheduled', 'Попыток в колесе таймеров.', lambda: len(deadline_sweeper.wheel))
+metrics.gauge('attempts_expired', 'Попыток, завершенных по сроку.', lambda: deadline_sweeper.expired)
+
+
+@atexit.register
+def flush_answer_log():
+    with app.app_context():
+        answer_log.flush()
 
 
 def admin_required(f):
@@ -35,17 +117,156 @@ def get_current_user():
         return db.session.get(User, user_id)
     return None
 
+def get_current_attempt(user_id):
+    attempt_id = session.get('attempt_id')
+    if not attempt_id:
+        return None, None
+
+    progress = attempts.get(attempt_id)
+    if progress is None or progress['user_id'] != user_id:
+        session.pop('attempt_id', None)
+        return None, None
+    return attempt_id, progress
+
+
+def question_deadline(compiled, question_id, served_at):
+    question = compiled.questions.get(question_id) if compiled else None
+    time_limit = question.time_limit_sec if question and question.time_limit_sec else drafts.DEFAULT_TIME_LIMIT
+    return served_at + time_limit + app.config['ANSWER_GRACE_SEC']
+
+
+def attempt_deadline(compiled, question_ids, started_at):
+    # Сумма лимитов вопросов попытки; для adaptive вопросы заранее
+    # неизвестны, поэтому берется самый долгий вопрос теста.
+    if compiled.mode == 'adaptive':
+        budget = compiled.draw_count * (compiled.max_time_limit or drafts.DEFAULT_TIME_LIMIT)
+    else:
+        budget = sum(compiled.questions[q_id].time_limit_sec or drafts.DEFAULT_TIME_LIMIT for q_id in question_ids)
+    return started_at + budget + compiled.draw_count * app.config['ANSWER_GRACE_SEC'] + app.config['ATTEMPT_IDLE_SEC']
+
+
+def attempt_expires_at(progress, compiled):
+    # Срок всей попытки, а если текущий вопрос показан — срок ответа на него
+    # плюс ATTEMPT_IDLE_SEC: пользователь закрыл страницу.
+    expires_at = progress['deadline']
+    if progress['served_at'] is not None:
+        abandoned = question_deadline(compiled, progress['question_id'], progress['served_at']) \
+            + app.config['ATTEMPT_IDLE_SEC']
+        expires_at = abandoned if expires_at is None else min(expires_at, abandoned)
+    return expires_at
+
+
+def finish_attempt(attempt_id, progress):
+    # Удаление попытки служит захватом: результат сохраняет только тот, кто
+    # ее удалил, — обработчик ответа или сборщик просроченных попыток.
+    deadline_sweeper.cancel(attempt_id)
+    if not attempts.delete(attempt_id):
+        return False
+
+    # Попытка уже захвачена: ошибка записи ответов не должна потерять
+    # результат, ответы остаются в очереди журнала.
+    try:
+        answer_log.flush()
+    except Exception:
+        logger.exception('Не удалось записать ответы попытки %s', attempt_id)
+    # С шардами результат фиксируется в шарде теста до сводки в основной БД.
+    with result_shards.begin(progress['test_id']) as conn:
+        conn.execute(insert(Result), {
+            'user_id': progress['user_id'],
+            'test_id': progress['test_id'],
+            'score': progress['score'],
+            'total_questions': progress['total_questions'],
+            'seed': progress['seed'],
+        })
+    summaries.record_result(progress['user_id'], progress['test_id'], progress['score'], progress['total_questions'])
+    db.session.commit()
+    return True
+
+
+def expire_attempt(attempt_id):
+    progress = attempts.get(attempt_id)
+    if progress is None:
+        return False
+
+    compiled = compiled_tests.get(progress['test_id'])
+    if compiled is None:
+        attempts.delete(attempt_id)
+        return False
+
+    expires_at = attempt_expires_at(progress, compiled)
+    if expires_at is None:
+        return False
+    if expires_at > time.time():
+        deadline_sweeper.schedule(attempt_id, expires_at)
+        return False
+
+    logger.info('Попытка %s завершена по сроку: %d из %d', attempt_id, progress['score'], progress['total_questions'])
+    return finish_attempt(attempt_id, progress)
+
+
+def attempt_timed_out(attempt_id, progress):
+    # Результат сохраняет сборщик на ближайшем шаге колеса, чтобы показ
+    # вопроса оставался без запросов к БД.
+    if progress['deadline'] is None or time.time() <= progress['deadline']:
+        return False
+
+    session.pop('attempt_id', None)
+    deadline_sweeper.schedule(attempt_id, progress['deadline'])
+    flash(f"Время на тест истекло. Ваш результат: {progress['score']} из {progress['total_questions']}.", 'error')
+    return True
+
 
 @app.route('/')
 def index():
+    query = request.args.get('q', '').strip()
+    difficulty = request.args.get('difficulty') or None
+    current_user = get_current_user()
+    viewer = (current_user.id, current_user.username, current_user.is_admin) if current_user else None
+
+    if query or difficulty:
+        page_number = request.args.get('page', 1, type=int)
+        try:
+            results = search.search(query, difficulty, page=page_number, limit=app.config['CATALOGUE_PAGE_SIZE'],
+                                    cache=search_cache, version=catalogue.version)
+        except Exception:
+            logger.exception('Ошибка поиска по запросу %r', query)
+            results = search.SearchPage((), (), page_number, False)
+
+        etag = webcache.content_etag(assets.version, viewer, query, difficulty, results)
+        return webcache.conditional_response(etag, lambda: render_template(
+            'index.html', tests=results.tests, results=results, q=query,
+            difficulty=difficulty, user=current_user), private=current_user is not None)
+
+    after = request.args.get('after', 0, type=int)
     try:
-        all_tests = Test.query.all()
+        page = catalogue.get_page(after, app.config['CATALOGUE_PAGE_SIZE'])
     except:
-        all_tests = []
+        page = CataloguePage((), None)
 
-    current_user = get_current_user()
+    etag = webcache.content_etag(assets.version, viewer, after, page)
+    return webcache.conditional_response(etag, lambda: render_template(
+        'index.html', tests=page.tests, next_cursor=page.next_cursor,
+        after=after, user=current_user), private=current_user is not None)
+
+def overloaded(template, error):
+    flash(f'Сервер перегружен. Повторите попытку через {error.retry_after} сек.', 'error')
+    return render_template(template), 503, {'Retry-After': str(error.retry_after)}
 
-    return render_template('index.html', tests=all_tests, user=current_user)
+@app.route('/metrics')
+def metrics_endpoint():
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(403)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/stats')
+@admin_required
+def admin_stats():
+    return jsonify(catalogue=catalogue.stats(),
+                   compiled_tests=compiled_tests.stats(),
+                   password_hashing=password_hasher.stats(),
+                   deadlines=deadline_sweeper.stats(),
+                   search=search_cache.stats())
 
 @app.route('/profile')
 def profile():
@@ -55,9 +276,13 @@ def profile():
         flash('Пожалуйста, войдите, чтобы просмотреть ваш профиль.', 'error')
         return redirect(url_for('login'))
         
-    user_results = Result.query.filter_by(user_id=current_user.id).order_by(Result.date_completed.desc()).all()
+    user_summaries = summaries.user_summaries(current_user.id)
+    user_results, next_cursor = summaries.user_results_page(current_user.id, before=request.args.get('before'),
+                                                            limit=app.config['RESULTS_PAGE_SIZE'],
+                                                            tests={s.test_id: s.test for s in user_summaries})
     
-    return render_template('profile.html', user=current_user, results=user_results)
+    return render_template('profile.html', user=current_user, summaries=user_summaries,
+                           results=user_results, next_cursor=next_cursor)
 
 
 @app.route('/register', methods=['GET', 'POST'])
@@ -71,7 +296,10 @@ def register():
             flash('Пользователь с таким именем уже существует.', 'error')
             return redirect(url_for('register'))
 
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+        try:
+            hashed_password = password_hasher.hash(password)
+        except HashQueueFull as e:
+            return overloaded('register.html', e)
         new_user = User(username=username, password_hash=hashed_password, is_admin=False)
         db.session.add(new_user)
         db.session.commit()
@@ -90,7 +318,18 @@ def login():
 
         user = User.query.filter_by(username=username).first()
 
-        if user and check_password_hash(user.password_hash, password):
+        try:
+            password_ok = bool(user) and password_hasher.verify(user.password_hash, password)
+        except HashQueueFull as e:
+            return overloaded('login.html', e)
+
+        if password_ok:
+            if password_hasher.needs_rehash(user.password_hash):
+                try:
+                    user.password_hash = password_hasher.hash(password)
+                    db.session.commit()
+                except HashQueueFull:
+                    pass
             session['user_id'] = user.id
             flash(f'Вы успешно вошли как {user.username}!', 'success')
             return redirect(url_for('index'))
@@ -115,164 +354,155 @@ def logout():
 def test_results(test_id):
     test = Test.query.get_or_404(test_id)
     
-    results = Result.query.filter_by(test_id=test_id).options(db.joinedload(Result.user)).order_by(Result.date_completed.desc()).all()
+    results, next_cursor = analytics.results_page(test_id, before=request.args.get('before'),
+                                                  limit=app.config['RESULTS_PAGE_SIZE'])
     
-    total_questions = len(test.questions)
+    stats = analytics.test_analytics(test_id)
     
     return render_template('test_results.html',
                         test=test,
                         results=results,
-                        total_questions=total_questions)
+                        next_cursor=next_cursor,
+                        stats=stats,
+                        total_questions=stats['question_count'])
+
+@app.route('/admin/test_analytics/<int:test_id>')
+@admin_required
+def test_analytics(test_id):
+    Test.query.get_or_404(test_id)
+    stats = analytics.test_analytics(test_id)
+
+    return jsonify(
+        question_count=stats['question_count'],
+        summary=stats['summary'],
+        percentiles=stats['percentiles'],
+        histogram=[{'score': score, 'total_questions': total, 'count': count}
+                   for score, total, count in stats['histogram']],
+        attempts_per_day=[{'date': str(day), 'count': count} for day, count in stats['attempts_per_day']],
+    )
+
+@app.route('/admin/question_stats/<int:test_id>')
+@admin_required
+def question_stats(test_id):
+    test = Test.query.get_or_404(test_id)
+    answer_log.flush()
+
+    after = request.args.get('after', 0, type=int)
+    limit = app.config['RESULTS_PAGE_SIZE']
+    rows = (
+        db.session.query(Question, QuestionStat)
+        .outerjoin(QuestionStat, QuestionStat.question_id == Question.id)
+        .filter(Question.test_id == test_id, Question.id > after)
+        .order_by(Question.id)
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = rows[limit - 1][0].id if len(rows) > limit else None
+    rows = rows[:limit]
+
+    picks = dict(
+        db.session.query(OptionStat.option_id, OptionStat.picks)
+        .filter(OptionStat.question_id.in_([question.id for question, _ in rows]))
+        .all()
+    ) if rows else {}
+
+    return render_template('question_stats.html',
+                        test=test,
+                        rows=rows,
+                        picks=picks,
+                        after=after,
+                        next_cursor=next_cursor)
+
+@app.route('/admin/export/test/<int:test_id>.json')
+@admin_required
+def export_test(test_id):
+    test = Test.query.get_or_404(test_id)
+    compiled = compiled_tests.get(test_id)
+    etag = webcache.content_etag(test.title, test.description, test.difficulty, test.selection_mode,
+                                 test.draw_count, test.shuffle_options, compiled.digest if compiled else None)
+    return webcache.conditional_response(etag, lambda: Response(
+        stream_with_context(exporter.iter_test_json(test_id)),
+        mimetype='application/json',
+        headers={'Content-Disposition': f'attachment; filename=test_{test_id}.json'}))
+
+@app.route('/admin/export/<kind>/<int:test_id>.<fmt>')
+@admin_required
+def export_rows(kind, test_id, fmt):
+    if kind not in ('results', 'answers') or fmt not in exporter.FORMATS:
+        abort(404)
+    Test.query.get_or_404(test_id)
+    if kind == 'answers':
+        answer_log.flush()
+
+    try:
+        chunks = exporter.export_rows(kind, test_id, fmt)
+    except RuntimeError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('test_results', test_id=test_id))
+
+    return Response(stream_with_context(chunks),
+                    mimetype=exporter.MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={kind}_{test_id}.{fmt}'})
 
 @app.route('/admin/create_test', methods=['GET', 'POST'])
 @admin_required
 def create_test():
     if request.method == 'POST':
-        questions_to_process = {}
-        
-        print(f"\n--- Начало обработки POST-запроса ---")
-        print(f"Форма содержит ключей: {len(request.form)}")
-        
-        for key, value in request.form.items():
-            
-            if key in ['title', 'description', 'test_difficulty']:
-                continue
+        logger.debug('Создание теста: форма содержит ключей: %d', len(request.form))
 
-            parts = key.split('_')
-            q_id = None
-            
-            if key.startswith('q_text_'):
-                if len(parts) >= 3 and parts[-1].isdigit():
-                    q_id = parts[-1]
-            elif key.startswith('q_') and len(parts) >= 2 and parts[1].isdigit():
-                q_id = parts[1]
-
-            if q_id is None:
-                continue 
-            
-            q_id = str(q_id) 
+        draft, errors = drafts.parse_form(request.form)
 
-            if q_id not in questions_to_process:
-                questions_to_process[q_id] = {'options': {}}
-            
-            if key.startswith('q_text_'):
-                questions_to_process[q_id]['text'] = value
-            
-            elif key.endswith('_difficulty'):
-                questions_to_process[q_id]['difficulty'] = value
-
-            elif key.endswith('_time_limit'):
-                try:
-                    value = value.strip()
-                    if value:
-                        questions_to_process[q_id]['time_limit'] = int(value)
-                except ValueError:
-                    print(f"ОШИБКА 1: Неверный формат времени для вопроса {q_id}. Значение: '{value}'")
-                    flash(f'Ошибка: Неверный формат времени для вопроса {q_id}.', 'error')
-                    return redirect(url_for('create_test'))
-
-            elif key.endswith('_correct'):
-                questions_to_process[q_id]['correct_option_index'] = value
-            
-            elif '_option_text_' in key:
-                o_index = parts[-1] 
-                questions_to_process[q_id]['options'][o_index] = value
-
-        print(f"Сырые данные вопросов: {questions_to_process}")
-        title = request.form.get('title')
-        description = request.form.get('description')
-        test_difficulty = request.form.get('test_difficulty', 'Средний')
-        
-        valid_questions = {k: v for k, v in questions_to_process.items() if v.get('text', '').strip()}
-        
-        print(f"Действительных вопросов (с текстом): {len(valid_questions)}")
-        
-        if len(valid_questions) < 2:
-            print("ОШИБКА 2: Меньше 2 вопросов с текстом. Прерывание.")
-            flash('Невозможно создать тест: требуется минимум 2 вопроса с текстом.', 'error')
+        if errors:
+            logger.info('Создание теста отклонено: ошибок валидации %d', len(errors))
+            for q_key, message in errors:
+                if q_key is None:
+                    flash(f'Невозможно создать тест: {message}.', 'error')
+                else:
+                    flash(f'Вопрос {q_key}: {message}.', 'error')
             return redirect(url_for('create_test'))
 
-        new_test = Test(title=title, description=description, difficulty=test_difficulty)
-        db.session.add(new_test)
-        db.session.flush()
-
         try:
-            questions_count = 0
-            for q_id, q_data in valid_questions.items():
-                
-                if len(q_data.get('options', {})) < 2 or q_data.get('correct_option_index') is None:
-                    print(f"ПРЕДУПРЕЖДЕНИЕ: Вопрос {q_id} пропущен из-за нехватки вариантов/ответа.")
-                    flash(f'Вопрос {q_id} пропущен: нет минимума (2) вариантов или не указан правильный ответ.', 'warning')
-                    continue
-                    
-                new_question = Question(
-                    test_id=new_test.id, 
-                    text=q_data.get('text'),
-                    difficulty=q_data.get('difficulty', 'Средний'),
-                    time_limit_sec=q_data.get('time_limit') if isinstance(q_data.get('time_limit'), int) else 60
-                )
-                db.session.add(new_question)
-                db.session.flush() 
-                questions_count += 1
-                
-                correct_option_index = str(q_data.get('correct_option_index'))
-                
-                for o_index, o_text in q_data['options'].items():
-                    o_text = o_text.strip()
-                    if not o_text:
-                        continue 
-                        
-                    is_correct = (str(o_index) == correct_option_index)
-                    
-                    new_option = Option(
-                        question_id=new_question.id, 
-                        text=o_text, 
-                        is_correct=is_correct
-                    )
-                    db.session.add(new_option)
-
-            print(f"Финальное количество сохраненных вопросов: {questions_count}")
-            
-            if questions_count < 2:
-                print("ОШИБКА 3: В базе сохранено меньше 2 вопросов. Откат транзакции.")
-                db.session.rollback()
-                flash('Тест отменен: в нем должно быть минимум 2 действительных вопроса.', 'error')
-                return redirect(url_for('create_test'))
-
+            test_id = drafts.persist_test(db.session, draft)
             db.session.commit()
-            print(f"УСПЕХ: Тест '{title}' создан. Вопросов: {questions_count}")
-            flash(f'Тест "{title}" успешно создан! Добавлено вопросов: {questions_count}', 'success')
-            return redirect(url_for('index'))
-
-        except Exception as e:
+        except Exception:
             db.session.rollback()
-            print(f"\n--- КРИТИЧЕСКАЯ ОШИБКА БД: {e} ---")
-            flash(f'Критическая ошибка при сохранении теста в БД. Подробности в логах сервера.', 'error')
+            logger.exception('Ошибка БД при сохранении теста')
+            flash('Критическая ошибка при сохранении теста в БД. Подробности в логах сервера.', 'error')
             return redirect(url_for('create_test'))
 
-    return render_template('create_test.html')
+        catalogue.bump()
+        compiled_tests.invalidate(test_id)
+        compiled_tests.get(test_id)
+        logger.info("Тест '%s' создан, вопросов: %d", draft.title, len(draft.questions))
+        flash(f'Тест "{draft.title}" успешно создан! Добавлено вопросов: {len(draft.questions)}', 'success')
+        return redirect(url_for('index'))
+
+    # Форма не зависит от данных: пока нет сообщений, ETag — версия шаблонов.
+    if session.get('_flashes'):
+        return render_template('create_test.html')
+    return webcache.conditional_response(webcache.content_etag(assets.version, 'create_test'),
+                                         lambda: render_template('create_test.html'))
 
 @app.route('/admin/delete_test/<int:test_id>', methods=['POST'])
 @admin_required
 def delete_test(test_id):
     test_to_delete = Test.query.get_or_404(test_id)
     test_title = test_to_delete.title
+    mode = request.form.get('mode', 'purge')
+    if mode not in ('purge', 'archive'):
+        abort(400)
 
     try:
-        Result.query.filter_by(test_id=test_id).delete()
-        
-        questions = Question.query.filter_by(test_id=test_id).all()
-        question_ids = [q.id for q in questions]
+        answer_log.flush()
+        hide_test(test_id, purge=(mode == 'purge'))
+        catalogue.bump()
+        compiled_tests.invalidate(test_id)
+        deletion_worker.submit(mode, test_id)
         
-        if question_ids:
-            Option.query.filter(Option.question_id.in_(question_ids)).delete(synchronize_session=False)
-
-        Question.query.filter_by(test_id=test_id).delete(synchronize_session=False)
-
-        db.session.delete(test_to_delete)
-        db.session.commit()
-        
-        flash(f'Тест "{test_title}" и все связанные данные успешно удалены.', 'success')
+        if mode == 'archive':
+            flash(f'Тест "{test_title}" перенесен в архив. Результаты архивируются в фоне.', 'success')
+        else:
+            flash(f'Тест "{test_title}" скрыт. Связанные данные удаляются в фоне.', 'success')
         
     except Exception as e:
         db.session.rollback()
@@ -292,53 +522,18 @@ def import_test():
         flash('Файл не выбран.', 'error')
         return redirect(url_for('create_test'))
 
-    if file and file.filename.endswith('.json'):
+    if file and file.filename.endswith(('.json', '.jsonl')):
         try:
-            json_data = json.load(file.stream)
-
-            title = json_data.get('title')
-            description = json_data.get('description')
-            test_difficulty = json_data.get('difficulty', 'Средний')
-            questions_data = json_data.get('questions')
-
-            if not all([title, questions_data, isinstance(questions_data, list)]):
-                flash('JSON имеет неверную структуру (отсутствует title или questions).', 'error')
-                return redirect(url_for('create_test'))
-
-            new_test = Test(title=title, description=description, difficulty=test_difficulty)
-            db.session.add(new_test)
-            db.session.flush()
-
-            for q_data in questions_data:
-                q_text = q_data.get('text')
-                q_difficulty = q_data.get('difficulty', 'Средний')
-                q_time = q_data.get('time_limit_sec', 60)
-                options = q_data.get('options')
-                correct_index = q_data.get('correct_option_index')
-
-                if not all([q_text, options, correct_index is not None]):
-                    raise ValueError(f"Вопрос '{q_text}' имеет неполные данные.")
-
-                new_question = Question(
-                    test_id=new_test.id, 
-                    text=q_text,
-                    difficulty=q_difficulty,
-                    time_limit_sec=q_time
-                )
-                db.session.add(new_question)
-                db.session.flush()
-
-                for idx, o_text in enumerate(options):
-                    is_correct = (idx == correct_index)
-                    new_option = Option(
-                        question_id=new_question.id, 
-                        text=o_text, 
-                        is_correct=is_correct
-                    )
-                    db.session.add(new_option)
+            def report_progress(title, questions_count):
+                logger.info("Импорт '%s': сохранено вопросов: %d", title, questions_count)
+
+            imported = import_stream(db.session, file.stream, progress=report_progress)
 
             db.session.commit()
-            flash(f'Тест "{title}" успешно импортирован!', 'success')
+            catalogue.bump()
+            for test_id, title, questions_count in imported:
+                compiled_tests.invalidate(test_id)
+                flash(f'Тест "{title}" успешно импортирован! Добавлено вопросов: {questions_count}', 'success')
             return redirect(url_for('index'))
 
         except json.JSONDecodeError:
@@ -352,7 +547,7 @@ def import_test():
             flash(f'Непредвиденная ошибка при импорте: {e}', 'error')
             
     else:
-        flash('Неверный формат файла. Требуется .json.', 'error')
+        flash('Неверный формат файла. Требуется .json или .jsonl.', 'error')
         
     return redirect(url_for('create_test'))
 
@@ -363,104 +558,322 @@ def test_start(test_id):
         flash('Для прохождения теста необходимо войти.', 'error')
         return redirect(url_for('login'))
     
-    test = Test.query.get_or_404(test_id)
-    
-    question_ids = [q.id for q in test.questions]
-    
-    if not question_ids:
+    # Проверка по БД, а не по кэшу: тест могли удалить в другом процессе,
+    # и его скомпилированная копия здесь еще не устарела.
+    test = db.session.query(Test.archived_at).filter(Test.id == test_id).first()
+    if test is None or test.archived_at:
+        compiled_tests.invalidate(test_id)
+        abort(404)
+
+    compiled = compiled_tests.get(test_id)
+    if compiled is None:
         flash('В этом тесте пока нет вопросов.', 'error')
         return redirect(url_for('index'))
 
-    session['test_progress'] = {
-        'test_id': test_id,
-        'question_ids': question_ids,
-        'current_q_index': 0,
-        'score': 0,
-        'total_questions': len(question_ids)
-    }
+    seed = selection.new_seed()
+    question_ids = selection.draw(compiled, seed)
+    deadline = attempt_deadline(compiled, question_ids, time.time())
+    attempt_id = attempts.create(current_user.id, test_id, question_ids,
+                                 total_questions=compiled.draw_count, seed=seed, deadline=deadline)
+    deadline_sweeper.schedule(attempt_id, deadline)
+    session['attempt_id'] = attempt_id
     return redirect(url_for('test_question'))
 
 @app.route('/test/question')
 def test_question():
-    current_user = get_current_user()
-    if not current_user:
+    user_id = session.get('user_id')
+    if not user_id:
         return redirect(url_for('login'))
     
-    if 'test_progress' not in session:
+    attempt_id, progress = get_current_attempt(user_id)
+    if not progress:
         flash('Тест не был начат.', 'info')
         return redirect(url_for('index'))
 
-    progress = session['test_progress']
     q_index = progress['current_q_index']
     
     if q_index >= progress['total_questions']:
         flash('Тест завершен.', 'info')
         return redirect(url_for('profile'))
+    
+    if attempt_timed_out(attempt_id, progress):
+        return redirect(url_for('profile'))
         
-    current_q_id = progress['question_ids'][q_index]
+    compiled = compiled_tests.get(progress['test_id'])
+    question = compiled.questions.get(progress['question_id']) if compiled else None
+    if question is None:
+        attempts.delete(attempt_id)
+        session.pop('attempt_id', None)
+        flash('Тест был изменен или удален.', 'error')
+        return redirect(url_for('index'))
+    
+    # Повторный показ не продлевает срок: отсчет идет от первого показа.
+    served_at = progress['served_at']
+    if served_at is None:
+        attempts.mark_served(attempt_id)
+        served_at = time.time()
+        progress = dict(progress, served_at=served_at)
+        deadline_sweeper.schedule(attempt_id, attempt_expires_at(progress, compiled))
+    time_left = question_deadline(compiled, question.id, served_at) - app.config['ANSWER_GRACE_SEC'] - time.time()
     
-    question = Question.query.get_or_404(current_q_id)
+    if compiled.shuffle_options:
+        question = question._replace(options=selection.option_order(compiled, question, progress['seed']))
     
     return render_template('test_page.html', 
                             question=question, 
+                            q_index=q_index,
                             current_q_num=q_index + 1, 
-                            total_questions=progress['total_questions'])
+                            total_questions=progress['total_questions'],
+                            time_left=max(int(time_left), 0))
+
+def stale_answer():
+    # Повторная отправка уже засчитанного ответа: не засчитывается, участник
+    # возвращается к текущему вопросу.
+    flash('Ответ на этот вопрос уже принят.', 'info')
+    return redirect(url_for('test_question'))
 
 @app.route('/test/answer', methods=['POST'])
 def test_answer():
-    current_user = get_current_user()
-    if not current_user:
+    user_id = session.get('user_id')
+    if not user_id:
         return redirect(url_for('login'))
     
-    if 'test_progress' not in session:
+    attempt_id, progress = get_current_attempt(user_id)
+    if not progress:
         return redirect(url_for('index'))
     
-    selected_option_id = request.form.get('option')
-    if not selected_option_id:
+    if attempt_timed_out(attempt_id, progress):
+        return redirect(url_for('profile'))
+    
+    # Номер вопроса, на который отвечали; без него — текущий на момент запроса.
+    q_index = request.form.get('q_index', type=int)
+    if q_index is None:
+        q_index = progress['current_q_index']
+    if q_index != progress['current_q_index']:
+        return stale_answer()
+    
+    selected_option_id = request.form.get('option', type=int)
+    client_timeout = request.form.get('timeout') == 'true'
+    if not selected_option_id and not client_timeout:
         flash('Пожалуйста, выберите вариант ответа.', 'error')
         return redirect(url_for('test_question'))
     
-    selected_option = Option.query.get(selected_option_id)
-    if selected_option and selected_option.is_correct:
-        session['test_progress']['score'] += 1
+    compiled = compiled_tests.get(progress['test_id'])
+    is_correct = bool(compiled and compiled.is_correct(progress['question_id'], selected_option_id))
     
-    session['test_progress']['current_q_index'] += 1
+    # Ответ после лимита вопроса (с запасом ANSWER_GRACE_SEC) засчитывается
+    # как неверный, независимо от таймера на странице.
+    late = progress['served_at'] is not None \
+        and time.time() > question_deadline(compiled, progress['question_id'], progress['served_at'])
+    if late:
+        is_correct = False
+        selected_option_id = None
     
-    session.modified = True
+    question = compiled.questions.get(progress['question_id']) if compiled else None
+    if question is not None and not any(option.id == selected_option_id for option in question.options):
+        selected_option_id = None
+    time_taken_ms = None
+    if progress['served_at'] is not None:
+        time_taken_ms = int((time.time() - progress['served_at']) * 1000)
     
-    progress = session['test_progress']
+    next_question_id = None
+    if compiled is not None and compiled.mode == 'adaptive' \
+            and progress['current_q_index'] + 1 < progress['total_questions']:
+        next_question_id = selection.next_adaptive(compiled, progress['seed'],
+                                                   attempts.question_ids(attempt_id), is_correct)
+    
+    answered = progress
+    try:
+        progress = attempts.record_answer(attempt_id, q_index, is_correct, next_question_id)
+    except StaleAnswer:
+        return stale_answer()
+    if progress is None:
+        session.pop('attempt_id', None)
+        return redirect(url_for('index'))
+    
+    if late:
+        flash('Время на ответ истекло, ответ не засчитан.', 'error')
+    if question is not None:
+        answer_log.record(attempt_id, user_id, answered['test_id'], question.id,
+                          selected_option_id, is_correct, time_taken_ms)
     
     if progress['current_q_index'] >= progress['total_questions']:
-        new_result = Result(
-            user_id=current_user.id,
-            test_id=progress['test_id'],
-            score=progress['score']
-        )
-        db.session.add(new_result)
-        db.session.commit()
-        
-        final_score = progress['score']
-        total = progress['total_questions']
-        session.pop('test_progress', None)
+        if compiled is None:
+            attempts.delete(attempt_id)
+            session.pop('attempt_id', None)
+            flash('Тест был удален, результат не сохранен.', 'error')
+            return redirect(url_for('index'))
         
-        flash(f'Тест завершен! Ваш результат: {final_score} из {total}!', 'success')
+        session.pop('attempt_id', None)
+        if finish_attempt(attempt_id, progress):
+            flash(f"Тест завершен! Ваш результат: {progress['score']} из {progress['total_questions']}!", 'success')
         return redirect(url_for('profile'))
         
     
     return redirect(url_for('test_question'))
 
-if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-
-        if not User.query.filter_by(username='admin').first():
-            admin_user = User(
-                username='admin',
-                password_hash=generate_password_hash('adm1n', method='pbkdf2:sha256'),
-                is_admin=True
-            )
-            db.session.add(admin_user)
+@app.cli.command('import-tests')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=500, show_default=True, help='Вопросов в одной пачке INSERT.')
+def import_tests_command(path, batch_size):
+    def report_progress(title, questions_count):
+        click.echo(f"'{title}': {questions_count} вопросов")
+
+    with open(path, 'rb') as stream:
+        try:
+            imported = import_stream(db.session, stream, batch_size=batch_size, progress=report_progress)
             db.session.commit()
+        except ValueError as e:
+            db.session.rollback()
+            raise click.ClickException(str(e))
+
+    for test_id, title, questions_count in imported:
+        click.echo(f'Импортирован тест #{test_id} "{title}": {questions_count} вопросов')
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(['test', 'results', 'answers']))
+@click.argument('test_id', type=int)
+@click.option('--format', 'fmt', type=click.Choice(exporter.FORMATS), default='csv', show_default=True,
+              help='Формат для results/answers (test всегда выгружается в JSON).')
+@click.option('-o', '--output', type=click.Path(dir_okay=False, writable=True), help='Файл (по умолчанию stdout).')
+def export_command(kind, test_id, fmt, output):
+    try:
+        if kind == 'test':
+            chunks = exporter.iter_test_json(test_id)
+        else:
+            chunks = exporter.export_rows(kind, test_id, fmt)
+
+        binary = kind != 'test' and fmt == 'parquet'
+        if output and binary:
+            stream = open(output, 'wb')
+        elif output:
+            stream = open(output, 'w', encoding='utf-8', newline='')
+        elif binary:
+            stream = click.get_binary_stream('stdout')
+        else:
+            stream = click.get_text_stream('stdout')
 
+        try:
+            for chunk in chunks:
+                stream.write(chunk)
+        finally:
+            if output:
+                stream.close()
+    except (ValueError, RuntimeError) as e:
+        raise click.ClickException(str(e))
+
+def init_db():
+    db.create_all()
+    migrations.upgrade()
+    result_shards.create_all()
+
+    if not User.query.filter_by(username='admin').first():
+        admin_user = User(
+            username='admin',
+            password_hash=generate_password_hash('adm1n', method=password_hasher.method),
+            is_admin=True
+        )
+        db.session.add(admin_user)
+        db.session.commit()
+
+def purge_stale_attempts():
+    deleted = attempts.purge(app.config['ATTEMPT_TTL'])
+    if deleted:
+        logger.info('Удалено брошенных попыток: %d', deleted)
+    return deleted
+
+def start_background():
+    # Вызывается в каждом процессе, который обслуживает запросы: фоновые
+    # потоки не переживают fork, а сроки попыток из общего хранилища
+    # ставятся в колесо каждого процесса (результат сохранит тот, кто первым
+    # удалит попытку).
+    webcache.warm_templates(app)
+    deletion_worker.resume()
+    if app.config['ATTEMPT_STORE'] == 'sql':
+        deadline_sweeper.every(app.config['ATTEMPT_PURGE_INTERVAL'], purge_stale_attempts)
+    with app.app_context():
+        for attempt_id, deadline in attempts.deadlines():
+            deadline_sweeper.schedule(attempt_id, deadline)
+
+@app.cli.command('init-db')
+def init_db_command():
+    init_db()
+    click.echo('База данных готова.')
+
+db_cli = AppGroup('db', help='Миграции схемы и планы запросов.')
+
+@db_cli.command('status')
+def db_status_command():
+    for number, name, applied in migrations.status():
+        click.echo(f"{'+' if applied else ' '} {number:>3}  {name}")
+
+@db_cli.command('upgrade')
+@click.option('--to', 'target', type=int, help='Версия (по умолчанию последняя).')
+def db_upgrade_command(target):
+    applied = migrations.upgrade(target)
+    for number, name in applied:
+        click.echo(f'Применена миграция {number}: {name}')
+    if not applied:
+        click.echo('Схема актуальна.')
+
+@db_cli.command('downgrade')
+@click.argument('target', type=int)
+def db_downgrade_command(target):
+    try:
+        reverted = migrations.downgrade(target)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    for number, name in reverted:
+        click.echo(f'Откачена миграция {number}: {name}')
+
+@db_cli.command('explain')
+@click.option('--route', 'endpoint', help='Только этот маршрут (имя функции в app.py).')
+@click.option('--test-id', type=int, help='Тест для маршрутов с <test_id> (по умолчанию — с наибольшим числом вопросов).')
+def db_explain_command(endpoint, test_id):
+    try:
+        reports = explain.route_plans(app, endpoint, test_id)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+
+    for name, url, plans in reports:
+        click.echo(f'== {name}  {url}  ({len(plans)} запросов)')
+        for statement, plan, scanned in plans:
+            click.echo('  ' + ' '.join(statement.split()))
+            for line in plan:
+                click.echo('      ' + line)
+            if scanned:
+                click.echo(f"    ! полный просмотр: {', '.join(scanned)}")
+        click.echo()
+
+app.cli.add_command(db_cli)
+
+shards_cli = AppGroup('shards', help='Шарды результатов и ответов (RESULT_SHARDS).')
+
+@shards_cli.command('status')
+def shards_status_command():
+    for index, (url, counts) in enumerate(result_shards.status()):
+        click.echo(f'{index:>3}  {url}')
+        for table, count in counts.items():
+            click.echo(f'       {table}: {count}')
+
+@shards_cli.command('rebalance')
+@click.option('--batch-size', type=int, default=config.DELETE_BATCH, show_default=True, help='Строк в одной пачке переноса.')
+def shards_rebalance_command(batch_size):
+    answer_log.flush()
+    try:
+        moved = result_shards.rebalance(batch_size)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    for table, count in moved.items():
+        click.echo(f'{table}: перенесено строк {count}')
+    if not moved:
+        click.echo('Все строки уже в своих шардах.')
+
+app.cli.add_command(shards_cli)
+
+if __name__ == '__main__':
+    with app.app_context():
+        init_db()
 
-    app.run(debug=True)
+    start_background()
+    app.run(debug=app.config['DEBUG'])
@@ -0,0 +1,417 @@
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+
+from models import db, Attempt
+
+STATE_FIELDS = ('user_id', 'test_id', 'current_q_index', 'score', 'total_questions')
+
+
+class StaleAnswer(Exception):
+    # Ответ на вопрос, который уже не текущий: повторная отправка формы или
+    # параллельный запрос, успевший засчитать ответ первым.
+    pass
+
+
+def new_attempt_id():
+    return secrets.token_hex(16)
+
+
+def _state(fields, question_id, served_at=None, seed=None, deadline=None):
+    state = dict(fields)
+    state['question_id'] = question_id
+    state['served_at'] = served_at
+    state['seed'] = seed
+    state['deadline'] = deadline
+    return state
+
+
+class MemoryAttemptStore:
+    # Состояние в памяти процесса; подходит для одного процесса-воркера.
+
+    def __init__(self, max_entries=100000, ttl=4 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._attempts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, user_id, test_id, question_ids, total_questions=None, seed=None, deadline=None):
+        attempt_id = new_attempt_id()
+        entry = {
+            'user_id': user_id,
+            'test_id': test_id,
+            'question_ids': list(question_ids),
+            'current_q_index': 0,
+            'score': 0,
+            'total_questions': total_questions or len(question_ids),
+            'served_at': None,
+            'seed': seed,
+            'deadline': deadline,
+            'touched': time.monotonic(),
+        }
+        with self._lock:
+            self._attempts[attempt_id] = entry
+            self._evict()
+        return attempt_id
+
+    def _evict(self):
+        while len(self._attempts) > self.max_entries:
+            self._attempts.popitem(last=False)
+
+        if self.ttl:
+            deadline = time.monotonic() - self.ttl
+            while self._attempts:
+                oldest = next(iter(self._attempts.values()))
+                if oldest['touched'] >= deadline:
+                    break
+                self._attempts.popitem(last=False)
+
+    def _snapshot(self, entry):
+        index = entry['current_q_index']
+        question_ids = entry['question_ids']
+        question_id = question_ids[index] if index < len(question_ids) else None
+        return _state(((k, entry[k]) for k in STATE_FIELDS), question_id, entry['served_at'], entry['seed'],
+                      entry['deadline'])
+
+    def _touch(self, attempt_id):
+        entry = self._attempts.get(attempt_id)
+        if entry is not None:
+            entry['touched'] = time.monotonic()
+            self._attempts.move_to_end(attempt_id)
+        return entry
+
+    def get(self, attempt_id):
+        with self._lock:
+            entry = self._touch(attempt_id)
+            return self._snapshot(entry) if entry else None
+
+    def question_ids(self, attempt_id):
+        with self._lock:
+            entry = self._attempts.get(attempt_id)
+            return list(entry['question_ids']) if entry else []
+
+    def record_answer(self, attempt_id, expected_index, correct, next_question_id=None):
+        with self._lock:
+            entry = self._touch(attempt_id)
+            if entry is None:
+                return None
+            if entry['current_q_index'] != expected_index:
+                raise StaleAnswer(attempt_id)
+            if next_question_id is not None:
+                entry['question_ids'].append(next_question_id)
+            entry['current_q_index'] += 1
+            entry['served_at'] = None
+            if correct:
+                entry['score'] += 1
+            return self._snapshot(entry)
+
+    def mark_served(self, attempt_id):
+        with self._lock:
+            entry = self._touch(attempt_id)
+            if entry is not None and entry['served_at'] is None:
+                entry['served_at'] = time.time()
+
+    def delete(self, attempt_id):
+        with self._lock:
+            return self._attempts.pop(attempt_id, None) is not None
+
+    def deadlines(self):
+        with self._lock:
+            return [(attempt_id, entry['deadline']) for attempt_id, entry in self._attempts.items()
+                    if entry['deadline'] is not None]
+
+
+class SQLAttemptStore:
+    # Таблица attempts в основной БД; список вопросов пишется один раз
+    # (в режиме adaptive дописывается по ответу), каждый ответ — один UPDATE.
+
+    def create(self, user_id, test_id, question_ids, total_questions=None, seed=None, deadline=None):
+        attempt_id = new_attempt_id()
+        db.session.add(Attempt(
+            id=attempt_id,
+            user_id=user_id,
+            test_id=test_id,
+            question_ids=json.dumps(list(question_ids)),
+            current_q_index=0,
+            score=0,
+            total_questions=total_questions or len(question_ids),
+            seed=seed,
+            deadline=deadline,
+        ))
+        db.session.commit()
+        return attempt_id
+
+    def get(self, attempt_id):
+        attempt = db.session.get(Attempt, attempt_id, populate_existing=True)
+        if attempt is None:
+            return None
+
+        question_ids = json.loads(attempt.question_ids)
+        index = attempt.current_q_index
+        question_id = question_ids[index] if index < len(question_ids) else None
+        return _state(((k, getattr(attempt, k)) for k in STATE_FIELDS), question_id, attempt.served_at, attempt.seed,
+                      attempt.deadline)
+
+    def question_ids(self, attempt_id):
+        question_ids = db.session.query(Attempt.question_ids).filter(Attempt.id == attempt_id).scalar()
+        return json.loads(question_ids) if question_ids else []
+
+    def record_answer(self, attempt_id, expected_index, correct, next_question_id=None):
+        values = {
+            'current_q_index': Attempt.current_q_index + 1,
+            'score': Attempt.score + (1 if correct else 0),
+            'served_at': None,
+        }
+        if next_question_id is not None:
+            values['question_ids'] = json.dumps(self.question_ids(attempt_id) + [next_question_id])
+
+        # Сравнение с ожидаемым номером вопроса: из двух одновременных ответов
+        # на один вопрос строку обновит только первый.
+        updated = db.session.execute(
+            update(Attempt)
+            .where(Attempt.id == attempt_id, Attempt.current_q_index == expected_index)
+            .values(**values)
+        ).rowcount
+        db.session.commit()
+        progress = self.get(attempt_id)
+        if not updated and progress is not None:
+            raise StaleAnswer(attempt_id)
+        return progress
+
+    def mark_served(self, attempt_id):
+        db.session.execute(
+            update(Attempt)
+            .where(Attempt.id == attempt_id, Attempt.served_at.is_(None))
+            .values(served_at=time.time())
+        )
+        db.session.commit()
+
+    def delete(self, attempt_id):
+        deleted = db.session.query(Attempt).filter_by(id=attempt_id).delete()
+        db.session.commit()
+        return deleted > 0
+
+    def deadlines(self):
+        return db.session.query(Attempt.id, Attempt.deadline).filter(Attempt.deadline.isnot(None)).all()
+
+    def purge(self, older_than_seconds):
+        # Брошенные попытки (без изменений дольше older_than_seconds); в
+        # остальных хранилищах их вытесняет TTL.
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=older_than_seconds)
+        deleted = db.session.query(Attempt).filter(Attempt.updated_at < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+
+class LocalRedis:
+    # Минимальная замена клиента Redis (decode_responses=True) для разработки
+    # и тестов: поддерживает только команды, которые использует RedisAttemptStore.
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, name):
+        expires = self._expires.get(name)
+        if expires is not None and expires <= time.monotonic():
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+        return self._data.get(name)
+
+    def hset(self, name, mapping):
+        with self._lock:
+            value = self._alive(name)
+            if value is None:
+                value = self._data[name] = {}
+            value.update({k: str(v) for k, v in mapping.items()})
+            return len(mapping)
+
+    def hsetnx(self, name, key, value):
+        with self._lock:
+            current = self._alive(name)
+            if current is None or key in current:
+                return 0
+            current[key] = str(value)
+            return 1
+
+    def hdel(self, name, *keys):
+        with self._lock:
+            value = self._alive(name) or {}
+            return sum(value.pop(k, None) is not None for k in keys)
+
+    def hmget(self, name, keys):
+        with self._lock:
+            value = self._alive(name) or {}
+            return [value.get(k) for k in keys]
+
+    def hincrby(self, name, key, amount=1):
+        with self._lock:
+            value = self._alive(name)
+            if value is None:
+                value = self._data[name] = {}
+            value[key] = str(int(value.get(key, 0)) + amount)
+            return int(value[key])
+
+    def rpush(self, name, *values):
+        with self._lock:
+            value = self._alive(name)
+            if value is None:
+                value = self._data[name] = []
+            value.extend(str(v) for v in values)
+            return len(value)
+
+    def lrange(self, name, start, end):
+        with self._lock:
+            value = self._alive(name) or []
+            return value[start:None if end == -1 else end + 1]
+
+    def lindex(self, name, index):
+        with self._lock:
+            value = self._alive(name) or []
+            return value[index] if -len(value) <= index < len(value) else None
+
+    def expire(self, name, seconds):
+        with self._lock:
+            if self._alive(name) is None:
+                return False
+            self._expires[name] = time.monotonic() + seconds
+            return True
+
+    def scan_iter(self, match):
+        prefix = match.rstrip('*')
+        with self._lock:
+            names = [name for name in list(self._data)
+                     if name.startswith(prefix) and self._alive(name) is not None]
+        return iter(names)
+
+    def delete(self, *names):
+        with self._lock:
+            removed = 0
+            for name in names:
+                removed += self._data.pop(name, None) is not None
+                self._expires.pop(name, None)
+            return removed
+
+
+class RedisAttemptStore:
+    # Хэш attempt:<id> со счётчиками и список attempt:<id>:q с вопросами.
+    # Каждый ответ — HINCRBY по двум полям и продление TTL. Ответ на вопрос N
+    # засчитывает тот, кто первым поставил поле answered:N (HSETNX).
+
+    def __init__(self, client, ttl=4 * 3600, prefix='attempt:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _keys(self, attempt_id):
+        key = self.prefix + attempt_id
+        return key, key + ':q'
+
+    def create(self, user_id, test_id, question_ids, total_questions=None, seed=None, deadline=None):
+        attempt_id = new_attempt_id()
+        key, q_key = self._keys(attempt_id)
+        fields = {
+            'user_id': user_id,
+            'test_id': test_id,
+            'current_q_index': 0,
+            'score': 0,
+            'total_questions': total_questions or len(question_ids),
+        }
+        if seed is not None:
+            fields['seed'] = seed
+        if deadline is not None:
+            fields['deadline'] = deadline
+        self.client.hset(key, mapping=fields)
+        if question_ids:
+            self.client.rpush(q_key, *question_ids)
+        self.client.expire(key, self.ttl)
+        self.client.expire(q_key, self.ttl)
+        return attempt_id
+
+    def get(self, attempt_id):
+        key, q_key = self._keys(attempt_id)
+        values = self.client.hmget(key, STATE_FIELDS + ('served_at', 'seed', 'deadline'))
+        if values[0] is None:
+            return None
+
+        fields = {k: int(v) for k, v in zip(STATE_FIELDS, values)}
+        served_at, seed, deadline = values[len(STATE_FIELDS):]
+        served_at = float(served_at) if served_at is not None else None
+        seed = int(seed) if seed is not None else None
+        deadline = float(deadline) if deadline is not None else None
+        question_id = None
+        if fields['current_q_index'] < fields['total_questions']:
+            question_id = self.client.lindex(q_key, fields['current_q_index'])
+            question_id = int(question_id) if question_id is not None else None
+        return _state(fields.items(), question_id, served_at, seed, deadline)
+
+    def question_ids(self, attempt_id):
+        _, q_key = self._keys(attempt_id)
+        return [int(question_id) for question_id in self.client.lrange(q_key, 0, -1)]
+
+    def record_answer(self, attempt_id, expected_index, correct, next_question_id=None):
+        key, q_key = self._keys(attempt_id)
+        user_id, index = self.client.hmget(key, ['user_id', 'current_q_index'])
+        if user_id is None:
+            return None
+        if int(index) != expected_index or not self.client.hsetnx(key, f'answered:{expected_index}', 1):
+            raise StaleAnswer(attempt_id)
+
+        if next_question_id is not None:
+            self.client.rpush(q_key, next_question_id)
+        self.client.hincrby(key, 'current_q_index', 1)
+        self.client.hdel(key, 'served_at')
+        if correct:
+            self.client.hincrby(key, 'score', 1)
+        self.client.expire(key, self.ttl)
+        self.client.expire(q_key, self.ttl)
+        return self.get(attempt_id)
+
+    def mark_served(self, attempt_id):
+        key, _ = self._keys(attempt_id)
+        self.client.hsetnx(key, 'served_at', time.time())
+
+    def delete(self, attempt_id):
+        # Ключ хэша удаляет только один из конкурирующих вызовов.
+        key, q_key = self._keys(attempt_id)
+        deleted = self.client.delete(key)
+        self.client.delete(q_key)
+        return deleted > 0
+
+    def deadlines(self):
+        pending = []
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            if key.endswith(':q'):
+                continue
+            deadline = self.client.hmget(key, ['deadline'])[0]
+            if deadline is not None:
+                pending.append((key[len(self.prefix):], float(deadline)))
+        return pending
+
+
+def make_attempt_store(config):
+    backend = config.get('ATTEMPT_STORE', 'memory')
+    ttl = config.get('ATTEMPT_TTL', 4 * 3600)
+
+    if backend == 'memory':
+        return MemoryAttemptStore(max_entries=config.get('ATTEMPT_STORE_MAX', 100000), ttl=ttl)
+
+    if backend == 'sql':
+        return SQLAttemptStore()
+
+    if backend == 'redis':
+        url = config.get('REDIS_URL')
+        if url:
+            import redis
+            client = redis.Redis.from_url(url, decode_responses=True)
+        else:
+            client = LocalRedis()
+        return RedisAttemptStore(client, ttl=ttl)
+
+    raise ValueError(f'Неизвестное хранилище попыток: {backend}')
@@ -0,0 +1,77 @@
+# Размер cookie и задержка ответа на вопрос для разных хранилищ попыток.
+#
+#   python -m benchmarks.bench_attempts --sizes 10 100 1000
+
+import argparse
+import statistics
+import time
+
+from benchmarks.harness import load_app, login, import_synthetic, option_ids, percentile
+
+
+def legacy_cookie_size(app, user_id, test_id, question_ids):
+    serializer = app.session_interface.get_signing_serializer(app)
+    return len(serializer.dumps({
+        'user_id': user_id,
+        'test_progress': {
+            'test_id': test_id,
+            'question_ids': question_ids,
+            'current_q_index': 0,
+            'score': 0,
+            'total_questions': len(question_ids),
+        },
+    }))
+
+
+def run_attempt(client, test_id):
+    client.get(f'/test/start/{test_id}')
+    cookie_sizes = []
+    latencies = []
+
+    while True:
+        response = client.get('/test/question')
+        if response.status_code != 200:
+            break
+        ids = option_ids(response.get_data(as_text=True))
+
+        cookie_sizes.append(len(client.get_cookie('session').value))
+        started = time.perf_counter()
+        response = client.post('/test/answer', data={'option': ids[0]})
+        latencies.append(time.perf_counter() - started)
+        if '/test/question' not in response.location:
+            break
+
+    return cookie_sizes, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--backends', nargs='+', default=['memory', 'sql', 'redis'])
+    args = parser.parse_args()
+
+    app_module = load_app()
+    app = app_module.app
+    from attempts import make_attempt_store
+    from models import Question
+
+    tests = {size: import_synthetic(app_module, size, seed=size) for size in args.sizes}
+
+    print(f"{'вопросов':>9} {'хранилище':>10} {'cookie, Б':>10} {'было, Б':>8} {'ответ p50, мс':>14} {'p99, мс':>8}")
+    for backend in args.backends:
+        app_module.attempts = make_attempt_store(dict(app.config, ATTEMPT_STORE=backend, REDIS_URL=None))
+        for size, test_id in tests.items():
+            client = app.test_client()
+            login(client)
+            cookie_sizes, latencies = run_attempt(client, test_id)
+
+            with app.app_context():
+                question_ids = [q.id for q in Question.query.filter_by(test_id=test_id).order_by(Question.id)]
+            legacy = legacy_cookie_size(app, 1, test_id, question_ids)
+
+            print(f"{size:>9} {backend:>10} {max(cookie_sizes):>10} {legacy:>8} "
+                  f"{statistics.median(latencies) * 1000:>14.2f} {percentile(latencies, 99) * 1000:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# Сохранение теста из формы create_test: разбор формы, число SQL-запросов
+# и полное время POST-запроса для 50/500/5000 вопросов.
+#
+#   python -m benchmarks.bench_create --sizes 50 500 5000
+
+import argparse
+import time
+
+from werkzeug.datastructures import MultiDict
+
+from benchmarks.harness import load_app, login
+from benchmarks.synthetic import make_test
+
+
+def make_form(questions, seed=0):
+    test = make_test(questions, seed)
+    form = MultiDict({
+        'title': test['title'],
+        'description': test['description'],
+        'test_difficulty': test['difficulty'],
+    })
+    for i, q in enumerate(test['questions'], start=1):
+        form[f'q_text_{i}'] = q['text']
+        form[f'q_{i}_difficulty'] = q['difficulty']
+        form[f'q_{i}_time_limit'] = str(q['time_limit_sec'])
+        form[f'q_{i}_correct'] = str(q['correct_option_index'] + 1)
+        for o, o_text in enumerate(q['options'], start=1):
+            form[f'q_{i}_option_text_{o}'] = o_text
+    return form
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000])
+    args = parser.parse_args()
+
+    app_module = load_app()
+    import drafts
+    from models import db
+    from querycount import QueryCounter
+
+    client = app_module.app.test_client()
+    login(client)
+
+    print(f"{'вопросов':>10} {'разбор, мс':>11} {'POST, мс':>10} {'SQL':>6}")
+    for size in args.sizes:
+        form = make_form(size)
+
+        started = time.perf_counter()
+        draft, errors = drafts.parse_form(form)
+        parse_ms = (time.perf_counter() - started) * 1000
+        assert not errors and len(draft.questions) == size, errors[:5]
+
+        with app_module.app.app_context():
+            engine = db.engine
+        with QueryCounter(engine) as counter:
+            started = time.perf_counter()
+            response = client.post('/admin/create_test', data=form)
+            post_ms = (time.perf_counter() - started) * 1000
+        assert response.status_code == 302, response.status_code
+
+        print(f'{size:>10} {parse_ms:>11.1f} {post_ms:>10.1f} {counter.count:>6}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# Стоимость сборщика просроченных попыток при 100k одновременных попыток:
+# колесо таймеров против полного просмотра всех попыток на каждом шаге.
+# Сроки равномерно разбросаны на --horizon секунд, каждая попытка
+# переносится --reschedules раз (показ очередного вопроса).
+#
+#   python -m benchmarks.bench_deadlines --attempts 100000
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from deadlines import TimerWheel
+from benchmarks.harness import percentile
+
+
+class FullScan:
+    # Наивный сборщик: на каждом шаге перебирает все попытки.
+
+    def __init__(self):
+        self.deadlines = {}
+
+    def schedule(self, key, when):
+        self.deadlines[key] = when
+
+    def advance(self, now):
+        expired = [key for key, when in self.deadlines.items() if when <= now]
+        for key in expired:
+            del self.deadlines[key]
+        return expired
+
+
+def run(name, make, args):
+    rng = random.Random(0)
+    start = 1_000_000.0
+    keys = [f'{i:032x}' for i in range(args.attempts)]
+
+    tracemalloc.start()
+    scheduler = make(start)
+    for key in keys:
+        scheduler.schedule(key, start + args.horizon)
+    memory_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+    tracemalloc.stop()
+
+    scheduler = make(start)
+    started = time.perf_counter()
+    for _ in range(args.reschedules):
+        for key in keys:
+            scheduler.schedule(key, start + rng.uniform(1, args.horizon))
+    schedule_us = (time.perf_counter() - started) / (args.attempts * args.reschedules) * 1e6
+
+    tick_ms = []
+    expired = 0
+    for second in range(1, args.horizon + 2, args.step):
+        started = time.perf_counter()
+        expired += len(scheduler.advance(start + second))
+        tick_ms.append((time.perf_counter() - started) * 1000)
+    assert expired == args.attempts, expired
+
+    print(f'{name:>10} {schedule_us:>14.2f} {percentile(tick_ms, 50):>10.3f} '
+          f'{percentile(tick_ms, 99):>10.3f} {sum(tick_ms):>11.0f} {memory_mb:>9.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--attempts', type=int, default=100000)
+    parser.add_argument('--horizon', type=int, default=3600, help='Разброс сроков, сек.')
+    parser.add_argument('--reschedules', type=int, default=3)
+    parser.add_argument('--step', type=int, default=1, help='Шаг сборщика, сек.')
+    parser.add_argument('--scan-step', type=int, default=10, help='Шаг для полного просмотра (он медленный).')
+    args = parser.parse_args()
+
+    print(f"{'сборщик':>10} {'постановка, мкс':>14} {'p50 шага':>10} {'p99 шага':>10} {'всего, мс':>11} {'память, МБ':>9}")
+    run('wheel', lambda now: TimerWheel(tick=1.0, slots=4096, now=now), args)
+    run('full-scan', lambda now: FullScan(), argparse.Namespace(**dict(vars(args), step=args.scan_step)))
+
+
+if __name__ == '__main__':
+    main()
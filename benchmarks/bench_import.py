@@ -0,0 +1,96 @@
+# Сравнение старого пути импорта (json.load + flush на каждый вопрос)
+# со StreamingImporter: строк в секунду и пиковый RSS.
+#
+#   python -m benchmarks.bench_import --sizes 1000 10000 100000
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import write_test
+
+
+def legacy_import(db, stream):
+    from models import Test, Question, Option
+
+    json_data = json.load(stream)
+    new_test = Test(title=json_data['title'], description=json_data.get('description'),
+                    difficulty=json_data.get('difficulty', 'Средний'))
+    db.session.add(new_test)
+    db.session.flush()
+
+    for q_data in json_data['questions']:
+        new_question = Question(test_id=new_test.id, text=q_data['text'],
+                                difficulty=q_data.get('difficulty', 'Средний'),
+                                time_limit_sec=q_data.get('time_limit_sec', 60))
+        db.session.add(new_question)
+        db.session.flush()
+
+        for idx, o_text in enumerate(q_data['options']):
+            db.session.add(Option(question_id=new_question.id, text=o_text,
+                                  is_correct=(idx == q_data['correct_option_index'])))
+
+    db.session.commit()
+
+
+def run_child(mode, path, db_path):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+
+    from app import app
+    from models import db, Question, Option
+    from importer import import_stream
+
+    with app.app_context():
+        db.create_all()
+
+        started = time.perf_counter()
+        with open(path, 'rb') as stream:
+            if mode == 'legacy':
+                legacy_import(db, stream)
+            else:
+                import_stream(db.session, stream)
+                db.session.commit()
+        elapsed = time.perf_counter() - started
+
+        rows = db.session.query(Question).count() + db.session.query(Option).count()
+
+    print(json.dumps({
+        'mode': mode,
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed else 0,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--child', nargs=3, metavar=('MODE', 'PATH', 'DB'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    print(f"{'вопросов':>10} {'режим':>10} {'строк/с':>12} {'сек':>8} {'RSS, МБ':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = write_test(os.path.join(tmp, f'bank_{size}.json'), size)
+            for mode in ('legacy', 'streaming'):
+                db_path = os.path.join(tmp, f'{mode}_{size}.db')
+                out = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.bench_import', '--child', mode, path, db_path],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                row = json.loads(out.strip().splitlines()[-1])
+                print(f"{size:>10} {mode:>10} {row['rows_per_sec']:>12.0f} {row['seconds']:>8.2f} {row['peak_rss_mb']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# Всплеск логинов в начале экзамена: задержка логина, число отказов 503
+# и задержка остальных запросов (GET /) при хешировании в потоке запроса
+# и в пуле процессов.
+#
+#   python -m benchmarks.bench_login --burst 200
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.harness import load_app, percentile
+
+
+def run_child(burst):
+    app_module = load_app()
+    app = app_module.app
+    from models import db, User
+
+    password_hash = app_module.password_hasher.hash('bench')
+    with app.app_context():
+        db.session.add_all(User(username=f'student{i}', password_hash=password_hash) for i in range(burst))
+        db.session.commit()
+
+    logins = []
+    statuses = []
+    probes = []
+    done = threading.Event()
+
+    def student(i):
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post('/login', data={'username': f'student{i}', 'password': 'bench'})
+        logins.append(time.perf_counter() - started)
+        statuses.append(response.status_code)
+
+    def probe():
+        client = app.test_client()
+        while not done.is_set():
+            started = time.perf_counter()
+            client.get('/')
+            probes.append(time.perf_counter() - started)
+            time.sleep(0.01)
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    threads = [threading.Thread(target=student, args=(i,)) for i in range(burst)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    prober.join()
+    app_module.password_hasher.shutdown()
+
+    print(json.dumps({
+        'seconds': elapsed,
+        'ok': statuses.count(302),
+        'rejected': statuses.count(503),
+        'login_p50_ms': percentile(logins, 50) * 1000,
+        'login_p99_ms': percentile(logins, 99) * 1000,
+        'probe_p99_ms': percentile(probes, 99) * 1000,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--burst', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--max-queue', type=int, default=64)
+    parser.add_argument('--method', default='pbkdf2:sha256')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.burst)
+        return
+
+    modes = [
+        ('в потоке запроса', {'PASSWORD_HASH_WORKERS': '0', 'PASSWORD_HASH_MAX_QUEUE': str(args.burst + 1)}),
+        (f'пул ({args.workers} проц.)', {'PASSWORD_HASH_WORKERS': str(args.workers),
+                                          'PASSWORD_HASH_MAX_QUEUE': str(args.max_queue)}),
+    ]
+
+    print(f"{'режим':>18} {'сек':>6} {'успех':>6} {'503':>5} {'логин p50':>10} {'логин p99':>10} {'GET / p99':>10}")
+    for name, env in modes:
+        out = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_login', '--child', '--burst', str(args.burst)],
+            env=dict(os.environ, PASSWORD_HASH_METHOD=args.method, **env),
+            check=True, capture_output=True, text=True,
+        ).stdout
+        row = json.loads(out.strip().splitlines()[-1])
+        print(f"{name:>18} {row['seconds']:>6.1f} {row['ok']:>6} {row['rejected']:>5} "
+              f"{row['login_p50_ms']:>10.0f} {row['login_p99_ms']:>10.0f} {row['probe_p99_ms']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# Байты и время ответа по маршрутам: первый визит (рендеринг) и повторный с
+# If-None-Match (304 без рендеринга), статика с отпечатком, а также загрузка
+# шаблонов с диска без кэша байткода и из него (перезапуск процесса).
+#
+#   python -m benchmarks.bench_pages --tests 200 --repeat 200
+
+import argparse
+import tempfile
+import time
+
+from benchmarks.harness import load_app, login, import_synthetic, percentile
+
+
+def measure(client, url, repeat, headers=None):
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url, headers=headers or {})
+        body = response.get_data()
+        timings.append((time.perf_counter() - started) * 1000)
+        size = len(body)
+        status = response.status_code
+        etag = response.headers.get('ETag')
+        response.close()
+    return status, size, percentile(timings, 50), etag
+
+
+def load_templates(app, bytecode_cache):
+    from jinja2 import Environment
+
+    env = Environment(loader=app.jinja_loader, bytecode_cache=bytecode_cache)
+    started = time.perf_counter()
+    for name in env.list_templates(extensions=['html']):
+        env.get_template(name)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tests', type=int, default=200)
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    app_module = load_app(JINJA_CACHE_DIR=tempfile.mkdtemp(prefix='bench_jinja_'))
+    app = app_module.app
+    for seed in range(args.tests):
+        test_id = import_synthetic(app_module, args.questions, seed=seed)
+
+    client = app.test_client()
+    login(client)
+    index_css = client.get('/').get_data(as_text=True).split('href="/static/css/index.css')[1].split('"')[0]
+
+    routes = [
+        ('/', '/'),
+        ('/?q=', '/?q=вопрос'),
+        ('create_test', '/admin/create_test'),
+        ('export_test', f'/admin/export/test/{test_id}.json'),
+        ('index.css', '/static/css/index.css' + index_css),
+    ]
+
+    print(f"{'маршрут':>12} {'код':>4} {'байт':>8} {'p50, мс':>8}   {'повтор':>6} {'байт':>5} {'p50, мс':>8}")
+    for name, url in routes:
+        status, size, p50, etag = measure(client, url, args.repeat)
+        headers = {'If-None-Match': etag} if etag else {}
+        repeat_status, repeat_size, repeat_p50, _ = measure(client, url, args.repeat, headers)
+        print(f'{name:>12} {status:>4} {size:>8} {p50:>8.2f}   {repeat_status:>6} {repeat_size:>5} {repeat_p50:>8.2f}')
+
+    bytecode_cache = app.jinja_env.bytecode_cache
+    cold = load_templates(app, None)
+    load_templates(app, bytecode_cache)
+    warm = load_templates(app, bytecode_cache)
+    print(f'Загрузка всех шаблонов: компиляция {cold:.1f} мс, из кэша байткода {warm:.1f} мс')
+
+
+if __name__ == '__main__':
+    main()
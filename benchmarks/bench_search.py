@@ -0,0 +1,104 @@
+# Задержка полнотекстового поиска на банке из --questions вопросов:
+# редкое и частое слово, префикс, несколько слов, фильтр по сложности и
+# дальняя страница выдачи.
+#
+#   python -m benchmarks.bench_search --questions 100000
+
+import argparse
+import io
+import json
+import random
+import time
+
+from benchmarks.harness import load_app, percentile
+from benchmarks.synthetic import DIFFICULTIES
+
+SYLLABLES = ['ка', 'ро', 'ми', 'ту', 'ле', 'на', 'во', 'си', 'да', 'пе', 'жу', 'ёл', 'ры', 'бо', 'ща']
+
+
+def make_vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_bank(questions, per_test, seed=0):
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng, 5000)
+    # Частоты слов по Ципфу: несколько очень частых и длинный хвост редких.
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+
+    lines = []
+    for test_index in range(questions // per_test):
+        lines.append(json.dumps({
+            'title': ' '.join(rng.choices(vocabulary, weights, k=3)).capitalize(),
+            'description': ' '.join(rng.choices(vocabulary, weights, k=12)),
+            'difficulty': rng.choice(DIFFICULTIES),
+            'questions': [
+                {
+                    'text': ' '.join(rng.choices(vocabulary, weights, k=10)) + '?',
+                    'difficulty': rng.choice(DIFFICULTIES),
+                    'options': ['да', 'нет'],
+                    'correct_option_index': 0,
+                }
+                for _ in range(per_test)
+            ],
+        }, ensure_ascii=False))
+    return vocabulary, '\n'.join(lines).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--per-test', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    app_module = load_app()
+    import search
+    from models import db
+    from importer import import_stream
+
+    vocabulary, payload = make_bank(args.questions, args.per_test)
+    with app_module.app.app_context():
+        started = time.perf_counter()
+        import_stream(db.session, io.BytesIO(payload))
+        db.session.commit()
+        print(f'Импорт с индексацией: {time.perf_counter() - started:.1f} с, вопросов: {args.questions}')
+
+    frequent, rare = vocabulary[0], vocabulary[-1]
+    cases = [
+        ('редкое слово', dict(query=rare)),
+        ('частое слово', dict(query=frequent)),
+        ('префикс', dict(query=frequent[:3])),
+        ('два слова', dict(query=f'{frequent} {vocabulary[1]}')),
+        ('+ сложность', dict(query=frequent, difficulty='Сложный')),
+        ('страница 10', dict(query=frequent, page=10)),
+        ('только фильтр', dict(query='', difficulty='Легкий')),
+    ]
+
+    print(f"{'запрос':>14} {'тестов':>7} {'p50, мс':>9} {'p95, мс':>9}")
+    with app_module.app.app_context():
+        for name, kwargs in cases:
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                page = search.search(limit=50, **kwargs)
+                timings.append((time.perf_counter() - started) * 1000)
+            found = sum(count for _, count in page.facets)
+            print(f'{name:>14} {found:>7} {percentile(timings, 50):>9.2f} {percentile(timings, 95):>9.2f}')
+
+        # Листание страниц из кэша кандидатов: FTS-запрос выполняется один раз.
+        cache = search.CandidateCache()
+        timings = []
+        for page_number in range(1, args.repeat + 1):
+            started = time.perf_counter()
+            page = search.search(frequent, page=page_number, limit=50, cache=cache, version=0)
+            timings.append((time.perf_counter() - started) * 1000)
+        found = sum(count for _, count in page.facets)
+        print(f"{'страницы, кэш':>14} {found:>7} {percentile(timings, 50):>9.2f} {percentile(timings, 95):>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
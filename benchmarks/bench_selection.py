@@ -0,0 +1,62 @@
+# Скорость выбора вопросов попытки по режимам: draw для всей попытки и
+# next_adaptive на шаг. Работает без БД на синтетическом CompiledTest.
+#
+#   python -m benchmarks.bench_selection --pools 1000 10000 100000 --count 50
+
+import argparse
+import random
+import time
+
+from compiled import CompiledOption, CompiledQuestion, CompiledTest
+from benchmarks.synthetic import DIFFICULTIES
+
+
+def make_compiled(pool_size, count, mode, seed=0):
+    rng = random.Random(seed)
+    questions = tuple(
+        CompiledQuestion(q_id, f'Вопрос {q_id}', rng.choice(DIFFICULTIES), 60,
+                         tuple(CompiledOption(q_id * 10 + o, f'Вариант {o}') for o in range(4)))
+        for q_id in range(1, pool_size + 1)
+    )
+    return CompiledTest(1, questions, {}, mode=mode, draw_count=count, shuffle_options=True)
+
+
+def run_attempt(selection, compiled, seed, rng):
+    served = selection.draw(compiled, seed)
+    if compiled.mode == 'adaptive':
+        while len(served) < compiled.draw_count:
+            served.append(selection.next_adaptive(compiled, seed, served, rng.random() < 0.6))
+    return served
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pools', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--count', type=int, default=50)
+    parser.add_argument('--attempts', type=int, default=2000)
+    args = parser.parse_args()
+
+    import selection
+
+    print(f"{'банк':>8} {'режим':>11} {'попыток/с':>11} {'мкс/вопрос':>11}")
+    for pool_size in args.pools:
+        for mode in selection.MODES:
+            compiled = make_compiled(pool_size, args.count, mode)
+            rng = random.Random(1)
+
+            # Одинаковый seed и одинаковые ответы дают ту же попытку.
+            first = run_attempt(selection, compiled, 42, random.Random(7))
+            assert first == run_attempt(selection, compiled, 42, random.Random(7))
+            assert len(set(first)) == compiled.draw_count
+
+            started = time.perf_counter()
+            for seed in range(args.attempts):
+                run_attempt(selection, compiled, seed, rng)
+            elapsed = time.perf_counter() - started
+
+            print(f'{pool_size:>8} {mode:>11} {args.attempts / elapsed:>11.0f} '
+                  f'{elapsed / args.attempts / compiled.draw_count * 1e6:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# Одновременная запись результатов при 1, 4 и 8 шардах: потоки-участники
+# проходят попытки по разным тестам (ответы через журнал ответов, затем
+# finish_attempt), каждый прогон — в отдельном процессе со своими файлами
+# SQLite. 0 в --shards — без RESULT_SHARDS, все в основной БД.
+#
+#   python -m benchmarks.bench_shards --writers 32 --attempts 20
+#   python -m benchmarks.bench_shards --shards 0,1,4,8 --questions 20
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.harness import load_app, import_synthetic, percentile
+
+
+def create_users(app_module, count):
+    from models import db, User
+
+    with app_module.app.app_context():
+        users = [User(username=f'writer{i}', password_hash='-') for i in range(count)]
+        db.session.add_all(users)
+        db.session.commit()
+        return [user.id for user in users]
+
+
+def write_attempts(app_module, user_id, test_ids, attempts, latencies, errors):
+    app = app_module.app
+    for n in range(attempts):
+        test_id = test_ids[(user_id + n) % len(test_ids)]
+        started = time.perf_counter()
+        try:
+            with app.app_context():
+                compiled = app_module.compiled_tests.get(test_id)
+                attempt_id = app_module.attempts.create(user_id, test_id, compiled.question_ids)
+                score = 0
+                for q_id in compiled.question_ids:
+                    option_id = compiled.questions[q_id].options[0].id
+                    is_correct = option_id in compiled.answer_key[q_id]
+                    score += 1 if is_correct else 0
+                    app_module.answer_log.record(attempt_id, user_id, test_id, q_id, option_id, is_correct, 1000)
+                progress = dict(app_module.attempts.get(attempt_id), score=score)
+                app_module.finish_attempt(attempt_id, progress)
+        except Exception as e:
+            errors.append(repr(e))
+        latencies.append(time.perf_counter() - started)
+
+
+def run_child(writers, attempts, tests, questions):
+    app_module = load_app()
+    from shards import result_shards
+
+    with app_module.app.app_context():
+        result_shards.create_all()
+    test_ids = [import_synthetic(app_module, questions, seed=seed) for seed in range(tests)]
+    user_ids = create_users(app_module, writers)
+
+    latencies = []
+    errors = []
+    threads = [
+        threading.Thread(target=write_attempts,
+                         args=(app_module, user_id, test_ids, attempts, latencies, errors))
+        for user_id in user_ids
+    ]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app_module.app.app_context():
+        stored = [counts['results'] for _, counts in result_shards.status()]
+
+    print(json.dumps({
+        'attempts': len(latencies),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'results_per_shard': stored,
+        'throughput': len(latencies) / elapsed,
+        'answers_per_sec': len(latencies) * questions / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shards', default='1,4,8', help='Числа шардов через запятую.')
+    parser.add_argument('--writers', type=int, default=32)
+    parser.add_argument('--attempts', type=int, default=20, help='Попыток на поток.')
+    parser.add_argument('--tests', type=int, default=16)
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.writers, args.attempts, args.tests, args.questions)
+        return
+
+    print(f"{'шардов':>6} {'попыток':>8} {'ошибок':>7} {'попыток/с':>10} {'ответов/с':>10} "
+          f"{'p50, мс':>8} {'p99, мс':>8}   результатов по шардам")
+    for count in [int(value) for value in args.shards.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ,
+                       DATABASE_URL='sqlite:///' + os.path.join(tmp, 'primary.db'),
+                       RESULT_SHARDS=','.join('sqlite:///' + os.path.join(tmp, f'shard{i}.db')
+                                              for i in range(count)),
+                       ATTEMPT_STORE='memory')
+            out = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_shards', '--child',
+                 '--writers', str(args.writers), '--attempts', str(args.attempts),
+                 '--tests', str(args.tests), '--questions', str(args.questions)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+        row = json.loads(out.strip().splitlines()[-1])
+        print(f"{count:>6} {row['attempts']:>8} {row['errors']:>7} {row['throughput']:>10.0f} "
+              f"{row['answers_per_sec']:>10.0f} {row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f}   "
+              f"{row['results_per_shard']}")
+        if row['first_error']:
+            print(f"       первая ошибка: {row['first_error']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import io
+import json
+import os
+import re
+import tempfile
+
+from benchmarks.synthetic import make_test
+
+_OPTION_RE = re.compile(r'name="option" value="(\d+)"')
+
+
+def load_app(db_path=None, **overrides):
+    if not os.environ.get('DATABASE_URL'):
+        if db_path is None:
+            db_path = os.path.join(tempfile.mkdtemp(prefix='bench_'), 'bench.db')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+
+    import config
+
+    for key, value in overrides.items():
+        setattr(config, key, value)
+
+    import app as app_module
+    import migrations
+    from models import db, User
+    from werkzeug.security import generate_password_hash
+
+    app = app_module.app
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        migrations.upgrade()
+        if not User.query.filter_by(username='admin').first():
+            db.session.add(User(username='admin', password_hash=generate_password_hash('adm1n'), is_admin=True))
+            db.session.commit()
+    return app_module
+
+
+def login(client, username='admin', password='adm1n'):
+    response = client.post('/login', data={'username': username, 'password': password})
+    assert response.status_code == 302, response.status_code
+
+
+def import_synthetic(app_module, questions, seed=0):
+    from models import db
+    from importer import import_stream
+
+    payload = json.dumps(make_test(questions, seed), ensure_ascii=False).encode('utf-8')
+    with app_module.app.app_context():
+        imported = import_stream(db.session, io.BytesIO(payload))
+        db.session.commit()
+    app_module.catalogue.bump()
+    return imported[0][0]
+
+
+def create_users(app_module, names, password, method='pbkdf2:sha256:1'):
+    from models import db, User
+    from werkzeug.security import generate_password_hash
+
+    password_hash = generate_password_hash(password, method=method)
+    with app_module.app.app_context():
+        existing = set(db.session.scalars(db.select(User.username).where(User.username.in_(names))))
+        db.session.add_all(User(username=name, password_hash=password_hash)
+                           for name in names if name not in existing)
+        db.session.commit()
+        return dict(db.session.execute(db.select(User.username, User.id).where(User.username.in_(names))).all())
+
+
+def seed_history(app_module, rows):
+    # Результаты — в шарды тестов (или основную БД), сводки профиля — по ним.
+    from sqlalchemy import insert
+    from models import db, Result, UserTestSummary
+    from shards import result_shards
+
+    summaries = {}
+    for row in sorted(rows, key=lambda row: row['date_completed']):
+        summary = summaries.setdefault((row['user_id'], row['test_id']), {
+            'user_id': row['user_id'], 'test_id': row['test_id'], 'attempts': 0, 'best_score': row['score'],
+        })
+        summary['attempts'] += 1
+        summary['best_score'] = max(summary['best_score'], row['score'])
+        summary.update(last_score=row['score'], last_attempt_at=row['date_completed'],
+                       total_questions=row['total_questions'])
+
+    results = [{key: row[key] for key in ('user_id', 'test_id', 'score', 'total_questions', 'date_completed', 'seed')}
+               for row in rows]
+    with app_module.app.app_context():
+        result_shards.create_all()
+        for engine, group in result_shards.split(results):
+            if engine is None:
+                db.session.execute(insert(Result), group)
+            else:
+                with engine.begin() as conn:
+                    conn.execute(insert(Result), group)
+        if summaries:
+            db.session.execute(insert(UserTestSummary), list(summaries.values()))
+        db.session.commit()
+
+
+def option_ids(html):
+    return _OPTION_RE.findall(html)
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,318 @@
+# Нагрузка синхронного экзамена на настоящий HTTP-сервер: N участников
+# входят и начинают тест, затем одновременно проходят его (вопрос -> ответ
+# с паузой на размышление). Пропускная способность и p50/p99 по маршрутам.
+#
+#   python -m benchmarks.loadgen --takers 1000 5000                   # python app.py (app.run)
+#   python -m benchmarks.loadgen --server gthread --takers 1000 5000  # gunicorn.conf.py
+#   python -m benchmarks.loadgen --server gevent --workers 4 --takers 1000 5000
+#   DATABASE_URL=... python -m benchmarks.loadgen --url http://127.0.0.1:8000 --takers 1000
+#
+# С --url данные (тест и участники taker0..N) создаются в базе DATABASE_URL,
+# которую использует уже запущенный сервер.
+
+import argparse
+import asyncio
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.harness import load_app, import_synthetic, option_ids, percentile
+
+PASSWORD = 'bench'
+HASH_METHOD = 'pbkdf2:sha256:1'
+
+
+class Connection:
+    # Минимальный клиент HTTP/1.1 с keep-alive и cookie: тысячи участников
+    # в одном процессе без сторонних библиотек.
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.cookies = {}
+        self._reader = None
+        self._writer = None
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+    async def request(self, method, path, form=None):
+        body = urlencode(form).encode() if form is not None else b''
+        head = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}']
+        if self.cookies:
+            head.append('Cookie: ' + '; '.join(f'{k}={v}' for k, v in self.cookies.items()))
+        if form is not None:
+            head.append('Content-Type: application/x-www-form-urlencoded')
+        head.append(f'Content-Length: {len(body)}')
+        payload = ('\r\n'.join(head) + '\r\n\r\n').encode() + body
+
+        for retry in (True, False):
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.timeout)
+            try:
+                self._writer.write(payload)
+                return await asyncio.wait_for(self._response(), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # Сервер закрыл keep-alive соединение между запросами.
+                await self.close()
+                if not retry:
+                    raise
+
+    async def _response(self):
+        status_line = await self._reader.readuntil(b'\r\n')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = (await self._reader.readuntil(b'\r\n')).decode('latin-1').rstrip('\r\n')
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            name, value = name.strip().lower(), value.strip()
+            if name == 'set-cookie':
+                cookie, _, attributes = value.partition(';')
+                key, _, cookie_value = cookie.partition('=')
+                if cookie_value and 'max-age=0' not in attributes.lower():
+                    self.cookies[key] = cookie_value
+                else:
+                    self.cookies.pop(key, None)
+            else:
+                headers[name] = value
+
+        if headers.get('transfer-encoding') == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self._reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                chunk = await self._reader.readexactly(size + 2)
+                if not size:
+                    break
+                chunks.append(chunk[:-2])
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await self._reader.readexactly(int(headers['content-length']))
+        else:
+            body = await self._reader.read()
+            headers['connection'] = 'close'
+
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, headers, body
+
+
+class Stats:
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = 0
+        self.failed_takers = 0
+
+    def add(self, route, seconds):
+        self.latencies.setdefault(route, []).append(seconds * 1000)
+
+    def all(self):
+        return [value for values in self.latencies.values() for value in values]
+
+
+async def timed(stats, route, call):
+    started = time.perf_counter()
+    try:
+        status, headers, body = await call
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        stats.errors += 1
+        raise
+    stats.add(route, time.perf_counter() - started)
+    if status >= 500:
+        stats.errors += 1
+    return status, headers, body
+
+
+async def enter(conn, username, test_id, setup):
+    # Вход и старт теста — подготовка, не входят в замер; 503 при очереди
+    # хеширования паролей повторяется через Retry-After.
+    while True:
+        status, headers, _ = await timed(setup, 'login', conn.request(
+            'POST', '/login', {'username': username, 'password': PASSWORD}))
+        if status != 503:
+            break
+        await asyncio.sleep(float(headers.get('retry-after', 1)))
+    if status != 302:
+        raise RuntimeError(f'вход {username}: HTTP {status}')
+
+    status, headers, _ = await timed(setup, 'test_start', conn.request('GET', f'/test/start/{test_id}'))
+    if status != 302 or '/test/question' not in headers.get('location', ''):
+        raise RuntimeError(f'старт теста {username}: HTTP {status}')
+
+
+async def take(conn, stats, think, rng):
+    while True:
+        status, _, body = await timed(stats, 'test_question', conn.request('GET', '/test/question'))
+        if status != 200:
+            return
+        ids = option_ids(body.decode('utf-8'))
+        await asyncio.sleep(think * rng.uniform(0.5, 1.5))
+        status, headers, _ = await timed(stats, 'test_answer', conn.request(
+            'POST', '/test/answer', {'option': rng.choice(ids)}))
+        if '/test/question' not in headers.get('location', ''):
+            return
+
+
+async def run_round(host, port, test_id, takers, think, timeout, seed):
+    setup = Stats()
+    stats = Stats()
+    start = asyncio.Event()
+    rng = random.Random(seed)
+
+    async def taker(i):
+        conn = Connection(host, port, timeout)
+        try:
+            await enter(conn, f'taker{i}', test_id, setup)
+            ready.append(i)
+            await start.wait()
+            await take(conn, stats, think, random.Random(rng.random()))
+        except (OSError, RuntimeError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError):
+            stats.failed_takers += 1
+        finally:
+            await conn.close()
+
+    ready = []
+    tasks = [asyncio.create_task(taker(i)) for i in range(takers)]
+    while len(ready) + stats.failed_takers < takers:
+        await asyncio.sleep(0.1)
+
+    # Экзамен начинается для всех одновременно.
+    started = time.perf_counter()
+    start.set()
+    await asyncio.gather(*tasks)
+    return stats, setup, time.perf_counter() - started
+
+
+def create_takers(app_module, count):
+    from models import db, User
+    from werkzeug.security import generate_password_hash
+
+    password_hash = generate_password_hash(PASSWORD, method=app_module.password_hasher.method)
+    with app_module.app.app_context():
+        existing = set(db.session.scalars(
+            db.select(User.username).where(User.username.like('taker%'))))
+        db.session.add_all(User(username=f'taker{i}', password_hash=password_hash)
+                           for i in range(count) if f'taker{i}' not in existing)
+        db.session.commit()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'сервер завершился с кодом {process.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('сервер не начал принимать соединения')
+
+
+def start_server(kind, port, workers, env):
+    if kind == 'dev':
+        command = [sys.executable, '-m', 'benchmarks.loadgen', '--serve-dev', str(port)]
+    else:
+        if shutil.which('gunicorn') is None:
+            raise SystemExit('gunicorn не установлен: pip install gunicorn gevent')
+        command = ['gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:application']
+        env = dict(env, WEB_BIND=f'127.0.0.1:{port}', WEB_WORKER_CLASS=kind, WEB_WORKERS=str(workers))
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port, process)
+    return process
+
+
+def serve_dev(port):
+    import app as app_module
+
+    app_module.start_background()
+    app_module.app.run(host='127.0.0.1', port=port, threaded=True)
+
+
+def raise_file_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--takers', type=int, nargs='+', default=[1000, 5000])
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--think', type=float, default=1.0, help='Средняя пауза перед ответом, с.')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--server', choices=['dev', 'gthread', 'gevent'], default='dev')
+    parser.add_argument('--workers', type=int, default=(os.cpu_count() or 1) * 2 + 1)
+    parser.add_argument('--attempt-store', help='По умолчанию memory для dev и sql для gunicorn.')
+    parser.add_argument('--url', help='Уже запущенный сервер (данные готовятся в DATABASE_URL).')
+    parser.add_argument('--test-id', type=int)
+    parser.add_argument('--serve-dev', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_dev:
+        serve_dev(args.serve_dev)
+        return
+
+    raise_file_limit()
+    store = args.attempt_store or ('memory' if args.server == 'dev' else 'sql')
+    if not args.url:
+        os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='loadgen_'), 'load.db'))
+    os.environ['ATTEMPT_STORE'] = store
+    # Вход — только подготовка: дешевый хеш, чтобы замер не упирался в
+    # pbkdf2 (и сервер не перехешировал пароли при входе).
+    os.environ.setdefault('PASSWORD_HASH_METHOD', HASH_METHOD)
+
+    app_module = load_app()
+    test_id = args.test_id or import_synthetic(app_module, args.questions)
+    create_takers(app_module, max(args.takers))
+
+    process = None
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        host, port = '127.0.0.1', free_port()
+        process = start_server(args.server, port, args.workers, dict(os.environ))
+
+    name = args.url or args.server
+    print(f'{name}: тест #{test_id}, хранилище попыток {store}, пауза {args.think} с')
+    print(f"{'участников':>10} {'запросов':>9} {'ошибок':>7} {'сбоев':>6} {'запр/с':>8} "
+          f"{'p50, мс':>8} {'p99, мс':>8} {'p99 вопрос':>11} {'p99 ответ':>10}")
+    try:
+        for round_number, takers in enumerate(args.takers):
+            stats, _, elapsed = asyncio.run(
+                run_round(host, port, test_id, takers, args.think, args.timeout, round_number))
+            latencies = stats.all()
+            print(f'{takers:>10} {len(latencies):>9} {stats.errors:>7} {stats.failed_takers:>6} '
+                  f'{len(latencies) / elapsed:>8.0f} {percentile(latencies, 50):>8.1f} '
+                  f'{percentile(latencies, 99):>8.1f} '
+                  f"{percentile(stats.latencies.get('test_question', []), 99):>11.1f} "
+                  f"{percentile(stats.latencies.get('test_answer', []), 99):>10.1f}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,474 @@
+# Набор сценариев нагрузки на синтетических данных: всплеск регистраций,
+# импорт тестов, прохождение теста (test_start -> test_question ->
+# test_answer) и просмотр результатов администратором. Запускается в
+# процессе через тестовый клиент Flask или против настоящего сервера; итог
+# (p50/p95/p99 по маршрутам) сохраняется в JSON, а с --baseline запуск
+# завершается с кодом 1, если p95 какого-то маршрута вырос больше порога.
+#
+#   python -m benchmarks.suite                                    # в процессе
+#   python -m benchmarks.suite --server gthread --takers 200      # gunicorn.conf.py
+#   DATABASE_URL=... python -m benchmarks.suite --url http://127.0.0.1:8000
+#   python -m benchmarks.suite --baseline benchmarks/results/old.json --threshold 0.2
+#   python -m benchmarks.suite --compare old.json new.json
+#   python -m benchmarks.suite --fixture data/test.json --scenarios import,take
+
+import argparse
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.harness import load_app, create_users, seed_history, option_ids, percentile
+from benchmarks.synthetic import make_tests, to_jsonl, usernames, make_history
+
+PASSWORD = 'bench'
+ADMIN_PASSWORD = os.getenv('BENCH_ADMIN_PASSWORD', 'adm1n')
+HASH_METHOD = 'pbkdf2:sha256:1'
+SCENARIOS = ('register', 'import', 'take', 'admin')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+class InProcessClient:
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, form=None, files=None):
+        data = dict(form or {})
+        for name, (filename, payload) in (files or {}).items():
+            data[name] = (io.BytesIO(payload), filename)
+        response = self._client.open(path, method=method, data=data or None)
+        body = response.get_data()
+        response.close()
+        return response.status_code, response.headers.get('Location', ''), body
+
+
+def _multipart(form, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in form.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, payload) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode() + payload + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class HttpClient:
+    # Синхронный клиент с keep-alive и cookie для потоков сценариев.
+
+    def __init__(self, url, timeout=60):
+        target = urlsplit(url)
+        self.host = target.hostname
+        self.port = target.port or 80
+        self.timeout = timeout
+        self.cookies = {}
+        self._conn = None
+
+    def request(self, method, path, form=None, files=None):
+        headers = {}
+        body = None
+        if files:
+            body, headers['Content-Type'] = _multipart(form or {}, files)
+        elif form is not None:
+            body = urlencode(form).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+
+        for retry in (True, False):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self._conn.request(method, path, body=body, headers=headers)
+                response = self._conn.getresponse()
+                payload = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionError):
+                # Сервер закрыл keep-alive соединение между запросами.
+                self._conn.close()
+                self._conn = None
+                if not retry:
+                    raise
+
+        for name, value in response.getheaders():
+            if name.lower() != 'set-cookie':
+                continue
+            cookie, _, attributes = value.partition(';')
+            key, _, cookie_value = cookie.partition('=')
+            if cookie_value and 'max-age=0' not in attributes.lower():
+                self.cookies[key] = cookie_value
+            else:
+                self.cookies.pop(key, None)
+        if response.will_close:
+            self._conn.close()
+            self._conn = None
+        return response.status, response.getheader('Location', ''), payload
+
+
+class Recorder:
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def fail(self, route):
+        with self._lock:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def call(self, client, route, method, path, form=None, files=None):
+        started = time.perf_counter()
+        try:
+            status, location, body = client.request(method, path, form, files)
+        except OSError:
+            self.fail(route)
+            raise
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.latencies.setdefault(route, []).append(elapsed)
+        if status >= 500:
+            self.fail(route)
+        return status, location, body
+
+    def report(self, elapsed):
+        routes = {}
+        for route in sorted(set(self.latencies) | set(self.errors)):
+            values = self.latencies.get(route, [])
+            routes[route] = {
+                'count': len(values),
+                'errors': self.errors.get(route, 0),
+                'mean_ms': sum(values) / len(values) if values else 0.0,
+                'p50_ms': percentile(values, 50),
+                'p95_ms': percentile(values, 95),
+                'p99_ms': percentile(values, 99),
+                'max_ms': max(values, default=0.0),
+            }
+        requests = sum(route['count'] for route in routes.values())
+        return {
+            'elapsed_s': elapsed,
+            'requests': requests,
+            'errors': sum(route['errors'] for route in routes.values()),
+            'throughput': requests / elapsed if elapsed else 0.0,
+            'routes': routes,
+        }
+
+
+def login(client, username, password=PASSWORD):
+    # Вход — подготовка и в замер не входит; 503 при очереди хеширования
+    # повторяется.
+    for _ in range(100):
+        status, location, _ = client.request('POST', '/login', {'username': username, 'password': password})
+        if status != 503:
+            break
+        time.sleep(0.5)
+    if status != 302 or '/login' in location:
+        raise RuntimeError(f'вход {username}: HTTP {status}')
+
+
+def run_parallel(work, items, concurrency):
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for _ in pool.map(work, items):
+            pass
+
+
+def scenario_register(ctx, recorder):
+    def register(i):
+        client = ctx.client()
+        status, location, _ = recorder.call(client, 'register', 'POST', '/register',
+                                            {'username': f'{ctx.prefix}reg{i}', 'password': PASSWORD})
+        if status != 302 or '/login' not in location:
+            recorder.fail('register')
+
+    run_parallel(register, range(ctx.args.registrations), ctx.args.concurrency)
+
+
+def scenario_import(ctx, recorder):
+    client = ctx.client()
+    login(client, 'admin', ADMIN_PASSWORD)
+    for i in range(ctx.args.imports):
+        if ctx.fixture:
+            filename, payload = ctx.fixture
+        else:
+            tests = make_tests(ctx.args.import_tests, ctx.args.questions, seed=ctx.args.seed + 1000 + i,
+                               options_per_question=ctx.args.options)
+            filename, payload = 'synthetic.jsonl', to_jsonl(tests)
+        status, location, _ = recorder.call(client, 'import_test', 'POST', '/admin/import_test',
+                                            files={'file': (filename, payload)})
+        if status != 302 or urlsplit(location).path != '/':
+            recorder.fail('import_test')
+
+
+def scenario_take(ctx, recorder):
+    def take(username):
+        client = ctx.client()
+        rng = random.Random(username)
+        login(client, username)
+        status, location, _ = recorder.call(client, 'test_start', 'GET', f'/test/start/{ctx.test_id}')
+        if '/test/question' not in location:
+            recorder.fail('test_start')
+            return
+        while True:
+            status, _, body = recorder.call(client, 'test_question', 'GET', '/test/question')
+            ids = option_ids(body.decode('utf-8')) if status == 200 else []
+            if not ids:
+                return
+            status, location, _ = recorder.call(client, 'test_answer', 'POST', '/test/answer',
+                                                {'option': rng.choice(ids)})
+            if '/test/question' not in location:
+                return
+
+    run_parallel(take, ctx.takers, ctx.args.concurrency)
+
+
+def scenario_admin(ctx, recorder):
+    admin = ctx.client()
+    login(admin, 'admin', ADMIN_PASSWORD)
+    viewers = []
+    for username in ctx.takers[:ctx.args.concurrency]:
+        client = ctx.client()
+        login(client, username)
+        viewers.append(client)
+
+    def view(n):
+        test_id = ctx.test_ids[n % len(ctx.test_ids)]
+        pages = [
+            (admin, 'test_results', f'/admin/test_results/{test_id}'),
+            (admin, 'test_analytics', f'/admin/test_analytics/{test_id}'),
+            (admin, 'question_stats', f'/admin/question_stats/{test_id}'),
+            (admin, 'index', '/'),
+        ]
+        if viewers:
+            pages.append((viewers[n % len(viewers)], 'profile', '/profile'))
+        for client, route, path in pages:
+            status, _, _ = recorder.call(client, route, 'GET', path)
+            if status != 200:
+                recorder.fail(route)
+
+    # Администратор один: просмотры идут подряд в одном потоке.
+    for n in range(ctx.args.admin_views):
+        view(n)
+
+
+RUNNERS = {
+    'register': scenario_register,
+    'import': scenario_import,
+    'take': scenario_take,
+    'admin': scenario_admin,
+}
+
+
+class Context:
+
+    def __init__(self, args, client, prefix, test_ids, takers, fixture):
+        self.args = args
+        self.client = client
+        self.prefix = prefix
+        self.test_ids = test_ids
+        self.test_id = test_ids[0]
+        self.takers = takers
+        self.fixture = fixture
+
+
+def prepare(app_module, args, prefix):
+    # Данные, не входящие в замер: тесты, участники и история результатов.
+    from models import db
+    from importer import import_stream
+
+    fixture = None
+    if args.fixture:
+        with open(args.fixture, 'rb') as f:
+            fixture = (os.path.basename(args.fixture), f.read())
+        payload = fixture[1]
+    else:
+        payload = to_jsonl(make_tests(args.tests, args.questions, args.seed, args.options))
+
+    with app_module.app.app_context():
+        imported = import_stream(db.session, io.BytesIO(payload))
+        db.session.commit()
+    app_module.catalogue.bump()
+    tests = [(test_id, count) for test_id, _, count in imported]
+
+    names = usernames(max(args.takers, args.users), prefix + 'user')
+    user_ids = create_users(app_module, names, PASSWORD, method=app_module.password_hasher.method)
+    history = make_history([user_ids[name] for name in names[:args.users]], tests, args.history, seed=args.seed)
+    seed_history(app_module, history)
+    return fixture, [test_id for test_id, _ in tests], names[:args.takers]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def regressions(baseline, current, threshold, min_delta_ms):
+    found = []
+    for scenario, report in current['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(scenario)
+        if not base:
+            continue
+        for route, stats in report['routes'].items():
+            old = base['routes'].get(route)
+            if not old or not old['count'] or not stats['count']:
+                continue
+            if (stats['p95_ms'] > old['p95_ms'] * (1 + threshold)
+                    and stats['p95_ms'] - old['p95_ms'] >= min_delta_ms):
+                found.append((scenario, route, old['p95_ms'], stats['p95_ms']))
+    return found
+
+
+def print_report(report, baseline=None):
+    print(f"{'сценарий':>9} {'маршрут':>15} {'запросов':>9} {'ошибок':>7} {'p50, мс':>8} {'p95, мс':>8} "
+          f"{'p99, мс':>8}" + (f" {'было p95':>9} {'изм.':>7}" if baseline else ''))
+    for scenario, data in report['scenarios'].items():
+        for route, stats in data['routes'].items():
+            line = (f"{scenario:>9} {route:>15} {stats['count']:>9} {stats['errors']:>7} "
+                    f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+            old = (baseline or {}).get('scenarios', {}).get(scenario, {}).get('routes', {}).get(route)
+            if old and old['p95_ms']:
+                change = (stats['p95_ms'] / old['p95_ms'] - 1) * 100
+                line += f" {old['p95_ms']:>9.1f} {change:>+6.0f}%"
+            print(line)
+        print(f"{scenario:>9} {'всего':>15} {data['requests']:>9} {data['errors']:>7}   "
+              f"{data['throughput']:.0f} запр/с за {data['elapsed_s']:.1f} с")
+
+
+def check(baseline, report, args):
+    found = regressions(baseline, report, args.threshold, args.min_delta_ms)
+    for scenario, route, old, new in found:
+        print(f'РЕГРЕССИЯ {scenario}/{route}: p95 {old:.1f} -> {new:.1f} мс '
+              f'(порог +{args.threshold * 100:.0f}%)')
+    return 1 if found else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Через запятую: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--tests', type=int, default=5, help='Тестов в подготовленных данных.')
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--options', type=int, default=4)
+    parser.add_argument('--users', type=int, default=200, help='Пользователей с историей результатов.')
+    parser.add_argument('--history', type=int, default=20, help='Прошлых результатов на пользователя.')
+    parser.add_argument('--fixture', help='Файл в схеме data/test.json вместо синтетических тестов.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--registrations', type=int, default=100)
+    parser.add_argument('--imports', type=int, default=10, help='Запросов импорта.')
+    parser.add_argument('--import-tests', type=int, default=3, help='Тестов в одном файле импорта.')
+    parser.add_argument('--takers', type=int, default=50)
+    parser.add_argument('--admin-views', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=50, help='Одновременных клиентов.')
+    parser.add_argument('--server', choices=['dev', 'gthread', 'gevent'], help='Запустить сервер (см. loadgen).')
+    parser.add_argument('--workers', type=int, default=(os.cpu_count() or 1) * 2 + 1)
+    parser.add_argument('--url', help='Уже запущенный сервер (данные готовятся в DATABASE_URL).')
+    parser.add_argument('-o', '--output', help='JSON с результатами (по умолчанию benchmarks/results/).')
+    parser.add_argument('--baseline', help='JSON прошлого запуска для сравнения.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Допустимый рост p95 (0.2 = 20%%).')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='Рост p95 меньше этого не считается регрессией.')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='Сравнить два сохраненных запуска без нагрузки.')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.compare[1], encoding='utf-8') as f:
+            report = json.load(f)
+        print_report(report, baseline)
+        sys.exit(check(baseline, report, args))
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+    if not args.url:
+        os.environ.setdefault('DATABASE_URL',
+                              'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='suite_'), 'suite.db'))
+    os.environ.setdefault('ATTEMPT_STORE', 'sql' if args.server in ('gthread', 'gevent') else 'memory')
+    # Дешевый хеш: регистрации и входы не упираются в pbkdf2 (для замера
+    # настоящего алгоритма задайте PASSWORD_HASH_METHOD).
+    os.environ.setdefault('PASSWORD_HASH_METHOD', HASH_METHOD)
+
+    app_module = load_app()
+    # Префикс имен: повторный запуск на той же базе не упирается в занятые
+    # логины.
+    prefix = f'b{int(time.time())}_'
+    fixture, test_ids, takers = prepare(app_module, args, prefix)
+
+    process = None
+    if args.url:
+        target = args.url
+        client = lambda: HttpClient(args.url)
+    elif args.server:
+        from benchmarks.loadgen import free_port, raise_file_limit, start_server
+
+        raise_file_limit()
+        port = free_port()
+        process = start_server(args.server, port, args.workers, dict(os.environ))
+        target = f'http://127.0.0.1:{port}'
+        client = lambda: HttpClient(target)
+    else:
+        target = 'inprocess'
+        client = lambda: InProcessClient(app_module.app)
+
+    ctx = Context(args, client, prefix, test_ids, takers, fixture)
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'target': args.server or target,
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'database': os.environ['DATABASE_URL'].split(':', 1)[0],
+            'attempt_store': os.environ['ATTEMPT_STORE'],
+            'result_shards': len(app_module.app.config['RESULT_SHARDS']),
+        },
+        'parameters': {key: value for key, value in vars(args).items()
+                       if key not in ('output', 'baseline', 'compare', 'url')},
+        'scenarios': {},
+    }
+    try:
+        for name in scenarios:
+            recorder = Recorder()
+            started = time.perf_counter()
+            RUNNERS[name](ctx, recorder)
+            report['scenarios'][name] = recorder.report(time.perf_counter() - started)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print(f'{report["target"]}: сценарии {", ".join(scenarios)}; результаты в {output}')
+    print_report(report, baseline)
+    if baseline:
+        sys.exit(check(baseline, report, args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# Синтетические данные в схеме импорта (data/test.json): тесты любого
+# размера, имена пользователей и история результатов. Файл для импорта:
+#
+#   python -m benchmarks.synthetic --tests 100 --questions 50 -o data/synthetic.jsonl
+
+import argparse
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+DIFFICULTIES = ['Легкий', 'Средний', 'Сложный']
+
+
+def make_question(rng, index, options_per_question=4):
+    return {
+        'text': f'Синтетический вопрос №{index}: {rng.random():.6f}?',
+        'difficulty': rng.choice(DIFFICULTIES),
+        'time_limit_sec': rng.choice([30, 60, 90]),
+        'options': [f'Вариант {o + 1} вопроса {index}' for o in range(options_per_question)],
+        'correct_option_index': rng.randrange(options_per_question),
+    }
+
+
+def make_test(questions, seed=0, title=None, options_per_question=4):
+    rng = random.Random(seed)
+    return {
+        'title': title or f'Синтетический тест ({questions} вопросов)',
+        'description': 'Сгенерирован для нагрузочного тестирования.',
+        'difficulty': 'Средний',
+        'questions': [make_question(rng, i, options_per_question) for i in range(questions)],
+    }
+
+
+def make_tests(count, questions, seed=0, options_per_question=4):
+    return [
+        dict(make_test(questions, seed + i, f'Синтетический тест №{seed + i} ({questions} вопросов)',
+                       options_per_question),
+             difficulty=DIFFICULTIES[(seed + i) % len(DIFFICULTIES)])
+        for i in range(count)
+    ]
+
+
+def write_test(path, questions, seed=0, options_per_question=4):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(make_test(questions, seed, options_per_question=options_per_question), f, ensure_ascii=False)
+    return path
+
+
+def to_jsonl(tests):
+    return ''.join(json.dumps(test, ensure_ascii=False) + '\n' for test in tests).encode('utf-8')
+
+
+def usernames(count, prefix='user'):
+    return [f'{prefix}{i}' for i in range(count)]
+
+
+def make_history(user_ids, tests, per_user, seed=0, days=90):
+    # Прошлые попытки: tests — [(test_id, число вопросов)], у каждого
+    # пользователя per_user результатов за последние days дней.
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    rows = []
+    for user_id in user_ids:
+        for _ in range(per_user):
+            test_id, total = rng.choice(tests)
+            rows.append({
+                'user_id': user_id,
+                'test_id': test_id,
+                'score': rng.randint(0, total),
+                'date_completed': now - timedelta(seconds=rng.randrange(days * 86400)),
+                'seed': rng.randrange(2 ** 31),
+                'total_questions': total,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tests', type=int, default=1)
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--options', type=int, default=4, help='Вариантов ответа в вопросе.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', required=True, help='Файл .json (один тест) или .jsonl.')
+    args = parser.parse_args()
+
+    tests = make_tests(args.tests, args.questions, args.seed, args.options)
+    with open(args.output, 'wb') as f:
+        if args.output.endswith('.jsonl'):
+            f.write(to_jsonl(tests))
+        else:
+            f.write(json.dumps(tests[0] if len(tests) == 1 else tests, ensure_ascii=False).encode('utf-8'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from models import Test
+
+CatalogueEntry = namedtuple('CatalogueEntry', 'id title description difficulty')
+CataloguePage = namedtuple('CataloguePage', 'tests next_cursor')
+
+
+def load_page(after, limit):
+    rows = (
+        Test.query
+        .with_entities(Test.id, Test.title, Test.description, Test.difficulty)
+        .filter(Test.id > after, Test.archived_at.is_(None))
+        .order_by(Test.id)
+        .limit(limit + 1)
+        .all()
+    )
+
+    tests = tuple(CatalogueEntry(*row) for row in rows[:limit])
+    next_cursor = tests[-1].id if len(rows) > limit else None
+    return CataloguePage(tests, next_cursor)
+
+
+class CatalogueCache:
+    # Страницы каталога хранятся в компактном виде (кортежи), ключ включает
+    # номер версии: create/import/delete повышают версию, и старые страницы
+    # перестают находиться, а затем вытесняются.
+
+    def __init__(self, max_entries=256, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+            self._pages.clear()
+
+    def get_page(self, after, limit, loader=load_page):
+        key = (self.version, after, limit)
+        now = time.monotonic()
+
+        with self._lock:
+            cached = self._pages.get(key)
+            if cached is not None and (self.ttl is None or now - cached[0] < self.ttl):
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        page = loader(after, limit)
+
+        with self._lock:
+            if key[0] == self.version:
+                self._pages[key] = (now, page)
+                self._pages.move_to_end(key)
+                while len(self._pages) > self.max_entries:
+                    self._pages.popitem(last=False)
+
+        return page
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self.version,
+                'entries': len(self._pages),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
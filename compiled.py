@@ -0,0 +1,167 @@
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from models import db, Test, Question, Option
+from selection import build_pools
+
+CompiledOption = namedtuple('CompiledOption', 'id text')
+CompiledQuestion = namedtuple('CompiledQuestion', 'id text difficulty time_limit_sec options')
+
+
+class CompiledTest:
+    # Неизменяемое представление теста для прохождения: вопросы, варианты,
+    # ключ ответов (id вопроса -> id правильных вариантов) и пулы вопросов
+    # по сложности для selection.draw.
+
+    __slots__ = ('id', 'question_ids', 'questions', 'answer_key', 'mode', 'draw_count',
+                 'shuffle_options', 'levels', 'pools', 'max_time_limit', 'digest', 'size')
+
+    def __init__(self, test_id, questions, answer_key, mode='fixed', draw_count=None, shuffle_options=False):
+        self.id = test_id
+        self.question_ids = tuple(q.id for q in questions)
+        self.questions = {q.id: q for q in questions}
+        self.answer_key = answer_key
+        self.mode = mode
+        self.draw_count = min(draw_count or len(questions), len(questions))
+        self.shuffle_options = shuffle_options
+        self.levels, self.pools = build_pools(questions)
+        self.max_time_limit = max((q.time_limit_sec or 0 for q in questions), default=0)
+        # Отпечаток содержимого — основа ETag выгрузки теста.
+        key = tuple(sorted((q_id, tuple(sorted(ids))) for q_id, ids in answer_key.items()))
+        self.digest = hashlib.sha256(
+            repr((questions, key, self.mode, self.draw_count, self.shuffle_options)).encode('utf-8')
+        ).hexdigest()
+        self.size = (_deep_sizeof(self.questions) + _deep_sizeof(self.answer_key)
+                     + _deep_sizeof(self.question_ids) + _deep_sizeof(self.pools))
+
+    def is_correct(self, question_id, option_id):
+        return option_id in self.answer_key.get(question_id, ())
+
+
+def _deep_sizeof(obj, seen=None):
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (tuple, list, frozenset, set)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+def compile_test(test_id):
+    settings = (
+        db.session.query(Test.archived_at, Test.selection_mode, Test.draw_count, Test.shuffle_options)
+        .filter(Test.id == test_id)
+        .first()
+    )
+    if settings is None or settings.archived_at is not None:
+        return None
+
+    question_rows = (
+        db.session.query(Question.id, Question.text, Question.difficulty, Question.time_limit_sec)
+        .filter(Question.test_id == test_id)
+        .order_by(Question.id)
+        .all()
+    )
+    if not question_rows:
+        return None
+
+    option_rows = (
+        db.session.query(Option.question_id, Option.id, Option.text, Option.is_correct)
+        .join(Question, Question.id == Option.question_id)
+        .filter(Question.test_id == test_id)
+        .order_by(Option.id)
+        .all()
+    )
+
+    options = {}
+    correct = {}
+    for question_id, option_id, text, is_correct in option_rows:
+        options.setdefault(question_id, []).append(CompiledOption(option_id, text))
+        if is_correct:
+            correct.setdefault(question_id, []).append(option_id)
+
+    questions = tuple(
+        CompiledQuestion(q_id, text, difficulty, time_limit_sec, tuple(options.get(q_id, ())))
+        for q_id, text, difficulty, time_limit_sec in question_rows
+    )
+    answer_key = {q_id: frozenset(ids) for q_id, ids in correct.items()}
+    return CompiledTest(test_id, questions, answer_key, mode=settings.selection_mode or 'fixed',
+                        draw_count=settings.draw_count, shuffle_options=bool(settings.shuffle_options))
+
+
+class CompiledTestCache:
+    # LRU, ограниченный суммарным оценочным размером скомпилированных тестов.
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, compiler=compile_test, ttl=None):
+        self.max_bytes = max_bytes
+        self.compiler = compiler
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._generation = 0
+        self._tests = OrderedDict()
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def get(self, test_id):
+        now = time.monotonic()
+        with self._lock:
+            compiled = self._tests.get(test_id)
+            # Другие процессы сбрасывают только свой кэш: без ttl тест,
+            # измененный или удаленный там, остался бы здесь навсегда.
+            if compiled is not None and (self.ttl is None or now - self._loaded[test_id] < self.ttl):
+                self._tests.move_to_end(test_id)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+            generation = self._generation
+
+        compiled = self.compiler(test_id)
+        if compiled is None:
+            return None
+
+        with self._lock:
+            # Тест удалили или переимпортировали, пока он компилировался.
+            if generation != self._generation:
+                return compiled
+
+            previous = self._tests.pop(test_id, None)
+            if previous is not None:
+                self.bytes -= previous.size
+            self._tests[test_id] = compiled
+            self._loaded[test_id] = now
+            self.bytes += compiled.size
+            while self.bytes > self.max_bytes and len(self._tests) > 1:
+                evicted_id, evicted = self._tests.popitem(last=False)
+                del self._loaded[evicted_id]
+                self.bytes -= evicted.size
+
+        return compiled
+
+    def invalidate(self, test_id):
+        with self._lock:
+            self._generation += 1
+            compiled = self._tests.pop(test_id, None)
+            if compiled is not None:
+                del self._loaded[test_id]
+                self.bytes -= compiled.size
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._tests),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -3,10 +3,156 @@ from dotenv import load_dotenv
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'data', 'Tests.db')
+load_dotenv()
+
+
+def _database_url(url):
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+SQLALCHEMY_DATABASE_URI = _database_url(os.getenv('DATABASE_URL', 'sqlite:///' + os.path.join(basedir, 'data', 'Tests.db')))
 
 SQLALCHEMY_TRACK_MODIFICATIONS = False 
 
-load_dotenv()
+# basic — настройки драйвера по умолчанию, production — WAL/таймауты для SQLite
+# и пул соединений с проверкой и пересозданием для PostgreSQL.
+DB_PROFILE = os.getenv('DB_PROFILE', 'production')
+
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+
+
+def engine_options(uri):
+    if DB_PROFILE != 'production':
+        return {}
+    if uri.startswith('sqlite'):
+        options = {
+            'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000, 'check_same_thread': False},
+        }
+        if ':memory:' not in uri and uri != 'sqlite://':
+            options.update({
+                'pool_size': DB_POOL_SIZE,
+                'max_overflow': DB_MAX_OVERFLOW,
+                'pool_timeout': DB_POOL_TIMEOUT,
+            })
+        return options
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': True,
+    }
+
+
+SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+
+# Результаты и ответы по шардам: URL через запятую, тест N живет в шарде
+# N % число_шардов. Пусто — все в основной БД (DATABASE_URL).
+RESULT_SHARDS = [_database_url(url.strip()) for url in os.getenv('RESULT_SHARDS', '').split(',') if url.strip()]
+
+DEBUG = os.getenv('FLASK_DEBUG', '0') == '1'
 
 SECRET_KEY = os.getenv('SECRET_KEY', 'dev')
+
+CATALOGUE_PAGE_SIZE = int(os.getenv('CATALOGUE_PAGE_SIZE', 50))
+CATALOGUE_CACHE_SIZE = int(os.getenv('CATALOGUE_CACHE_SIZE', 256))
+CATALOGUE_CACHE_TTL = float(os.getenv('CATALOGUE_CACHE_TTL', 0)) or None
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', 128))
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', 0)) or None
+
+ATTEMPT_STORE = os.getenv('ATTEMPT_STORE', 'memory')
+ATTEMPT_STORE_MAX = int(os.getenv('ATTEMPT_STORE_MAX', 100000))
+ATTEMPT_TTL = int(os.getenv('ATTEMPT_TTL', 4 * 3600))
+# Как часто удаляются брошенные попытки из таблицы attempts (ATTEMPT_STORE=sql).
+ATTEMPT_PURGE_INTERVAL = float(os.getenv('ATTEMPT_PURGE_INTERVAL', 300))
+REDIS_URL = os.getenv('REDIS_URL')
+
+COMPILED_CACHE_MAX_BYTES = int(os.getenv('COMPILED_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+COMPILED_CACHE_TTL = float(os.getenv('COMPILED_CACHE_TTL', 0)) or None
+
+RESULTS_PAGE_SIZE = int(os.getenv('RESULTS_PAGE_SIZE', 50))
+
+ANSWER_LOG_BATCH = int(os.getenv('ANSWER_LOG_BATCH', 200))
+ANSWER_LOG_MAX_DELAY = float(os.getenv('ANSWER_LOG_MAX_DELAY', 2.0))
+
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv('PASSWORD_HASH_MAX_QUEUE', 64))
+PASSWORD_HASH_TIMEOUT = int(os.getenv('PASSWORD_HASH_TIMEOUT', 30))
+
+DELETE_BATCH = int(os.getenv('DELETE_BATCH', 500))
+# Через сколько секунд захват задачи упавшим процессом считается истекшим.
+DELETE_LEASE = float(os.getenv('DELETE_LEASE', 600))
+
+# Сроки попыток: к лимиту вопроса добавляется ANSWER_GRACE_SEC на сеть;
+# показанный, но брошенный вопрос завершает попытку через ATTEMPT_IDLE_SEC.
+ANSWER_GRACE_SEC = float(os.getenv('ANSWER_GRACE_SEC', 3))
+ATTEMPT_IDLE_SEC = float(os.getenv('ATTEMPT_IDLE_SEC', 300))
+SWEEPER_TICK = float(os.getenv('SWEEPER_TICK', 1.0))
+SWEEPER_SLOTS = int(os.getenv('SWEEPER_SLOTS', 4096))
+
+# Форма create_test на 5000 вопросов — это ~35 тыс. полей и несколько МБ;
+# стандартные лимиты Werkzeug (1000 полей, 500 КБ) отвечают на неё 413.
+MAX_FORM_PARTS = int(os.getenv('MAX_FORM_PARTS', 50000))
+MAX_FORM_MEMORY_SIZE = int(os.getenv('MAX_FORM_MEMORY_SIZE', 16 * 1024 * 1024))
+
+# Допустимое число SQL-запросов на маршрут при хранилище попыток memory или
+# redis. С ATTEMPT_STORE=sql попытка читается и сохраняется в БД, поэтому к
+# маршрутам прохождения теста добавляется QUERY_BUDGETS_SQL_STORE. История
+# попыток в профиле читается из каждого шарда RESULT_SHARDS — по запросу на шард.
+QUERY_BUDGETS = {
+    'index': 3,
+    'profile': 4,
+    'test_start': 5,
+    'test_question': 0,
+    'test_answer': 12,
+    'test_results': 12,
+    'question_stats': 4,
+}
+QUERY_BUDGETS_SQL_STORE = {
+    'test_start': 1,
+    'test_question': 2,
+    'test_answer': 2,
+}
+# Ошибка вместо предупреждения в логе — только при app.testing.
+QUERY_BUDGET_ENFORCE = os.getenv('QUERY_BUDGET_ENFORCE', '0') == '1'
+
+
+def query_budgets(attempt_store, shard_count=1):
+    budgets = dict(QUERY_BUDGETS)
+    if attempt_store == 'sql':
+        for endpoint, extra in QUERY_BUDGETS_SQL_STORE.items():
+            budgets[endpoint] += extra
+    budgets['profile'] += max(shard_count, 1) - 1
+    return budgets
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', '0') == '1'
+PROFILER_DIR = os.getenv('PROFILER_DIR', os.path.join(basedir, 'data', 'profiles'))
+PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', 0.005))
+
+# Скомпилированные шаблоны Jinja (общий каталог для всех процессов сервера).
+JINJA_CACHE_DIR = os.getenv('JINJA_CACHE_DIR', os.path.join(basedir, 'data', 'jinja_cache'))
+
+# Продакшен-сервер (gunicorn.conf.py). gthread — поток на запрос; gevent —
+# тысячи одновременных соединений на процесс: ожидание Redis и PostgreSQL
+# (через psycogreen) не занимает поток.
+WEB_BIND = os.getenv('WEB_BIND', '0.0.0.0:8000')
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+WEB_WORKER_CLASS = os.getenv('WEB_WORKER_CLASS', 'gthread')
+WEB_THREADS = int(os.getenv('WEB_THREADS', 32))
+WEB_WORKER_CONNECTIONS = int(os.getenv('WEB_WORKER_CONNECTIONS', 2000))
+WEB_BACKLOG = int(os.getenv('WEB_BACKLOG', 4096))
+WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', 60))
+WEB_KEEPALIVE = int(os.getenv('WEB_KEEPALIVE', 15))
@@ -0,0 +1,34 @@
+from sqlalchemy import event
+
+from models import db
+
+
+def _sqlite_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return on_connect
+
+
+def configure_sqlite(engine, config):
+    if engine.dialect.name != 'sqlite':
+        return
+
+    # Без этой настройки SQLite не выполняет ON DELETE CASCADE.
+    pragmas = {'foreign_keys': 'ON'}
+    if config.get('DB_PROFILE') == 'production':
+        pragmas.update({
+            'journal_mode': config['SQLITE_JOURNAL_MODE'],
+            'synchronous': config['SQLITE_SYNCHRONOUS'],
+            'busy_timeout': int(config['SQLITE_BUSY_TIMEOUT_MS']),
+        })
+    event.listen(engine, 'connect', _sqlite_pragmas(pragmas))
+
+
+def configure_engine(app):
+    with app.app_context():
+        engine = db.engine
+
+    configure_sqlite(engine, app.config)
@@ -0,0 +1,137 @@
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TimerWheel:
+    # Хешированное колесо таймеров: slots ячеек по tick секунд. Постановка
+    # и перенос — O(1), шаг колеса просматривает только одну ячейку, а не
+    # все попытки. Сроки дальше оборота колеса ждут в ячейке следующего круга.
+
+    def __init__(self, tick=1.0, slots=4096, now=None):
+        self.tick = tick
+        self.slots = slots
+        self._wheel = [{} for _ in range(slots)]
+        self._where = {}
+        self._current = math.floor((time.time() if now is None else now) / tick)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._where)
+
+    def schedule(self, key, when):
+        with self._lock:
+            slot = self._where.pop(key, None)
+            if slot is not None:
+                self._wheel[slot].pop(key, None)
+
+            slot = max(math.ceil(when / self.tick), self._current + 1) % self.slots
+            self._wheel[slot][key] = when
+            self._where[key] = slot
+
+    def cancel(self, key):
+        with self._lock:
+            slot = self._where.pop(key, None)
+            if slot is not None:
+                self._wheel[slot].pop(key, None)
+
+    def advance(self, now=None):
+        now = time.time() if now is None else now
+        target = math.floor(now / self.tick)
+        expired = []
+
+        with self._lock:
+            # После долгой паузы достаточно одного полного оборота.
+            start = max(self._current + 1, target - self.slots + 1)
+            for tick in range(start, target + 1):
+                bucket = self._wheel[tick % self.slots]
+                due = [key for key, when in bucket.items() if when <= now]
+                for key in due:
+                    del bucket[key]
+                    del self._where[key]
+                expired.extend(due)
+            self._current = max(self._current, target)
+
+        return expired
+
+
+class DeadlineSweeper:
+    # Фоновый поток: раз в tick продвигает колесо и передаёт истёкшие
+    # ключи в check(key) — тот сам перечитывает состояние попытки и либо
+    # завершает её, либо ставит в колесо заново. Тот же поток выполняет
+    # периодические задачи, зарегистрированные через every().
+
+    def __init__(self, app, check, tick=1.0, slots=4096):
+        self.app = app
+        self.check = check
+        self.wheel = TimerWheel(tick=tick, slots=slots)
+        self.expired = 0
+        self.last_sweep_ms = 0.0
+        self._jobs = []
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def schedule(self, key, when):
+        self.wheel.schedule(key, when)
+        self._ensure_started()
+
+    def cancel(self, key):
+        self.wheel.cancel(key)
+
+    def every(self, interval, job):
+        self._jobs.append([interval, job, time.monotonic() + interval])
+        self._ensure_started()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='deadline-sweeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def sweep(self, now=None):
+        started = time.perf_counter()
+        keys = self.wheel.advance(now)
+        if keys:
+            with self.app.app_context():
+                for key in keys:
+                    try:
+                        if self.check(key):
+                            self.expired += 1
+                    except Exception:
+                        logger.exception('Ошибка при завершении просроченной попытки %s', key)
+        self.last_sweep_ms = (time.perf_counter() - started) * 1000
+        return len(keys)
+
+    def run_jobs(self, now=None):
+        now = time.monotonic() if now is None else now
+        for job in self._jobs:
+            interval, func, due = job
+            if now < due:
+                continue
+            job[2] = now + interval
+            try:
+                with self.app.app_context():
+                    func()
+            except Exception:
+                logger.exception('Ошибка периодической задачи %s', getattr(func, '__name__', func))
+
+    def _run(self):
+        while not self._stop.wait(self.wheel.tick):
+            self.sweep()
+            self.run_jobs()
+
+    def stats(self):
+        return {
+            'scheduled': len(self.wheel),
+            'expired': self.expired,
+            'last_sweep_ms': round(self.last_sweep_ms, 3),
+        }
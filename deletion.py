@@ -0,0 +1,213 @@
+import functools
+import os
+import queue
+import secrets
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, or_, select, update
+
+from models import (db, Test, Question, Option, Result, ResultArchive, Attempt, Answer,
+                    QuestionStat, OptionStat, UserTestSummary)
+from shards import result_shards
+
+DELETE_BATCH = 500
+DELETE_LEASE = 600
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _delete_in_batches(model, condition, batch_size, pause, engine=None, on_batch=None):
+    # Каждая пачка — отдельная короткая транзакция, чтобы между ними могли
+    # писать другие запросы.
+    deleted = 0
+    while True:
+        ids = select(model.id).where(condition).limit(batch_size)
+        with (engine or db.engine).begin() as conn:
+            count = conn.execute(delete(model).where(model.id.in_(ids))).rowcount
+        deleted += count
+        if on_batch:
+            on_batch()
+        if count < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
+def archive_results(test_id, batch_size=DELETE_BATCH, pause=0, on_batch=None):
+    # Архив лежит в том же шарде, что и результаты теста.
+    engine = result_shards.engine_for(test_id)
+    moved = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(Result.id, Result.user_id, Result.test_id, Result.score, Result.total_questions,
+                       Result.date_completed)
+                .where(Result.test_id == test_id)
+                .order_by(Result.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return moved
+
+            archived_at = _now()
+            conn.execute(insert(ResultArchive), [
+                {'id': r.id, 'user_id': r.user_id, 'test_id': r.test_id, 'score': r.score,
+                 'total_questions': r.total_questions, 'date_completed': r.date_completed, 'archived_at': archived_at}
+                for r in rows
+            ])
+            conn.execute(delete(Result).where(Result.id.in_([r.id for r in rows])))
+
+        moved += len(rows)
+        if on_batch:
+            on_batch()
+        if pause:
+            time.sleep(pause)
+
+
+def tests_with_results(test_ids):
+    # Тесты из test_ids, у которых в шарде еще есть строки results.
+    found = set()
+    for engine, group in result_shards.split([{'test_id': test_id} for test_id in test_ids]):
+        with (engine or db.engine).connect() as conn:
+            found.update(conn.scalars(
+                select(Result.test_id).where(Result.test_id.in_([row['test_id'] for row in group])).distinct()
+            ))
+    return found
+
+
+def purge_test(test_id, batch_size=DELETE_BATCH, pause=0, on_batch=None):
+    question_ids = select(Question.id).where(Question.test_id == test_id)
+    option_ids = select(Option.id).where(Option.question_id.in_(question_ids))
+
+    shard = result_shards.engine_for(test_id)
+    _delete_in_batches(Answer, Answer.test_id == test_id, batch_size, pause, shard, on_batch)
+    _delete_in_batches(Result, Result.test_id == test_id, batch_size, pause, shard, on_batch)
+    _delete_in_batches(Attempt, Attempt.test_id == test_id, batch_size, pause, on_batch=on_batch)
+    with db.engine.begin() as conn:
+        conn.execute(delete(UserTestSummary).where(UserTestSummary.test_id == test_id))
+        conn.execute(delete(OptionStat).where(OptionStat.option_id.in_(option_ids)))
+        conn.execute(delete(QuestionStat).where(QuestionStat.question_id.in_(question_ids)))
+    _delete_in_batches(Option, Option.question_id.in_(question_ids), batch_size, pause, on_batch=on_batch)
+    _delete_in_batches(Question, Question.test_id == test_id, batch_size, pause, on_batch=on_batch)
+
+    with db.engine.begin() as conn:
+        conn.execute(delete(Test).where(Test.id == test_id))
+
+
+def claim_job(test_id, worker_id, lease=DELETE_LEASE):
+    # Один UPDATE с проверкой rowcount: задачу выполняет только тот процесс,
+    # которому досталась строка. Захват упавшего процесса истекает через lease
+    # секунд; работающий процесс продлевает его после каждой пачки.
+    now = _now()
+    with db.engine.begin() as conn:
+        return conn.execute(
+            update(Test)
+            .where(Test.id == test_id,
+                   or_(Test.claimed_by.is_(None), Test.claimed_by == worker_id,
+                       Test.claimed_at < now - timedelta(seconds=lease)))
+            .values(claimed_by=worker_id, claimed_at=now)
+        ).rowcount == 1
+
+
+def renew_claim(test_id, worker_id):
+    with db.engine.begin() as conn:
+        conn.execute(update(Test).where(Test.id == test_id, Test.claimed_by == worker_id).values(claimed_at=_now()))
+
+
+def release_claim(test_id, worker_id):
+    with db.engine.begin() as conn:
+        conn.execute(
+            update(Test).where(Test.id == test_id, Test.claimed_by == worker_id).values(claimed_by=None, claimed_at=None)
+        )
+
+
+def hide_test(test_id, purge):
+    db.session.execute(
+        update(Test).where(Test.id == test_id).values(archived_at=_now(), purge_pending=purge)
+    )
+    db.session.commit()
+
+
+class DeletionWorker:
+    # Один фоновый поток выполняет архивацию и удаление тестов по очереди.
+    # Незавершённое удаление (purge_pending) и архивация (архивный тест, у
+    # которого остались результаты) подхватываются после перезапуска.
+    # resume() вызывается в каждом процессе gunicorn, поэтому перед запуском
+    # задача захватывается в tests.claimed_by (claim_job); чужие пропускаются.
+
+    def __init__(self, app, batch_size=DELETE_BATCH, pause=0.01, lease=DELETE_LEASE):
+        self.app = app
+        self.batch_size = batch_size
+        self.pause = pause
+        self.lease = lease
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}'
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='deletion-worker', daemon=True)
+            self._thread.start()
+
+    def submit(self, mode, test_id):
+        self._queue.put((mode, test_id))
+        self._ensure_started()
+
+    def resume(self):
+        with self.app.app_context():
+            pending = db.session.scalars(select(Test.id).where(Test.purge_pending.is_(True))).all()
+            archived = db.session.scalars(
+                select(Test.id).where(Test.archived_at.is_not(None), Test.purge_pending.is_(False))
+            ).all()
+            unfinished = tests_with_results(archived) if archived else set()
+        for test_id in pending:
+            self.submit('purge', test_id)
+        for test_id in sorted(unfinished):
+            self.submit('archive', test_id)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def join(self):
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            mode, test_id = self._queue.get()
+            try:
+                with self.app.app_context():
+                    self._run_job(mode, test_id)
+            except Exception:
+                self.failed += 1
+                self.app.logger.exception('Ошибка фонового удаления теста %s', test_id)
+            finally:
+                self._queue.task_done()
+
+    def _run_job(self, mode, test_id):
+        if not claim_job(test_id, self.worker_id, self.lease):
+            self.skipped += 1
+            return
+        try:
+            renew = functools.partial(renew_claim, test_id, self.worker_id)
+            if mode == 'purge':
+                purge_test(test_id, self.batch_size, self.pause, renew)
+            else:
+                archive_results(test_id, self.batch_size, self.pause, renew)
+                # Тест могли удалить, пока архивацию держал этот процесс:
+                # в других процессах задача purge была пропущена.
+                if db.session.scalar(select(Test.purge_pending).where(Test.id == test_id)):
+                    self.submit('purge', test_id)
+            self.completed += 1
+        finally:
+            release_claim(test_id, self.worker_id)
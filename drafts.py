@@ -0,0 +1,231 @@
+import re
+
+from sqlalchemy import insert, select
+
+from models import Test, Question, Option
+from selection import MODES
+
+DEFAULT_DIFFICULTY = 'Средний'
+DEFAULT_TIME_LIMIT = 60
+MIN_QUESTIONS = 2
+MIN_OPTIONS = 2
+
+_FORM_FIELD = re.compile(r'^q_(?:text_(\d+)|(\d+)_(difficulty|time_limit|correct|option_text_(\d+)))$')
+
+
+class QuestionDraft:
+    __slots__ = ('key', 'text', 'difficulty', 'time_limit_sec', 'options', 'correct_index')
+
+    def __init__(self, key, text, difficulty, time_limit_sec, options, correct_index):
+        self.key = key
+        self.text = text
+        self.difficulty = difficulty
+        self.time_limit_sec = time_limit_sec
+        self.options = options
+        self.correct_index = correct_index
+
+
+class TestDraft:
+    __slots__ = ('title', 'description', 'difficulty', 'questions', 'settings')
+
+    def __init__(self, title, description, difficulty, questions, settings=None):
+        self.title = title
+        self.description = description
+        self.difficulty = difficulty
+        self.questions = questions
+        self.settings = settings or {}
+
+
+def selection_settings(mode=None, draw_count=None, shuffle_options=False, questions_count=None):
+    # Настройки выбора вопросов теста (поля Test.selection_mode, draw_count,
+    # shuffle_options); questions_count проверяется, когда он уже известен.
+    mode = mode or 'fixed'
+    if mode not in MODES:
+        raise ValueError(f"Неизвестный режим выбора вопросов '{mode}' (допустимы: {', '.join(MODES)}).")
+
+    if draw_count in (None, ''):
+        draw_count = None
+    else:
+        try:
+            draw_count = int(draw_count)
+        except (TypeError, ValueError):
+            raise ValueError('Число вопросов в попытке должно быть целым числом.')
+        if draw_count <= 0:
+            raise ValueError('Число вопросов в попытке должно быть больше нуля.')
+        if questions_count is not None and draw_count > questions_count:
+            raise ValueError(f'Число вопросов в попытке ({draw_count}) больше числа вопросов теста ({questions_count}).')
+
+    return {'selection_mode': mode, 'draw_count': draw_count, 'shuffle_options': bool(shuffle_options)}
+
+
+def question_from_json(q_data):
+    if not isinstance(q_data, dict):
+        raise ValueError('Вопрос должен быть JSON-объектом.')
+
+    q_text = q_data.get('text')
+    options = q_data.get('options')
+    correct_index = q_data.get('correct_option_index')
+
+    if not all([q_text, options, correct_index is not None]) or not isinstance(options, list):
+        raise ValueError(f"Вопрос '{q_text}' имеет неполные данные.")
+    if not isinstance(q_text, str):
+        raise ValueError('Текст вопроса должен быть строкой.')
+    # bool — подкласс int: true прошел бы как номер 1.
+    if (isinstance(correct_index, bool) or not isinstance(correct_index, int)
+            or not 0 <= correct_index < len(options)):
+        raise ValueError(f"Вопрос '{q_text}': неверный номер правильного ответа.")
+    if not all(isinstance(option, str) and option.strip() for option in options):
+        raise ValueError(f"Вопрос '{q_text}': варианты ответа должны быть непустыми строками.")
+
+    # Те же правила, что и в форме: целое число секунд больше нуля.
+    time_limit = q_data.get('time_limit_sec')
+    if time_limit is None:
+        time_limit = DEFAULT_TIME_LIMIT
+    elif isinstance(time_limit, bool) or not isinstance(time_limit, int) or time_limit <= 0:
+        raise ValueError(f"Вопрос '{q_text}': неверный формат времени.")
+
+    return QuestionDraft(
+        None,
+        q_text,
+        q_data.get('difficulty', DEFAULT_DIFFICULTY),
+        time_limit,
+        options,
+        correct_index,
+    )
+
+
+def parse_form(form):
+    # Один проход по полям формы create_test. Возвращает черновик теста и
+    # список ошибок вида (номер вопроса или None, сообщение).
+    raw = {}
+    for key, value in form.items():
+        match = _FORM_FIELD.match(key)
+        if not match:
+            continue
+
+        text_key, q_key, field, option_key = match.groups()
+        question = raw.setdefault(text_key or q_key, {'options': {}})
+        if text_key:
+            question['text'] = value.strip()
+        elif option_key:
+            question['options'][option_key] = value.strip()
+        else:
+            question[field] = value.strip()
+
+    errors = []
+    questions = []
+    for q_key, data in raw.items():
+        if not data.get('text'):
+            continue
+
+        question_errors = []
+
+        time_limit = DEFAULT_TIME_LIMIT
+        if data.get('time_limit'):
+            try:
+                time_limit = int(data['time_limit'])
+                if time_limit <= 0:
+                    raise ValueError
+            except ValueError:
+                question_errors.append('неверный формат времени')
+
+        option_keys = [k for k, text in data['options'].items() if text]
+        if len(option_keys) < MIN_OPTIONS:
+            question_errors.append(f'нужно минимум {MIN_OPTIONS} варианта ответа')
+
+        correct = data.get('correct')
+        if not correct:
+            question_errors.append('не указан правильный ответ')
+        elif correct not in option_keys:
+            question_errors.append('правильный вариант ответа пуст')
+
+        if question_errors:
+            errors.extend((q_key, message) for message in question_errors)
+            continue
+
+        questions.append(QuestionDraft(
+            q_key,
+            data['text'],
+            data.get('difficulty') or DEFAULT_DIFFICULTY,
+            time_limit,
+            [data['options'][k] for k in option_keys],
+            option_keys.index(correct),
+        ))
+
+    if len(questions) + len({q_key for q_key, _ in errors}) < MIN_QUESTIONS:
+        errors.append((None, f'требуется минимум {MIN_QUESTIONS} вопроса с текстом'))
+
+    title = (form.get('title') or '').strip()
+    if not title:
+        errors.append((None, 'не указано название теста'))
+
+    settings = None
+    try:
+        settings = selection_settings(form.get('selection_mode'), (form.get('draw_count') or '').strip(),
+                                      form.get('shuffle_options'), len(questions))
+    except ValueError as e:
+        message = str(e).rstrip('.')
+        errors.append((None, message[:1].lower() + message[1:]))
+
+    draft = TestDraft(title, form.get('description'), form.get('test_difficulty') or DEFAULT_DIFFICULTY,
+                      questions, settings)
+    return draft, errors
+
+
+def _inserted_question_ids(session, test_id, rows):
+    if session.get_bind().dialect.name != 'sqlite':
+        return session.scalars(
+            insert(Question).returning(Question.id, sort_by_parameter_order=True), rows
+        ).all()
+
+    # SQLite не гарантирует порядок RETURNING в многострочной вставке, и
+    # SQLAlchemy откатывается на INSERT на каждую строку. Внутри транзакции
+    # rowid выдаются по возрастанию, а вопросы этого теста вставляем только
+    # мы, поэтому последние len(rows) id теста — ровно только что вставленные.
+    session.execute(insert(Question), rows)
+    question_ids = session.scalars(
+        select(Question.id)
+        .where(Question.test_id == test_id)
+        .order_by(Question.id.desc())
+        .limit(len(rows))
+    ).all()
+    question_ids.reverse()
+    return question_ids
+
+
+def insert_questions(session, test_id, questions):
+    # Одна многострочная вставка вопросов и одна — вариантов.
+    if not questions:
+        return 0
+
+    question_ids = _inserted_question_ids(session, test_id, [
+        {
+            'test_id': test_id,
+            'text': q.text,
+            'difficulty': q.difficulty,
+            'time_limit_sec': q.time_limit_sec,
+        }
+        for q in questions
+    ])
+
+    session.execute(insert(Option), [
+        {'question_id': question_id, 'text': o_text, 'is_correct': idx == q.correct_index}
+        for question_id, q in zip(question_ids, questions)
+        for idx, o_text in enumerate(q.options)
+    ])
+
+    return len(question_ids)
+
+
+def insert_test(session, title, description, difficulty, **settings):
+    return session.execute(
+        insert(Test)
+        .values(title=title, description=description, difficulty=difficulty, **settings)
+        .returning(Test.id)
+    ).scalar_one()
+
+
+def persist_test(session, draft):
+    test_id = insert_test(session, draft.title, draft.description, draft.difficulty, **draft.settings)
+    insert_questions(session, test_id, draft.questions)
+    return test_id
@@ -0,0 +1,125 @@
+import re
+from urllib.parse import quote, unquote
+
+from sqlalchemy import func, inspect, select
+
+import search
+from compiled import compile_test
+from models import db, Question, Test, User, UserTestSummary
+from querycount import QueryCounter
+
+_READ = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+def _sample(test_id=None):
+    if test_id is None:
+        test_id = db.session.execute(
+            select(Question.test_id)
+            .join(Test, Test.id == Question.test_id)
+            .where(Test.archived_at.is_(None))
+            .group_by(Question.test_id)
+            .order_by(func.count().desc())
+            .limit(1)
+        ).scalar()
+    test = db.session.get(Test, test_id) if test_id is not None else None
+    if test is None:
+        raise RuntimeError('Нет теста с вопросами для построения планов.')
+
+    admin_id = db.session.execute(select(User.id).where(User.is_admin.is_(True)).limit(1)).scalar()
+    if admin_id is None:
+        raise RuntimeError('Нет администратора: выполните flask --app app init-db.')
+    # Сводки лежат в основной БД, результаты могут быть в шардах.
+    user_id = db.session.execute(
+        select(UserTestSummary.user_id)
+        .group_by(UserTestSummary.user_id)
+        .order_by(func.sum(UserTestSummary.attempts).desc())
+        .limit(1)
+    ).scalar() or admin_id
+
+    words = search.terms(test.title)
+    return test.id, words[0] if words else 'тест', test.difficulty, admin_id, user_id
+
+
+def sample_requests(test_id, word, difficulty):
+    # Только GET-маршруты без побочных эффектов: команду можно запускать на
+    # рабочей базе.
+    return [
+        ('index', '/', 'user'),
+        ('index', f'/?q={quote(word)}', 'user'),
+        ('index', f'/?difficulty={quote(difficulty or "")}', 'user'),
+        ('profile', '/profile', 'user'),
+        ('test_results', f'/admin/test_results/{test_id}', 'admin'),
+        ('test_analytics', f'/admin/test_analytics/{test_id}', 'admin'),
+        ('question_stats', f'/admin/question_stats/{test_id}', 'admin'),
+        ('export_test', f'/admin/export/test/{test_id}.json', 'admin'),
+        ('export_rows', f'/admin/export/results/{test_id}.csv', 'admin'),
+        ('export_rows', f'/admin/export/answers/{test_id}.csv', 'admin'),
+    ]
+
+
+def query_plan(conn, statement, parameters):
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append('  ' * depth[node_id] + detail)
+        return lines
+    return [row[0] for row in conn.exec_driver_sql('EXPLAIN ' + statement, parameters)]
+
+
+def full_scans(plan, tables):
+    # Полный просмотр таблицы: SCAN без индекса в SQLite, Seq Scan в PostgreSQL.
+    scanned = []
+    for line in plan:
+        line = line.strip()
+        match = _SCAN.match(line)
+        if match and match.group(1) in tables:
+            scanned.append(match.group(1))
+        elif 'Seq Scan on ' in line:
+            scanned.append(line.split('Seq Scan on ')[1].split()[0])
+    return scanned
+
+
+def _plans(app, run, tables):
+    with app.app_context():
+        with QueryCounter(db.engine) as counter:
+            run()
+
+        seen = set()
+        plans = []
+        with db.engine.connect() as conn:
+            for statement, parameters in zip(counter.statements, counter.parameters):
+                if statement in seen or not _READ.match(statement):
+                    continue
+                seen.add(statement)
+                plan = query_plan(conn, statement, parameters)
+                plans.append((statement, plan, full_scans(plan, tables)))
+    return plans
+
+
+def route_plans(app, endpoint=None, test_id=None):
+    # Выполняет маршруты тестовым клиентом, собирает их SELECT-запросы и
+    # возвращает [(endpoint, url, [(запрос, план, полные просмотры)])].
+    with app.app_context():
+        test_id, word, difficulty, admin_id, user_id = _sample(test_id)
+        tables = set(inspect(db.engine).get_table_names())
+
+    reports = []
+    for name, url, role in sample_requests(test_id, word, difficulty):
+        if endpoint and name != endpoint:
+            continue
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = admin_id if role == 'admin' else user_id
+        reports.append((name, f'GET {unquote(url)}', _plans(app, lambda: client.get(url).get_data(), tables)))
+
+    # test_start пишет попытку, поэтому вместо маршрута выполняется только
+    # его чтение из БД — компиляция теста.
+    if not endpoint or endpoint == 'test_start':
+        reports.append(('test_start', f'compile_test({test_id})',
+                        _plans(app, lambda: compile_test(test_id), tables)))
+    return reports
@@ -0,0 +1,226 @@
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+from models import db, Test, Question, Option, Result, User, Answer
+from shards import result_shards
+
+EXPORT_BATCH = 1000
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+RESULT_COLUMNS = ('result_id', 'user_id', 'username', 'test_id', 'score', 'total_questions', 'date_completed')
+ANSWER_COLUMNS = ('answer_id', 'attempt_id', 'user_id', 'test_id', 'question_id', 'option_id',
+                  'is_correct', 'time_taken_ms', 'answered_at')
+
+MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def _batches(conn, stmt, batch_size=EXPORT_BATCH):
+    # Серверный курсор: строки читаются пачками, а не загружаются целиком.
+    result = conn.execute(stmt.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield [tuple(row) for row in partition]
+
+
+def _shard_batches(test_id, stmt, batch_size):
+    with result_shards.connect(test_id) as conn:
+        yield from _batches(conn, stmt, batch_size)
+
+
+def result_batches(test_id, batch_size=EXPORT_BATCH):
+    stmt = (
+        select(Result.id, Result.user_id, Result.test_id, Result.score, Result.total_questions,
+               Result.date_completed)
+        .where(Result.test_id == test_id)
+        .order_by(Result.id)
+    )
+    # Имена пользователей — из основной БД, одним запросом на пачку.
+    for batch in _shard_batches(test_id, stmt, batch_size):
+        usernames = dict(db.session.execute(
+            select(User.id, User.username).where(User.id.in_({row[1] for row in batch}))
+        ).all())
+        yield [(result_id, user_id, usernames.get(user_id), test, score, asked, completed)
+               for result_id, user_id, test, score, asked, completed in batch]
+
+
+def answer_batches(test_id, batch_size=EXPORT_BATCH):
+    stmt = (
+        select(Answer.id, Answer.attempt_id, Answer.user_id, Answer.test_id, Answer.question_id,
+               Answer.option_id, Answer.is_correct, Answer.time_taken_ms, Answer.answered_at)
+        .where(Answer.test_id == test_id)
+        .order_by(Answer.id)
+    )
+    return _shard_batches(test_id, stmt, batch_size)
+
+
+def _value(value):
+    return value.isoformat(sep=' ') if hasattr(value, 'isoformat') else value
+
+
+def to_csv(columns, batches):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    yield buf.getvalue()
+
+    for batch in batches:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([[_value(v) for v in row] for row in batch])
+        yield buf.getvalue()
+
+
+def to_jsonl(columns, batches):
+    for batch in batches:
+        yield ''.join(
+            json.dumps(dict(zip(columns, (_value(v) for v in row))), ensure_ascii=False) + '\n'
+            for row in batch
+        )
+
+
+class _ChunkSink(io.RawIOBase):
+    # Файлоподобный приёмник для ParquetWriter: накопленные байты отдаются
+    # наружу после каждой группы строк.
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema(kind):
+    import pyarrow as pa
+
+    if kind == 'results':
+        return pa.schema([
+            ('result_id', pa.int64()), ('user_id', pa.int64()), ('username', pa.string()),
+            ('test_id', pa.int64()), ('score', pa.int64()), ('total_questions', pa.int64()),
+            ('date_completed', pa.timestamp('us')),
+        ])
+    return pa.schema([
+        ('answer_id', pa.int64()), ('attempt_id', pa.string()), ('user_id', pa.int64()),
+        ('test_id', pa.int64()), ('question_id', pa.int64()), ('option_id', pa.int64()),
+        ('is_correct', pa.bool_()), ('time_taken_ms', pa.int64()), ('answered_at', pa.timestamp('us')),
+    ])
+
+
+def to_parquet(kind, batches):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError('Для выгрузки в Parquet установите пакет pyarrow.')
+
+    return _parquet_chunks(pa, pq, _arrow_schema(kind), batches)
+
+
+def _parquet_chunks(pa, pq, schema, batches):
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for batch in batches:
+            columns = list(zip(*batch)) if batch else [[] for _ in schema.names]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_rows(kind, test_id, fmt, batch_size=EXPORT_BATCH):
+    if fmt not in FORMATS:
+        raise ValueError(f'Неизвестный формат выгрузки: {fmt}')
+
+    if kind == 'results':
+        columns, batches = RESULT_COLUMNS, result_batches(test_id, batch_size)
+    elif kind == 'answers':
+        columns, batches = ANSWER_COLUMNS, answer_batches(test_id, batch_size)
+    else:
+        raise ValueError(f'Неизвестный тип выгрузки: {kind}')
+
+    if fmt == 'csv':
+        return to_csv(columns, batches)
+    if fmt == 'jsonl':
+        return to_jsonl(columns, batches)
+    return to_parquet(kind, batches)
+
+
+def iter_test_json(test_id, batch_size=EXPORT_BATCH):
+    # Определение теста в схеме data/test.json; вопросы идут потоком.
+    test = db.session.get(Test, test_id)
+    if test is None:
+        raise ValueError(f'Тест #{test_id} не найден.')
+
+    header = {
+        'title': test.title,
+        'description': test.description,
+        'difficulty': test.difficulty,
+    }
+    # Настройки выбора вопросов пишутся, только если отличаются от умолчаний,
+    # чтобы выгрузка обычного теста совпадала с исходным файлом.
+    if test.selection_mode != 'fixed':
+        header['selection_mode'] = test.selection_mode
+    if test.draw_count:
+        header['draw_count'] = test.draw_count
+    if test.shuffle_options:
+        header['shuffle_options'] = True
+    header = json.dumps(header, ensure_ascii=False, indent=2)
+    yield header[:-2] + ',\n  "questions": ['
+
+    stmt = (
+        select(Question.id, Question.text, Question.difficulty, Question.time_limit_sec,
+               Option.text, Option.is_correct)
+        .join(Option, Option.question_id == Question.id)
+        .where(Question.test_id == test_id)
+        .order_by(Question.id, Option.id)
+    )
+
+    first = True
+    current = None
+    for batch in _batches(db.session, stmt, batch_size):
+        chunk = []
+        for q_id, q_text, q_difficulty, q_time, o_text, o_correct in batch:
+            if current is None or current['id'] != q_id:
+                if current is not None:
+                    chunk.append(_question_json(current, first))
+                    first = False
+                current = {'id': q_id, 'text': q_text, 'difficulty': q_difficulty,
+                           'time_limit_sec': q_time, 'options': [], 'correct_option_index': None}
+            if o_correct and current['correct_option_index'] is None:
+                current['correct_option_index'] = len(current['options'])
+            current['options'].append(o_text)
+        if chunk:
+            yield ''.join(chunk)
+
+    if current is not None:
+        yield _question_json(current, first)
+    yield '\n  ]\n}\n'
+
+
+def _question_json(question, first):
+    data = {k: question[k] for k in ('text', 'difficulty', 'time_limit_sec', 'options', 'correct_option_index')}
+    return ('\n    ' if first else ',\n    ') + json.dumps(data, ensure_ascii=False)
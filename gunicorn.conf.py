@@ -0,0 +1,47 @@
+# gunicorn -c gunicorn.conf.py wsgi:application
+#
+# Имя config занято настройкой gunicorn, поэтому модуль импортируется как app_config.
+import subprocess
+import sys
+
+import config as app_config
+
+bind = app_config.WEB_BIND
+workers = app_config.WEB_WORKERS
+worker_class = app_config.WEB_WORKER_CLASS
+threads = app_config.WEB_THREADS
+worker_connections = app_config.WEB_WORKER_CONNECTIONS
+backlog = app_config.WEB_BACKLOG
+timeout = app_config.WEB_TIMEOUT
+keepalive = app_config.WEB_KEEPALIVE
+graceful_timeout = 30
+
+# Приложение импортируется в каждом процессе после fork: фоновые потоки
+# (сборщик сроков, запись ответов, удаление) и пул соединений у каждого свои.
+preload_app = False
+
+
+def on_starting(server):
+    if workers > 1 and app_config.ATTEMPT_STORE == 'memory':
+        raise RuntimeError('При WEB_WORKERS > 1 попытки должны храниться в общем хранилище: '
+                           'задайте ATTEMPT_STORE=redis (с REDIS_URL) или ATTEMPT_STORE=sql.')
+    if workers > 1 and app_config.ATTEMPT_STORE == 'redis' and not app_config.REDIS_URL:
+        raise RuntimeError('ATTEMPT_STORE=redis без REDIS_URL хранит попытки в памяти процесса.')
+
+    # Миграции выполняются один раз, в отдельном процессе: мастер не должен
+    # импортировать приложение до fork.
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'], check=True)
+
+
+def post_fork(server, worker):
+    # Кэши каталога, поиска и скомпилированных тестов живут в памяти процесса
+    # и сбрасываются только в том процессе, который изменил каталог;
+    # остальные догоняют по TTL.
+    if workers > 1:
+        for name in ('CATALOGUE_CACHE_TTL', 'SEARCH_CACHE_TTL', 'COMPILED_CACHE_TTL'):
+            if getattr(app_config, name) is None:
+                setattr(app_config, name, 30)
+
+    if worker_class == 'gevent' and app_config.SQLALCHEMY_DATABASE_URI.startswith('postgresql'):
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
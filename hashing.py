@@ -0,0 +1,122 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+class HashQueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f'Очередь хеширования паролей переполнена, повторите через {retry_after} сек.')
+        self.retry_after = retry_after
+
+
+def normalize_method(method):
+    # Приводит метод к виду, который Werkzeug записывает в начало хеша.
+    name, *args = method.split(':')
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    if name == 'scrypt':
+        n, r, p = (args + ['32768', '8', '1'][len(args):])[:3]
+        return f'scrypt:{n}:{r}:{p}'
+    return method
+
+
+class PasswordHasher:
+    # Хеширование в отдельном пуле процессов, чтобы всплеск логинов не занимал
+    # потоки, обслуживающие остальные запросы. Очередь ограничена: при
+    # переполнении сразу выбрасывается HashQueueFull.
+
+    def __init__(self, method='pbkdf2:sha256', workers=2, max_queue=64, timeout=30, retry_after=2):
+        self.method = normalize_method(method)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _release(self, future=None):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashQueueFull(self.retry_after)
+
+        with self._lock:
+            self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            if not self.workers:
+                try:
+                    return func(*args)
+                finally:
+                    self._release()
+
+            try:
+                future = self._pool().submit(func, *args)
+            except Exception:
+                self._release()
+                raise
+            # Место в очереди освобождается, только когда задача покинула пул:
+            # иначе после таймаутов в пуле копились бы задачи сверх max_queue.
+            future.add_done_callback(self._release)
+            try:
+                return future.result(timeout=self.timeout)
+            except TimeoutError:
+                future.cancel()
+                raise HashQueueFull(self.retry_after)
+        finally:
+            latency = time.perf_counter() - started
+            with self._lock:
+                self.completed += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method
+
+    def stats(self):
+        with self._lock:
+            return {
+                'method': self.method,
+                'workers': self.workers,
+                'in_flight': self.in_flight,
+                'max_queue': self.max_queue,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'latency_avg_ms': self.total_latency / self.completed * 1000 if self.completed else 0,
+                'latency_max_ms': self.max_latency * 1000,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
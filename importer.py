@@ -0,0 +1,217 @@
+import codecs
+import json
+
+from sqlalchemy import update
+
+from drafts import DEFAULT_DIFFICULTY, question_from_json, insert_questions, insert_test, selection_settings
+from models import Test
+
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 500
+MAX_ITEM_CHARS = 16 * 1024 * 1024
+
+_WHITESPACE = ' \t\r\n'
+
+
+class _StreamReader:
+    # Инкрементальный разбор JSON: в памяти держится только текущий элемент,
+    # а не весь документ.
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._json = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        if self._eof:
+            return False
+
+        chunk = self._stream.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            text = self._decoder.decode(b'', final=True)
+        elif isinstance(chunk, str):
+            text = chunk
+        else:
+            text = self._decoder.decode(chunk)
+
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+
+        if len(self._buf) > MAX_ITEM_CHARS:
+            raise ValueError('Слишком большой элемент в JSON-файле.')
+        return True
+
+    def peek(self):
+        while True:
+            buf = self._buf
+            pos = self._pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill():
+                return ''
+
+    def _next_char(self):
+        ch = self.peek()
+        if not ch:
+            raise ValueError('Неожиданный конец JSON-файла.')
+        self._pos += 1
+        return ch
+
+    def expect(self, expected):
+        ch = self._next_char()
+        if ch != expected:
+            raise ValueError(f"Ожидался символ '{expected}', получен '{ch}'.")
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self._json.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+
+            # Число на границе чанка могло быть обрезано.
+            if end == len(self._buf) and not self._eof and self._fill():
+                continue
+
+            self._pos = end
+            return obj
+
+    def members(self):
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError('Ключ JSON-объекта должен быть строкой.')
+            self.expect(':')
+            yield key
+
+            ch = self._next_char()
+            if ch == '}':
+                return
+            if ch != ',':
+                raise ValueError(f"Ожидался символ ',' или '}}', получен '{ch}'.")
+
+    def elements(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+
+        while True:
+            yield
+
+            ch = self._next_char()
+            if ch == ']':
+                return
+            if ch != ',':
+                raise ValueError(f"Ожидался символ ',' или ']', получен '{ch}'.")
+
+
+class StreamingImporter:
+    # Поддерживаемые формы файла: один тест (как data/test.json),
+    # массив тестов или JSON Lines (по тесту на строку).
+
+    def __init__(self, session, batch_size=BATCH_SIZE, progress=None):
+        self.session = session
+        self.batch_size = batch_size
+        self.progress = progress
+        self.imported = []
+
+    def run(self, stream):
+        reader = _StreamReader(stream)
+        ch = reader.peek()
+
+        if ch == '[':
+            for _ in reader.elements():
+                self._import_test(reader)
+        elif ch == '{':
+            while reader.peek() == '{':
+                self._import_test(reader)
+        else:
+            raise ValueError('JSON имеет неверную структуру (ожидался тест или список тестов).')
+
+        if reader.peek():
+            raise ValueError('Лишние данные после конца JSON.')
+
+        return self.imported
+
+    def _import_test(self, reader):
+        if reader.peek() != '{':
+            raise ValueError('Тест должен быть JSON-объектом.')
+
+        header = {}
+        test_id = None
+        written_header = None
+        questions_count = 0
+
+        for key in reader.members():
+            if key != 'questions' or reader.peek() != '[':
+                header[key] = reader.value()
+                continue
+
+            test_id = self._insert_test(header)
+            written_header = dict(header)
+
+            pending = []
+            for _ in reader.elements():
+                pending.append(question_from_json(reader.value()))
+                if len(pending) >= self.batch_size:
+                    questions_count += self._flush(test_id, pending)
+                    self._report(header, questions_count)
+                    pending = []
+
+            if pending:
+                questions_count += self._flush(test_id, pending)
+                self._report(header, questions_count)
+
+        if not header.get('title') or test_id is None or questions_count == 0:
+            raise ValueError('JSON имеет неверную структуру (отсутствует title или questions).')
+
+        selection_settings(header.get('selection_mode'), header.get('draw_count'),
+                           header.get('shuffle_options'), questions_count)
+
+        # Поля теста могли идти в файле после списка вопросов.
+        if header != written_header:
+            self.session.execute(
+                update(Test).where(Test.id == test_id).values(**self._test_values(header))
+            )
+
+        self.imported.append((test_id, header['title'], questions_count))
+
+    def _test_values(self, header):
+        return {
+            'title': header.get('title') or '',
+            'description': header.get('description'),
+            'difficulty': header.get('difficulty', DEFAULT_DIFFICULTY),
+            **selection_settings(header.get('selection_mode'), header.get('draw_count'),
+                                 header.get('shuffle_options')),
+        }
+
+    def _insert_test(self, header):
+        return insert_test(self.session, **self._test_values(header))
+
+    def _flush(self, test_id, questions):
+        return insert_questions(self.session, test_id, questions)
+
+    def _report(self, header, questions_count):
+        if self.progress:
+            self.progress(header.get('title'), questions_count)
+
+
+def import_stream(session, stream, batch_size=BATCH_SIZE, progress=None):
+    return StreamingImporter(session, batch_size=batch_size, progress=progress).run(stream)
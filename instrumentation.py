@@ -0,0 +1,240 @@
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from flask import before_render_template, g, request, template_rendered
+
+from querycount import track_request_queries
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level='INFO', fmt='text'):
+    handler = logging.StreamHandler()
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+class Metrics:
+    # Счётчики и гистограммы в памяти процесса, отдаются в текстовом формате Prometheus.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._gauges = []
+
+    def _declare(self, name, kind, help_text):
+        self._types.setdefault(name, kind)
+        self._help.setdefault(name, help_text)
+
+    def inc(self, name, value=1, help_text='', **labels):
+        with self._lock:
+            self._declare(name, 'counter', help_text)
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, help_text='', **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._declare(name, 'histogram', help_text)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [buckets, [0] * len(buckets), 0, 0.0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[1][i] += 1
+            histogram[2] += 1
+            histogram[3] += value
+
+    def gauge(self, name, help_text, collect):
+        # collect() возвращает число или список пар (метки, значение).
+        self._gauges.append((name, help_text, collect))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            names = sorted(set(self._types))
+            for name in names:
+                lines.append(f'# HELP {name} {self._help[name]}')
+                lines.append(f'# TYPE {name} {self._types[name]}')
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_labels(labels)} {value:g}')
+                for (metric, labels), (buckets, counts, count, total) in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, bucket_count in zip(buckets, counts):
+                        lines.append(f'{name}_bucket{_labels(labels + (("le", f"{bound:g}"),))} {bucket_count}')
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {count}')
+                    lines.append(f'{name}_sum{_labels(labels)} {total:g}')
+                    lines.append(f'{name}_count{_labels(labels)} {count}')
+
+        for name, help_text, collect in self._gauges:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            value = collect()
+            samples = value if isinstance(value, list) else [((), value)]
+            for labels, sample in samples:
+                lines.append(f'{name}{_labels(tuple(labels))} {float(sample or 0):g}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _fold(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+class SamplingProfiler:
+    # Раз в interval секунд снимает стеки потоков, которые обрабатывают запросы,
+    # и копит их по маршрутам. Файлы <маршрут>.folded совместимы с flamegraph.pl
+    # и speedscope.
+
+    def __init__(self, directory, interval=0.005, flush_every=10.0):
+        self.directory = directory
+        self.interval = interval
+        self.flush_every = flush_every
+        self.samples = 0
+        self._active = {}
+        self._stacks = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def enter(self, endpoint):
+        self._active[threading.get_ident()] = endpoint or 'unknown'
+
+    def leave(self):
+        self._active.pop(threading.get_ident(), None)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, endpoint in list(self._active.items()):
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        self._stacks[endpoint][_fold(frame)] += 1
+                        self.samples += 1
+            if time.monotonic() - last_flush >= self.flush_every:
+                self.flush()
+                last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            snapshot = {endpoint: dict(stacks) for endpoint, stacks in self._stacks.items()}
+        for endpoint, stacks in snapshot.items():
+            path = os.path.join(self.directory, f'{endpoint}.folded')
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in sorted(stacks.items()):
+                    f.write(f'{stack} {count}\n')
+
+
+def install_instrumentation(app, engine, metrics, profiler=None):
+    track_request_queries(engine)
+    cookie_name = app.config.get('SESSION_COOKIE_NAME', 'session')
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.render_time = 0.0
+        if profiler:
+            profiler.enter(request.endpoint)
+
+    @before_render_template.connect_via(app)
+    def start_render_timer(sender, template, context, **extra):
+        g.render_started = time.perf_counter()
+
+    @template_rendered.connect_via(app)
+    def stop_render_timer(sender, template, context, **extra):
+        started = g.pop('render_started', None)
+        if started is not None:
+            g.render_time = g.get('render_time', 0.0) + time.perf_counter() - started
+
+    @app.after_request
+    def record_request_metrics(response):
+        endpoint = request.endpoint or 'unknown'
+        elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+
+        cookie_size = len(request.cookies.get(cookie_name, ''))
+        for header in response.headers.getlist('Set-Cookie'):
+            if header.startswith(cookie_name + '='):
+                cookie_size = len(header.split(';', 1)[0]) - len(cookie_name) - 1
+
+        metrics.inc('http_requests_total', help_text='Обработано HTTP-запросов.',
+                    endpoint=endpoint, method=request.method, status=response.status_code)
+        metrics.observe('http_request_duration_seconds', elapsed, help_text='Время обработки запроса.',
+                        endpoint=endpoint)
+        metrics.inc('sql_queries_total', g.get('query_count', 0), help_text='SQL-запросов, выполненных в запросах.',
+                    endpoint=endpoint)
+        metrics.inc('sql_query_seconds_total', g.get('query_time', 0.0),
+                    help_text='Суммарное время SQL-запросов.', endpoint=endpoint)
+        metrics.inc('template_render_seconds_total', g.get('render_time', 0.0),
+                    help_text='Суммарное время рендеринга шаблонов.', endpoint=endpoint)
+        metrics.observe('session_cookie_bytes', cookie_size, buckets=SIZE_BUCKETS,
+                        help_text='Размер cookie сессии.', endpoint=endpoint)
+
+        app.logger.debug('Запрос обработан', extra={'fields': {
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 2),
+            'sql_queries': g.get('query_count', 0),
+            'sql_ms': round(g.get('query_time', 0.0) * 1000, 2),
+            'render_ms': round(g.get('render_time', 0.0) * 1000, 2),
+            'cookie_bytes': cookie_size,
+        }})
+        return response
+
+    if profiler:
+        @app.teardown_request
+        def stop_profiling(exc):
+            profiler.leave()
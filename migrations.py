@@ -0,0 +1,265 @@
+from sqlalchemy import inspect, text
+
+import search
+from models import db
+from shards import result_shards
+
+
+def _create_results_indexes(conn):
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_results_test_date ON results (test_id, date_completed)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_results_test_score ON results (test_id, score)'))
+
+
+def _drop_results_indexes(conn):
+    conn.execute(text('DROP INDEX IF EXISTS ix_results_test_date'))
+    conn.execute(text('DROP INDEX IF EXISTS ix_results_test_score'))
+
+
+def _drop_columns(conn, table, *names):
+    columns = {c['name'] for c in inspect(conn).get_columns(table)}
+    for name in names:
+        if name in columns:
+            conn.execute(text(f'ALTER TABLE {table} DROP COLUMN {name}'))
+
+
+def _add_attempts_served_at(conn):
+    columns = {c['name'] for c in inspect(conn).get_columns('attempts')}
+    if 'served_at' not in columns:
+        conn.execute(text('ALTER TABLE attempts ADD COLUMN served_at FLOAT'))
+
+
+def _add_tests_archive_columns(conn):
+    columns = {c['name'] for c in inspect(conn).get_columns('tests')}
+    if 'archived_at' not in columns:
+        conn.execute(text('ALTER TABLE tests ADD COLUMN archived_at TIMESTAMP'))
+    if 'purge_pending' not in columns:
+        conn.execute(text('ALTER TABLE tests ADD COLUMN purge_pending BOOLEAN NOT NULL DEFAULT FALSE'))
+
+
+def _drop_attempts_served_at(conn):
+    _drop_columns(conn, 'attempts', 'served_at')
+
+
+def _drop_tests_archive_columns(conn):
+    _drop_columns(conn, 'tests', 'archived_at', 'purge_pending')
+
+
+def _backfill_user_test_summaries(conn):
+    conn.execute(text('''
+        INSERT INTO user_test_summaries
+            (user_id, test_id, attempts, best_score, last_score, last_attempt_at, total_questions)
+        SELECT r.user_id, r.test_id, COUNT(*), MAX(r.score),
+               (SELECT r2.score FROM results r2
+                 WHERE r2.user_id = r.user_id AND r2.test_id = r.test_id
+                 ORDER BY r2.date_completed DESC, r2.id DESC LIMIT 1),
+               MAX(r.date_completed),
+               (SELECT COUNT(*) FROM questions q WHERE q.test_id = r.test_id)
+        FROM results r
+        WHERE NOT EXISTS (SELECT 1 FROM user_test_summaries s
+                           WHERE s.user_id = r.user_id AND s.test_id = r.test_id)
+        GROUP BY r.user_id, r.test_id
+    '''))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_results_user_date ON results (user_id, date_completed)'))
+
+
+def _drop_results_user_index(conn):
+    # Сводки остаются: их продолжает обновлять запись результата.
+    conn.execute(text('DROP INDEX IF EXISTS ix_results_user_date'))
+
+
+def _add_selection_columns(conn):
+    columns = {c['name'] for c in inspect(conn).get_columns('tests')}
+    if 'selection_mode' not in columns:
+        conn.execute(text("ALTER TABLE tests ADD COLUMN selection_mode VARCHAR(20) NOT NULL DEFAULT 'fixed'"))
+    if 'draw_count' not in columns:
+        conn.execute(text('ALTER TABLE tests ADD COLUMN draw_count INTEGER'))
+    if 'shuffle_options' not in columns:
+        conn.execute(text('ALTER TABLE tests ADD COLUMN shuffle_options BOOLEAN NOT NULL DEFAULT FALSE'))
+
+    for table in ('attempts', 'results'):
+        if 'seed' not in {c['name'] for c in inspect(conn).get_columns(table)}:
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN seed INTEGER'))
+
+
+def _drop_selection_columns(conn):
+    _drop_columns(conn, 'tests', 'selection_mode', 'draw_count', 'shuffle_options')
+    _drop_columns(conn, 'attempts', 'seed')
+    _drop_columns(conn, 'results', 'seed')
+
+
+def _add_attempts_deadline(conn):
+    columns = {c['name'] for c in inspect(conn).get_columns('attempts')}
+    if 'deadline' not in columns:
+        conn.execute(text('ALTER TABLE attempts ADD COLUMN deadline FLOAT'))
+
+
+def _drop_attempts_deadline(conn):
+    _drop_columns(conn, 'attempts', 'deadline')
+
+
+def _install_search(conn):
+    search.install(conn)
+
+
+def _uninstall_search(conn):
+    search.uninstall(conn)
+
+
+# Индексы для выборок по внешним ключам: вопросы теста (компиляция,
+# выгрузка, число вопросов в профиле) и варианты вопроса; id в конце индекса
+# отдает строки в порядке ORDER BY id. Индексы answers нужны фоновому
+# удалению: без них проверка ON DELETE для каждого удаляемого вопроса и
+# варианта просматривает всю таблицу ответов. tests (difficulty, id) —
+# фильтр каталога по сложности.
+LOOKUP_INDEXES = [
+    ('ix_questions_test_id', 'questions', 'test_id, id'),
+    ('ix_options_question_id', 'options', 'question_id, id'),
+    ('ix_user_test_summaries_test', 'user_test_summaries', 'test_id'),
+    ('ix_answers_question', 'answers', 'question_id'),
+    ('ix_answers_option', 'answers', 'option_id'),
+    ('ix_tests_difficulty', 'tests', 'difficulty, id'),
+]
+
+
+def _create_lookup_indexes(conn):
+    for name, table, columns in LOOKUP_INDEXES:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})'))
+
+
+def _drop_lookup_indexes(conn):
+    for name, _, _ in LOOKUP_INDEXES:
+        conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+
+
+# Хеши scrypt (162 символа) и pbkdf2:sha512 (167) не помещаются в 128.
+# SQLite длину VARCHAR не проверяет, менять тип нужно только в PostgreSQL.
+# Откат упадет, если в таблице уже есть более длинные хеши.
+def _widen_password_hash(conn):
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text('ALTER TABLE users ALTER COLUMN password_hash TYPE VARCHAR(255)'))
+
+
+def _narrow_password_hash(conn):
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text('ALTER TABLE users ALTER COLUMN password_hash TYPE VARCHAR(128)'))
+
+
+def _result_stores(conn):
+    # Основная БД и, при RESULT_SHARDS, каждый шард (в своей транзакции).
+    yield conn
+    if result_shards.sharded:
+        for engine in result_shards.engines():
+            with engine.begin() as shard:
+                yield shard
+
+
+def _add_results_total_questions(conn):
+    # Старые результаты получают draw_count теста или, без него, число
+    # вопросов теста на момент миграции.
+    asked = [{'test_id': test_id, 'asked': asked} for test_id, asked in conn.execute(text(
+        'SELECT t.id, COALESCE(t.draw_count, (SELECT COUNT(*) FROM questions q WHERE q.test_id = t.id)) '
+        'FROM tests t'
+    ))]
+    for target in _result_stores(conn):
+        tables = set(inspect(target).get_table_names())
+        for table in ('results', 'results_archive'):
+            if table not in tables:
+                continue
+            columns = {c['name'] for c in inspect(target).get_columns(table)}
+            if 'total_questions' not in columns:
+                target.execute(text(f'ALTER TABLE {table} ADD COLUMN total_questions INTEGER'))
+            if asked:
+                target.execute(text(f'UPDATE {table} SET total_questions = :asked '
+                                    f'WHERE test_id = :test_id AND total_questions IS NULL'), asked)
+
+
+def _drop_results_total_questions(conn):
+    for target in _result_stores(conn):
+        tables = set(inspect(target).get_table_names())
+        for table in ('results', 'results_archive'):
+            if table in tables:
+                _drop_columns(target, table, 'total_questions')
+
+
+def _add_tests_claim_columns(conn):
+    columns = {c['name'] for c in inspect(conn).get_columns('tests')}
+    if 'claimed_by' not in columns:
+        conn.execute(text('ALTER TABLE tests ADD COLUMN claimed_by VARCHAR(64)'))
+    if 'claimed_at' not in columns:
+        conn.execute(text('ALTER TABLE tests ADD COLUMN claimed_at TIMESTAMP'))
+
+
+def _drop_tests_claim_columns(conn):
+    _drop_columns(conn, 'tests', 'claimed_by', 'claimed_at')
+
+
+# (версия, описание, применение, откат); откат None — миграция необратима.
+MIGRATIONS = [
+    (1, 'results: индексы по (test_id, date_completed) и (test_id, score)',
+     _create_results_indexes, _drop_results_indexes),
+    (2, 'attempts: время показа текущего вопроса', _add_attempts_served_at, _drop_attempts_served_at),
+    (3, 'tests: архивирование и фоновое удаление', _add_tests_archive_columns, _drop_tests_archive_columns),
+    (4, 'user_test_summaries: заполнение по истории results',
+     _backfill_user_test_summaries, _drop_results_user_index),
+    (5, 'tests/attempts/results: режим выбора вопросов и seed попытки',
+     _add_selection_columns, _drop_selection_columns),
+    (6, 'attempts: срок завершения попытки', _add_attempts_deadline, _drop_attempts_deadline),
+    (7, 'полнотекстовый поиск по тестам и вопросам', _install_search, _uninstall_search),
+    (8, 'индексы questions, options, user_test_summaries, answers, tests',
+     _create_lookup_indexes, _drop_lookup_indexes),
+    (9, 'users: password_hash до 255 символов', _widen_password_hash, _narrow_password_hash),
+    (10, 'results/results_archive: число заданных вопросов (и в шардах)',
+     _add_results_total_questions, _drop_results_total_questions),
+    (11, 'tests: захват фоновой архивации/удаления процессом', _add_tests_claim_columns, _drop_tests_claim_columns),
+]
+
+
+def current_version(conn):
+    conn.execute(text('CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, name TEXT NOT NULL)'))
+    return conn.execute(text('SELECT COALESCE(MAX(version), 0) FROM schema_migrations')).scalar()
+
+
+def latest_version():
+    return MIGRATIONS[-1][0]
+
+
+def status():
+    with db.engine.begin() as conn:
+        version = current_version(conn)
+    return [(number, name, number <= version) for number, name, _, _ in MIGRATIONS]
+
+
+def upgrade(target=None):
+    # Каждая миграция — в своей транзакции: при ошибке схема остается на
+    # последней успешно примененной версии.
+    target = latest_version() if target is None else target
+    applied = []
+    with db.engine.begin() as conn:
+        version = current_version(conn)
+    for number, name, migrate, _ in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        with db.engine.begin() as conn:
+            migrate(conn)
+            conn.execute(text('INSERT INTO schema_migrations (version, name) VALUES (:version, :name)'),
+                         {'version': number, 'name': name})
+        applied.append((number, name))
+    return applied
+
+
+def downgrade(target):
+    with db.engine.begin() as conn:
+        version = current_version(conn)
+
+    pending = [m for m in reversed(MIGRATIONS) if target < m[0] <= version]
+    irreversible = [number for number, _, _, revert in pending if revert is None]
+    if irreversible:
+        raise RuntimeError(f'Миграции {irreversible} нельзя откатить.')
+
+    reverted = []
+    for number, name, _, revert in pending:
+        with db.engine.begin() as conn:
+            revert(conn)
+            conn.execute(text('DELETE FROM schema_migrations WHERE version = :version'), {'version': number})
+        reverted.append((number, name))
+    return reverted
@@ -6,45 +6,152 @@ class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
     results = db.relationship('Result', backref='user', lazy=True) 
 
 class Test(db.Model):
     __tablename__ = 'tests'
+    __table_args__ = (
+        db.Index('ix_tests_difficulty', 'difficulty', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     
     difficulty = db.Column(db.String(50), default='Средний')
+    archived_at = db.Column(db.DateTime)
+    purge_pending = db.Column(db.Boolean, default=False, nullable=False)
+    # Процесс, выполняющий фоновую архивацию или удаление, см. deletion.claim_job.
+    claimed_by = db.Column(db.String(64))
+    claimed_at = db.Column(db.DateTime)
+
+    # Выбор вопросов попытки, см. selection.py.
+    selection_mode = db.Column(db.String(20), default='fixed', nullable=False)
+    draw_count = db.Column(db.Integer)
+    shuffle_options = db.Column(db.Boolean, default=False, nullable=False)
     
-    questions = db.relationship('Question', backref='test', lazy=True)
+    questions = db.relationship('Question', backref='test', lazy=True,
+                                cascade='all, delete-orphan', passive_deletes=True)
 
 class Question(db.Model):
     __tablename__ = 'questions'
+    __table_args__ = (
+        db.Index('ix_questions_test_id', 'test_id', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    test_id = db.Column(db.Integer, db.ForeignKey('tests.id'), nullable=False) 
+    test_id = db.Column(db.Integer, db.ForeignKey('tests.id', ondelete='CASCADE'), nullable=False) 
     text = db.Column(db.Text, nullable=False)
     type = db.Column(db.String(50)) 
     
     difficulty = db.Column(db.String(50), default='Средний')
     time_limit_sec = db.Column(db.Integer, default=60)
 
-    options = db.relationship('Option', backref='question', lazy='joined')
+    options = db.relationship('Option', backref='question', lazy='joined',
+                              cascade='all, delete-orphan', passive_deletes=True)
 
 class Option(db.Model):
     __tablename__ = 'options'
+    __table_args__ = (
+        db.Index('ix_options_question_id', 'question_id', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id', ondelete='CASCADE'), nullable=False)
     text = db.Column(db.String(255), nullable=False)
     is_correct = db.Column(db.Boolean, default=False) 
 
 class Result(db.Model):
     __tablename__ = 'results'
+    __table_args__ = (
+        db.Index('ix_results_test_date', 'test_id', 'date_completed'),
+        db.Index('ix_results_test_score', 'test_id', 'score'),
+        db.Index('ix_results_user_date', 'user_id', 'date_completed'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    test_id = db.Column(db.Integer, db.ForeignKey('tests.id'), nullable=False)
+    test_id = db.Column(db.Integer, db.ForeignKey('tests.id', ondelete='CASCADE'), nullable=False)
     score = db.Column(db.Integer)
+    # Число заданных в попытке вопросов (при draw_count меньше числа вопросов теста).
+    total_questions = db.Column(db.Integer)
     date_completed = db.Column(db.DateTime, default=db.func.now())
+    seed = db.Column(db.Integer)
     
     test = db.relationship('Test')
+
+class ResultArchive(db.Model):
+    __tablename__ = 'results_archive'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    test_id = db.Column(db.Integer, nullable=False, index=True)
+    score = db.Column(db.Integer)
+    total_questions = db.Column(db.Integer)
+    date_completed = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=db.func.now())
+
+class Attempt(db.Model):
+    __tablename__ = 'attempts'
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    test_id = db.Column(db.Integer, db.ForeignKey('tests.id', ondelete='CASCADE'), nullable=False)
+    question_ids = db.Column(db.Text, nullable=False)
+    current_q_index = db.Column(db.Integer, default=0, nullable=False)
+    score = db.Column(db.Integer, default=0, nullable=False)
+    total_questions = db.Column(db.Integer, nullable=False)
+    served_at = db.Column(db.Float)
+    seed = db.Column(db.Integer)
+    deadline = db.Column(db.Float)
+    updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
+
+class Answer(db.Model):
+    __tablename__ = 'answers'
+    __table_args__ = (
+        db.Index('ix_answers_test_question', 'test_id', 'question_id'),
+        db.Index('ix_answers_question', 'question_id'),
+        db.Index('ix_answers_option', 'option_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    attempt_id = db.Column(db.String(32), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    test_id = db.Column(db.Integer, db.ForeignKey('tests.id', ondelete='CASCADE'), nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id', ondelete='CASCADE'), nullable=False)
+    option_id = db.Column(db.Integer, db.ForeignKey('options.id', ondelete='SET NULL'))
+    is_correct = db.Column(db.Boolean, nullable=False)
+    time_taken_ms = db.Column(db.Integer)
+    answered_at = db.Column(db.DateTime, default=db.func.now())
+
+class QuestionStat(db.Model):
+    __tablename__ = 'question_stats'
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True)
+    answers = db.Column(db.Integer, default=0, nullable=False)
+    correct = db.Column(db.Integer, default=0, nullable=False)
+    timed_answers = db.Column(db.Integer, default=0, nullable=False)
+    total_time_ms = db.Column(db.BigInteger, default=0, nullable=False)
+
+    @property
+    def p_value(self):
+        return self.correct / self.answers if self.answers else None
+
+    @property
+    def mean_time_sec(self):
+        return self.total_time_ms / self.timed_answers / 1000 if self.timed_answers else None
+
+class OptionStat(db.Model):
+    __tablename__ = 'option_stats'
+    option_id = db.Column(db.Integer, db.ForeignKey('options.id', ondelete='CASCADE'), primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id', ondelete='CASCADE'), nullable=False, index=True)
+    picks = db.Column(db.Integer, default=0, nullable=False)
+
+class UserTestSummary(db.Model):
+    __tablename__ = 'user_test_summaries'
+    __table_args__ = (
+        db.Index('ix_user_test_summaries_test', 'test_id'),
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    test_id = db.Column(db.Integer, db.ForeignKey('tests.id', ondelete='CASCADE'), primary_key=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    best_score = db.Column(db.Integer)
+    last_score = db.Column(db.Integer)
+    last_attempt_at = db.Column(db.DateTime)
+    total_questions = db.Column(db.Integer)
+
+    test = db.relationship('Test')
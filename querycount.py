@@ -0,0 +1,79 @@
+import time
+from contextlib import contextmanager
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        self.parameters = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        self.parameters.append(parameters)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+@contextmanager
+def assert_max_queries(engine, limit):
+    with QueryCounter(engine) as counter:
+        yield counter
+    if counter.count > limit:
+        raise QueryBudgetExceeded(
+            f'Выполнено {counter.count} SQL-запросов при лимите {limit}:\n' + '\n'.join(counter.statements)
+        )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context():
+        g.query_count = g.get('query_count', 0) + 1
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    if started is not None and has_app_context():
+        g.query_time = g.get('query_time', 0.0) + time.perf_counter() - started
+
+
+def track_request_queries(engine):
+    # Число и время SQL-запросов текущего HTTP-запроса попадают в g.query_count
+    # и g.query_time. Повторный вызов ничего не меняет.
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def install_query_budgets(app, engine, budgets, enforce=False):
+    # Сверяет число SQL-запросов каждого HTTP-запроса с бюджетом маршрута.
+    # Превышение пишется в лог; ошибкой оно становится только при enforce
+    # в тестовом режиме (app.testing), чтобы не отдавать 500 в продакшене.
+    track_request_queries(engine)
+
+    @app.after_request
+    def check_query_budget(response):
+        budget = budgets.get(request.endpoint)
+        used = g.get('query_count', 0)
+        if budget is not None and used > budget:
+            message = f'{request.endpoint}: {used} SQL-запросов при бюджете {budget}'
+            if enforce and app.testing:
+                raise QueryBudgetExceeded(message)
+            app.logger.warning(message)
+        return response
@@ -0,0 +1,278 @@
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import func, literal, select, text
+
+from models import db, Test
+
+SearchHit = namedtuple('SearchHit', 'id title description difficulty matches')
+SearchPage = namedtuple('SearchPage', 'tests facets page has_next')
+
+MAX_TERMS = 8
+
+_TERM = re.compile(r'[^\W_]+')
+
+# Веса полей при ранжировании: совпадение в названии важнее описания,
+# описание — важнее текста вопроса.
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 3.0
+
+# SQLite: обычные (не external content) таблицы FTS5, чтобы хранить текст
+# с заменой ё -> е; unicode61 сам приводит кириллицу к нижнему регистру.
+_SQLITE_FOLD = "replace(replace(coalesce({}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+SQLITE_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tests_fts USING fts5("
+    "title, description, tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5("
+    "text, tokenize = 'unicode61 remove_diacritics 2')",
+
+    f"""CREATE TRIGGER IF NOT EXISTS tests_fts_ai AFTER INSERT ON tests BEGIN
+        INSERT INTO tests_fts (rowid, title, description)
+        VALUES (new.id, {_SQLITE_FOLD.format('new.title')}, {_SQLITE_FOLD.format('new.description')});
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tests_fts_ad AFTER DELETE ON tests BEGIN
+        DELETE FROM tests_fts WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tests_fts_au AFTER UPDATE OF title, description ON tests BEGIN
+        UPDATE tests_fts SET title = {_SQLITE_FOLD.format('new.title')},
+                             description = {_SQLITE_FOLD.format('new.description')}
+        WHERE rowid = new.id;
+    END""",
+
+    f"""CREATE TRIGGER IF NOT EXISTS questions_fts_ai AFTER INSERT ON questions BEGIN
+        INSERT INTO questions_fts (rowid, text) VALUES (new.id, {_SQLITE_FOLD.format('new.text')});
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS questions_fts_ad AFTER DELETE ON questions BEGIN
+        DELETE FROM questions_fts WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS questions_fts_au AFTER UPDATE OF text ON questions BEGIN
+        UPDATE questions_fts SET text = {_SQLITE_FOLD.format('new.text')} WHERE rowid = new.id;
+    END""",
+]
+
+SQLITE_REBUILD = [
+    'DELETE FROM tests_fts',
+    f"INSERT INTO tests_fts (rowid, title, description) "
+    f"SELECT id, {_SQLITE_FOLD.format('title')}, {_SQLITE_FOLD.format('description')} FROM tests",
+    'DELETE FROM questions_fts',
+    f"INSERT INTO questions_fts (rowid, text) SELECT id, {_SQLITE_FOLD.format('text')} FROM questions",
+]
+
+# PostgreSQL: вычисляемые столбцы tsvector с GIN-индексами; стемминг —
+# словарь russian, веса A/B/C соответствуют TITLE/DESCRIPTION/вопросу.
+_PG_FOLD = "translate(coalesce({}, ''), 'Ёё', 'Ее')"
+
+POSTGRES_SCHEMA = [
+    f"""ALTER TABLE tests ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', {_PG_FOLD.format('title')}), 'A') ||
+        setweight(to_tsvector('russian', {_PG_FOLD.format('description')}), 'B')
+    ) STORED""",
+    'CREATE INDEX IF NOT EXISTS ix_tests_search ON tests USING GIN (search_vector)',
+    f"""ALTER TABLE questions ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', {_PG_FOLD.format('text')}), 'C')
+    ) STORED""",
+    'CREATE INDEX IF NOT EXISTS ix_questions_search ON questions USING GIN (search_vector)',
+]
+
+
+def install(conn):
+    if conn.dialect.name == 'sqlite':
+        for statement in SQLITE_SCHEMA + SQLITE_REBUILD:
+            conn.execute(text(statement))
+    elif conn.dialect.name == 'postgresql':
+        for statement in POSTGRES_SCHEMA:
+            conn.execute(text(statement))
+    else:
+        raise RuntimeError(f'Полнотекстовый поиск не поддерживается для {conn.dialect.name}.')
+
+
+def uninstall(conn):
+    if conn.dialect.name == 'sqlite':
+        for table in ('tests', 'questions'):
+            for suffix in ('ai', 'ad', 'au'):
+                conn.execute(text(f'DROP TRIGGER IF EXISTS {table}_fts_{suffix}'))
+            conn.execute(text(f'DROP TABLE IF EXISTS {table}_fts'))
+    elif conn.dialect.name == 'postgresql':
+        for table in ('tests', 'questions'):
+            conn.execute(text(f'DROP INDEX IF EXISTS ix_{table}_search'))
+            conn.execute(text(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector'))
+
+
+def terms(query):
+    # Слова запроса без синтаксиса FTS: каждое ищется как префикс, все
+    # слова должны встретиться (И).
+    return _TERM.findall((query or '').lower().replace('ё', 'е'))[:MAX_TERMS]
+
+
+def _sqlite_candidates():
+    return f'''
+        WITH test_hits AS MATERIALIZED (
+            SELECT rowid AS test_id, bm25(tests_fts, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}) AS rank
+            FROM tests_fts WHERE tests_fts MATCH :match
+        ),
+        question_hits AS MATERIALIZED (
+            SELECT q.test_id, COUNT(*) AS matches FROM questions q
+            WHERE q.id IN (SELECT rowid FROM questions_fts WHERE questions_fts MATCH :match)
+            GROUP BY q.test_id
+        ),
+        candidates AS (
+            SELECT test_id FROM test_hits UNION SELECT test_id FROM question_hits
+        )
+        SELECT t.id, t.difficulty, th.rank, COALESCE(qh.matches, 0)
+        FROM candidates c
+        JOIN tests t ON t.id = c.test_id
+        LEFT JOIN test_hits th ON th.test_id = c.test_id
+        LEFT JOIN question_hits qh ON qh.test_id = c.test_id
+        WHERE t.archived_at IS NULL
+    '''
+
+
+def _postgres_candidates():
+    # ts_rank растет с релевантностью, а сортировка общая с bm25 (меньше —
+    # лучше), поэтому знак меняется.
+    return '''
+        WITH query AS (SELECT to_tsquery('russian', :match) AS q),
+        test_hits AS MATERIALIZED (
+            SELECT t.id AS test_id, -ts_rank(t.search_vector, query.q) AS rank
+            FROM tests t, query WHERE t.search_vector @@ query.q
+        ),
+        question_hits AS MATERIALIZED (
+            SELECT qs.test_id, COUNT(*) AS matches
+            FROM questions qs, query WHERE qs.search_vector @@ query.q
+            GROUP BY qs.test_id
+        ),
+        candidates AS (
+            SELECT test_id FROM test_hits UNION SELECT test_id FROM question_hits
+        )
+        SELECT t.id, t.difficulty, th.rank, COALESCE(qh.matches, 0)
+        FROM candidates c
+        JOIN tests t ON t.id = c.test_id
+        LEFT JOIN test_hits th ON th.test_id = c.test_id
+        LEFT JOIN question_hits qh ON qh.test_id = c.test_id
+        WHERE t.archived_at IS NULL
+    '''
+
+
+def _match_expression(dialect, words):
+    if dialect == 'postgresql':
+        return ' & '.join(f'{word}:*' for word in words)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _facets(rows):
+    counts = {}
+    for row in rows:
+        counts[row[1]] = counts.get(row[1], 0) + 1
+    return tuple(sorted(counts.items(), key=lambda item: item[0] or ''))
+
+
+class CandidateCache:
+    # Кандидаты последних запросов: листание страниц и смена фильтра по
+    # сложности не повторяют полнотекстовый поиск. Ключ включает версию
+    # каталога, поэтому после create/import/delete записи перестают находиться.
+    # Версия у каждого процесса своя: изменения, сделанные другими процессами,
+    # видны по истечении ttl.
+
+    def __init__(self, max_entries=128, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and (self.ttl is None or now - cached[0] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        rows = loader()
+
+        with self._lock:
+            self._entries[key] = (now, rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return rows
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+def _candidates(words):
+    dialect = db.session.get_bind().dialect.name
+    candidates = _postgres_candidates() if dialect == 'postgresql' else _sqlite_candidates()
+    return tuple(tuple(row) for row in
+                 db.session.execute(text(candidates), {'match': _match_expression(dialect, words)}))
+
+
+def _ranked(words, difficulty, page, limit, cache=None, version=None):
+    # Кандидаты — лёгкие строки (id, сложность, ранг, число вопросов);
+    # фасеты, сортировка и страница считаются по ним, а название и описание
+    # читаются только для тестов страницы.
+    if cache is None:
+        rows = _candidates(words)
+    else:
+        rows = cache.get((version, tuple(words)), lambda: _candidates(words))
+    facets = _facets(rows)
+
+    rows = [row for row in rows if not difficulty or row[1] == difficulty]
+    # Сначала совпадения в названии и описании по рангу, затем тесты, где
+    # слова нашлись только в вопросах, — по числу таких вопросов.
+    rows.sort(key=lambda row: (row[2] is None, row[2] or 0, -row[3], row[0]))
+    page_rows = rows[(page - 1) * limit:page * limit]
+
+    details = {}
+    if page_rows:
+        details = {
+            row.id: row for row in db.session.execute(
+                select(Test.id, Test.title, Test.description, Test.difficulty)
+                .where(Test.id.in_([row[0] for row in page_rows]))
+            )
+        }
+
+    tests = tuple(
+        SearchHit(test_id, details[test_id].title, details[test_id].description, test_difficulty, matches)
+        for test_id, test_difficulty, _, matches in page_rows if test_id in details
+    )
+    return SearchPage(tests, facets, page, len(rows) > page * limit)
+
+
+def _filtered(difficulty, page, limit):
+    stmt = (
+        select(Test.id, Test.title, Test.description, Test.difficulty, literal(0))
+        .where(Test.archived_at.is_(None))
+        .order_by(Test.id)
+        .offset((page - 1) * limit)
+        .limit(limit + 1)
+    )
+    if difficulty:
+        stmt = stmt.where(Test.difficulty == difficulty)
+    rows = db.session.execute(stmt).all()
+
+    facets = db.session.execute(
+        select(Test.difficulty, func.count())
+        .where(Test.archived_at.is_(None))
+        .group_by(Test.difficulty)
+        .order_by(Test.difficulty)
+    ).all()
+
+    tests = tuple(SearchHit(*row) for row in rows[:limit])
+    return SearchPage(tests, tuple((name, count) for name, count in facets), page, len(rows) > limit)
+
+
+def search(query, difficulty=None, page=1, limit=50, cache=None, version=None):
+    words = terms(query)
+    page = max(page, 1)
+    if words:
+        return _ranked(words, difficulty, page, limit, cache, version)
+    return _filtered(difficulty, page, limit)
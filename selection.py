@@ -0,0 +1,119 @@
+import random
+import secrets
+from array import array
+
+MODES = ('fixed', 'shuffle', 'stratified', 'adaptive')
+DIFFICULTY_ORDER = ('Легкий', 'Средний', 'Сложный')
+
+# Сколько случайных попыток сделать, прежде чем перебрать уровень целиком.
+_ADAPTIVE_PROBES = 8
+
+
+def new_seed():
+    return secrets.randbits(31)
+
+
+def attempt_rng(seed, *salt):
+    # Отдельный поток случайных чисел на каждый шаг попытки: повтор по seed
+    # не зависит от того, сколько чисел потратили предыдущие шаги.
+    return random.Random(':'.join(str(part) for part in (seed,) + salt))
+
+
+def build_pools(questions):
+    # id вопросов по уровням сложности в компактных массивах; уровни
+    # упорядочены от лёгкого к сложному, незнакомые — в конце по алфавиту.
+    by_level = {}
+    for question in questions:
+        by_level.setdefault(question.difficulty or '', []).append(question.id)
+
+    known = [level for level in DIFFICULTY_ORDER if level in by_level]
+    other = sorted(level for level in by_level if level not in DIFFICULTY_ORDER)
+    levels = tuple(known + other)
+    return levels, {level: array('q', by_level[level]) for level in levels}
+
+
+def _allocate(pool_sizes, count):
+    # Метод наибольших остатков: доли уровней в выборке как в банке вопросов.
+    total = sum(pool_sizes)
+    quotas = [count * size / total for size in pool_sizes]
+    shares = [int(quota) for quota in quotas]
+    by_remainder = sorted(range(len(quotas)), key=lambda i: quotas[i] - shares[i], reverse=True)
+    for i in by_remainder[:count - sum(shares)]:
+        shares[i] += 1
+    return shares
+
+
+def draw(compiled, seed):
+    # Список вопросов попытки; для adaptive — только первый, остальные
+    # выбирает next_adaptive по ходу ответов.
+    rng = attempt_rng(seed, 'draw')
+    question_ids = compiled.question_ids
+    count = compiled.draw_count
+
+    if compiled.mode == 'fixed':
+        return list(question_ids[:count])
+
+    if compiled.mode == 'shuffle':
+        return rng.sample(question_ids, count)
+
+    if compiled.mode == 'stratified':
+        pools = [compiled.pools[level] for level in compiled.levels]
+        drawn = []
+        for pool, share in zip(pools, _allocate([len(pool) for pool in pools], count)):
+            drawn.extend(rng.sample(pool, share))
+        rng.shuffle(drawn)
+        return drawn
+
+    if compiled.mode == 'adaptive':
+        start = compiled.levels[(len(compiled.levels) - 1) // 2]
+        return [_pick(compiled, rng, start, ())]
+
+    raise ValueError(f'Неизвестный режим выбора вопросов: {compiled.mode}')
+
+
+def _pick(compiled, rng, level, served):
+    # Ближайший к level уровень, где остались непоказанные вопросы.
+    levels = compiled.levels
+    target = levels.index(level)
+    for distance in range(len(levels)):
+        for index in (target + distance, target - distance):
+            if not 0 <= index < len(levels):
+                continue
+            pool = compiled.pools[levels[index]]
+            for _ in range(_ADAPTIVE_PROBES):
+                candidate = pool[rng.randrange(len(pool))]
+                if candidate not in served:
+                    return candidate
+            remaining = [q_id for q_id in pool if q_id not in served]
+            if remaining:
+                return rng.choice(remaining)
+    return None
+
+
+def next_adaptive(compiled, seed, served, last_correct):
+    # Уровень сложности: после верного ответа на ступень выше, после
+    # неверного — на ступень ниже последнего показанного вопроса.
+    levels = compiled.levels
+    last = compiled.questions.get(served[-1]) if served else None
+    index = levels.index(last.difficulty or '') if last else (len(levels) - 1) // 2
+    index = min(index + 1, len(levels) - 1) if last_correct else max(index - 1, 0)
+    return _pick(compiled, attempt_rng(seed, 'step', len(served)), levels[index], frozenset(served))
+
+
+def replay(compiled, seed, outcomes):
+    # Восстанавливает последовательность вопросов попытки по seed и
+    # верности ответов (например, из таблицы answers) — для проверки.
+    served = draw(compiled, seed)
+    if compiled.mode != 'adaptive':
+        return served
+    for correct in outcomes[:compiled.draw_count - 1]:
+        served.append(next_adaptive(compiled, seed, served, correct))
+    return served
+
+
+def option_order(compiled, question, seed):
+    if not compiled.shuffle_options:
+        return question.options
+    options = list(question.options)
+    attempt_rng(seed, 'options', question.id).shuffle(options)
+    return tuple(options)
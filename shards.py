@@ -0,0 +1,160 @@
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import Column, Index, MetaData, Table, create_engine, delete, func, insert, select, true
+
+from config import engine_options
+from db_engine import configure_sqlite
+from models import db, Answer, Result, ResultArchive
+from querycount import track_request_queries
+
+SHARDED_TABLES = (Result.__table__, ResultArchive.__table__, Answer.__table__)
+
+
+def _shard_metadata():
+    # Копии таблиц без внешних ключей: пользователи, тесты и вопросы остаются
+    # в основной БД, и шард не может на них ссылаться.
+    metadata = MetaData()
+    for table in SHARDED_TABLES:
+        copy = Table(table.name, metadata, *[
+            Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+            for column in table.columns
+        ])
+        for index in table.indexes:
+            Index(index.name, *[copy.c[column.name] for column in index.columns], unique=index.unique)
+    return metadata
+
+
+class ShardRouter:
+    # Результаты, их архив и ответы теста N лежат в шарде N % число_шардов;
+    # определения тестов, пользователи, сводки и счётчики — в основной БД.
+    # Без RESULT_SHARDS единственный шард — основная БД.
+
+    def __init__(self):
+        self.urls = []
+        self.config = {}
+        self._engines = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.urls = list(app.config.get('RESULT_SHARDS') or [])
+        self.config = app.config
+        self._engines = None
+
+    @property
+    def sharded(self):
+        return bool(self.urls)
+
+    @property
+    def count(self):
+        return len(self.urls) or 1
+
+    def _create_engine(self, url):
+        engine = create_engine(url, **engine_options(url))
+        configure_sqlite(engine, self.config)
+        track_request_queries(engine)
+        return engine
+
+    def engines(self):
+        if not self.urls:
+            return [db.engine]
+        with self._lock:
+            if self._engines is None:
+                self._engines = [self._create_engine(url) for url in self.urls]
+            return self._engines
+
+    def index_for(self, test_id):
+        return test_id % self.count
+
+    def engine_for(self, test_id):
+        return self.engines()[self.index_for(test_id)]
+
+    def split(self, rows):
+        # [(движок шарда, строки)]; без шардов — [(None, rows)], т. е. запись
+        # в основную БД вместе с остальными изменениями.
+        if not self.urls:
+            return [(None, rows)]
+        groups = {}
+        for row in rows:
+            groups.setdefault(self.index_for(row['test_id']), []).append(row)
+        return [(self.engines()[index], group) for index, group in sorted(groups.items())]
+
+    @contextmanager
+    def begin(self, test_id):
+        # Без шардов — соединение db.session: запись фиксируется вместе с
+        # остальной транзакцией запроса при db.session.commit().
+        if not self.urls:
+            yield db.session.connection()
+            return
+        with self.engine_for(test_id).begin() as conn:
+            yield conn
+
+    @contextmanager
+    def connect(self, test_id):
+        if not self.urls:
+            yield db.session.connection()
+            return
+        with self.engine_for(test_id).connect() as conn:
+            yield conn
+
+    def fan_out(self, stmt):
+        # Один и тот же запрос во все шарды по очереди; строки объединяются.
+        if not self.urls:
+            return db.session.execute(stmt).all()
+        rows = []
+        for engine in self.engines():
+            with engine.connect() as conn:
+                rows.extend(conn.execute(stmt).all())
+        return rows
+
+    def create_all(self):
+        if not self.urls:
+            return
+        metadata = _shard_metadata()
+        for engine in self.engines():
+            metadata.create_all(engine)
+
+    def status(self):
+        # [(url, {таблица: строк})]
+        report = []
+        sources = list(zip(self.urls, self.engines())) if self.urls else [('основная БД', db.engine)]
+        for url, engine in sources:
+            with engine.connect() as conn:
+                report.append((url, {
+                    table.name: conn.execute(select(func.count()).select_from(table)).scalar()
+                    for table in SHARDED_TABLES
+                }))
+        return report
+
+    def rebalance(self, batch_size=500):
+        # Переносит строки из основной БД и из чужих шардов туда, где им место
+        # при текущем RESULT_SHARDS. Строки получают новые id; пачка сначала
+        # фиксируется в целевом шарде, затем удаляется из источника, поэтому
+        # сбой между этими шагами может задвоить одну пачку.
+        if not self.urls:
+            raise RuntimeError('RESULT_SHARDS не задан: все результаты хранятся в основной БД.')
+
+        self.create_all()
+        sources = [(None, db.engine)] + list(enumerate(self.engines()))
+        moved = {}
+        for table in SHARDED_TABLES:
+            for index, source in sources:
+                misplaced = true() if index is None else (table.c.test_id % self.count) != index
+                while True:
+                    with source.begin() as conn:
+                        rows = conn.execute(
+                            select(table).where(misplaced).order_by(table.c.id).limit(batch_size)
+                        ).mappings().all()
+                        if not rows:
+                            break
+                        for engine, group in self.split([dict(row) for row in rows]):
+                            for row in group:
+                                del row['id']
+                            with engine.begin() as target:
+                                target.execute(insert(table), group)
+                        conn.execute(delete(table).where(table.c.id.in_([row['id'] for row in rows])))
+                    moved[table.name] = moved.get(table.name, 0) + len(rows)
+        return moved
+
+
+result_shards = ShardRouter()
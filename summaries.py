@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, case, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import joinedload
+
+from models import db, Result, Test, UserTestSummary
+from analytics import RESULT_COLUMNS, ResultRow
+from shards import result_shards
+
+
+def record_result(user_id, test_id, score, total_questions, completed_at=None):
+    # Без шардов вызывается в той же транзакции, что и вставка Result.
+    # Один INSERT ... ON CONFLICT DO UPDATE: две первые попытки одного
+    # пользователя, завершенные одновременно, не столкнутся на первичном ключе.
+    completed_at = completed_at or datetime.now(timezone.utc).replace(tzinfo=None)
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    stmt = dialect.insert(UserTestSummary).values(
+        user_id=user_id,
+        test_id=test_id,
+        attempts=1,
+        best_score=score,
+        last_score=score,
+        last_attempt_at=completed_at,
+        total_questions=total_questions,
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[UserTestSummary.user_id, UserTestSummary.test_id],
+        set_={
+            'attempts': UserTestSummary.attempts + 1,
+            'best_score': case((UserTestSummary.best_score >= score, UserTestSummary.best_score), else_=score),
+            'last_score': score,
+            'last_attempt_at': completed_at,
+            'total_questions': total_questions,
+        },
+    ))
+
+
+def user_summaries(user_id):
+    return (
+        UserTestSummary.query
+        .options(joinedload(UserTestSummary.test))
+        .filter(UserTestSummary.user_id == user_id)
+        .order_by(UserTestSummary.last_attempt_at.desc())
+        .all()
+    )
+
+
+def _encode_cursor(row):
+    # test_id в курсоре: строки приходят из разных шардов, а пара
+    # (test_id, id) уникальна, потому что тест целиком лежит в одном шарде.
+    return f'{row.date_completed.isoformat()}_{row.test_id}_{row.id}'
+
+
+def _decode_cursor(cursor):
+    try:
+        stamp, test_id, result_id = cursor.rsplit('_', 2)
+        return datetime.fromisoformat(stamp), int(test_id), int(result_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def user_results_page(user_id, before=None, limit=50, tests=None):
+    stmt = select(*RESULT_COLUMNS).where(Result.user_id == user_id)
+
+    cursor = _decode_cursor(before) if before else None
+    if cursor:
+        stamp, test_id, result_id = cursor
+        stmt = stmt.where(or_(
+            Result.date_completed < stamp,
+            and_(Result.date_completed == stamp, or_(
+                Result.test_id < test_id,
+                and_(Result.test_id == test_id, Result.id < result_id),
+            )),
+        ))
+
+    # Каждый шард отдает свою первую страницу, слияние — по тому же ключу.
+    order = (Result.date_completed.desc(), Result.test_id.desc(), Result.id.desc())
+    rows = sorted(result_shards.fan_out(stmt.order_by(*order).limit(limit + 1)),
+                  key=lambda row: (row.date_completed, row.test_id, row.id), reverse=True)
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    rows = rows[:limit]
+
+    # Тесты обычно уже загружены со сводками пользователя (tests).
+    tests = dict(tests or {})
+    missing = {row.test_id for row in rows} - set(tests)
+    if missing:
+        tests.update((test.id, test) for test in Test.query.filter(Test.id.in_(missing)))
+    return [ResultRow(*row, user=None, test=tests.get(row.test_id)) for row in rows], next_cursor
+
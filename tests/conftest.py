@@ -0,0 +1,70 @@
+# Общая тестовая база (SQLite во временном каталоге), импортированный тест
+# из data/test.json и хранилища попыток.
+
+import io
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp, 'tests.db')
+os.environ['JINJA_CACHE_DIR'] = os.path.join(_tmp, 'jinja_cache')
+os.environ['PASSWORD_HASH_WORKERS'] = '0'
+os.environ.pop('RESULT_SHARDS', None)
+os.environ.pop('ATTEMPT_STORE', None)
+
+import app as app_module  # noqa: E402
+import migrations  # noqa: E402
+import models  # noqa: E402
+from attempts import make_attempt_store  # noqa: E402
+from models import db, User  # noqa: E402
+
+STORES = ['memory', 'sql', 'redis']
+
+
+def login(client, username, password):
+    response = client.post('/login', data={'username': username, 'password': password})
+    assert response.status_code == 302 and response.location.endswith('/')
+
+
+def register(client, username):
+    response = client.post('/register', data={'username': username, 'password': 'secret'})
+    assert response.status_code == 302
+    login(client, username, 'secret')
+
+
+@pytest.fixture(scope='session')
+def test_id():
+    app = app_module.app
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        migrations.upgrade()
+        db.session.add(User(username='admin', password_hash=app_module.password_hasher.hash('admin'),
+                            is_admin=True))
+        db.session.commit()
+
+    client = app.test_client()
+    login(client, 'admin', 'admin')
+    with open(os.path.join(ROOT, 'data', 'test.json'), encoding='utf-8') as f:
+        data = f.read().encode()
+    response = client.post('/admin/import_test', data={'file': (io.BytesIO(data), 'test.json')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+
+    with app.app_context():
+        title = json.loads(data)['title']
+        return db.session.query(models.Test.id).filter(models.Test.title == title).scalar()
+
+
+@pytest.fixture(params=STORES)
+def store(request, monkeypatch):
+    monkeypatch.setattr(app_module, 'attempts',
+                        make_attempt_store(dict(app_module.app.config, ATTEMPT_STORE=request.param)))
+    return request.param
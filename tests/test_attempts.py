@@ -0,0 +1,102 @@
+# Ответ засчитывается один раз: повторная или параллельная отправка той же
+# формы не сдвигает попытку на следующий вопрос.
+
+import threading
+
+import pytest
+
+from attempts import StaleAnswer
+from conftest import app_module, register
+
+
+def test_concurrent_answers_count_once(test_id, store):
+    app = app_module.app
+    with app.app_context():
+        attempt_id = app_module.attempts.create(1, test_id, [1, 2, 3])
+
+    barrier = threading.Barrier(2)
+    outcomes = []
+
+    def answer():
+        with app.app_context():
+            barrier.wait()
+            try:
+                app_module.attempts.record_answer(attempt_id, 0, True)
+                outcomes.append('recorded')
+            except StaleAnswer:
+                outcomes.append('stale')
+
+    threads = [threading.Thread(target=answer) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(outcomes) == ['recorded', 'stale']
+    with app.app_context():
+        progress = app_module.attempts.get(attempt_id)
+    assert (progress['current_q_index'], progress['score']) == (1, 1)
+
+
+def test_resubmitted_answer_is_not_scored(test_id, store):
+    client = app_module.app.test_client()
+    register(client, f'resubmit_{store}')
+    client.get(f'/test/start/{test_id}')
+    assert client.get('/test/question').status_code == 200
+
+    with client.session_transaction() as s:
+        attempt_id = s['attempt_id']
+    with app_module.app.app_context():
+        progress = app_module.attempts.get(attempt_id)
+        compiled = app_module.compiled_tests.get(test_id)
+    correct = next(iter(compiled.answer_key[progress['question_id']]))
+
+    for _ in range(2):
+        response = client.post('/test/answer', data={'option': correct, 'q_index': 0})
+        assert response.status_code == 302 and response.location.endswith('/test/question')
+
+    with app_module.app.app_context():
+        progress = app_module.attempts.get(attempt_id)
+    assert (progress['current_q_index'], progress['score']) == (1, 1)
+
+
+def test_stale_index_is_rejected(test_id, store):
+    with app_module.app.app_context():
+        attempt_id = app_module.attempts.create(1, test_id, [1, 2])
+        app_module.attempts.record_answer(attempt_id, 0, False)
+        with pytest.raises(StaleAnswer):
+            app_module.attempts.record_answer(attempt_id, 0, True)
+        assert app_module.attempts.record_answer('missing', 0, True) is None
+
+
+def test_sweeper_purges_stale_sql_attempts(test_id, monkeypatch):
+    import time
+    from datetime import datetime, timedelta, timezone
+
+    from sqlalchemy import update
+
+    from attempts import SQLAttemptStore
+    from deadlines import DeadlineSweeper
+    from models import db, Attempt
+
+    app = app_module.app
+    store = SQLAttemptStore()
+    monkeypatch.setattr(app_module, 'attempts', store)
+    with app.app_context():
+        stale = store.create(1, test_id, [1, 2])
+        fresh = store.create(1, test_id, [1, 2])
+        long_ago = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=app.config['ATTEMPT_TTL'] + 60)
+        db.session.execute(update(Attempt).where(Attempt.id == stale).values(updated_at=long_ago))
+        db.session.commit()
+
+    sweeper = DeadlineSweeper(app, lambda key: False)
+    sweeper.every(60, app_module.purge_stale_attempts)
+    sweeper.stop()
+    sweeper.run_jobs()
+    with app.app_context():
+        assert store.get(stale) is not None
+    sweeper.run_jobs(now=time.monotonic() + 60)
+
+    with app.app_context():
+        assert store.get(stale) is None
+        assert store.get(fresh) is not None
@@ -0,0 +1,61 @@
+# Фоновая архивация, когда resume() вызывают сразу несколько процессов.
+
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert, select, update
+
+from conftest import app_module
+import models
+from deletion import DeletionWorker, claim_job, hide_test, release_claim
+from models import db, Result, ResultArchive, User
+
+
+def test_concurrent_resume_archives_once(test_id):
+    with app_module.app.app_context():
+        user_id = db.session.query(User.id).filter(User.username == 'admin').scalar()
+        archived_id = db.session.execute(
+            insert(models.Test).values(title='В архив').returning(models.Test.id)
+        ).scalar_one()
+        db.session.execute(insert(Result), [
+            {'user_id': user_id, 'test_id': archived_id, 'score': n % 3, 'total_questions': 3,
+             'date_completed': datetime(2026, 1, 1)}
+            for n in range(200)
+        ])
+        db.session.commit()
+        hide_test(archived_id, purge=False)
+
+    workers = [DeletionWorker(app_module.app, batch_size=5, pause=0) for _ in range(2)]
+    barrier = threading.Barrier(len(workers))
+
+    def resume(worker):
+        barrier.wait()
+        worker.resume()
+
+    threads = [threading.Thread(target=resume, args=(worker,)) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for worker in workers:
+        worker.join()
+
+    assert [worker.failed for worker in workers] == [0, 0]
+    assert sum(worker.completed for worker in workers) == 1
+    with app_module.app.app_context():
+        assert db.session.scalar(select(func.count()).where(Result.test_id == archived_id)) == 0
+        assert db.session.scalar(select(func.count()).where(ResultArchive.test_id == archived_id)) == 200
+        assert db.session.scalar(select(models.Test.claimed_by).where(models.Test.id == archived_id)) is None
+
+
+def test_claim_of_crashed_worker_expires(test_id):
+    with app_module.app.app_context():
+        assert claim_job(test_id, 'crashed', lease=60)
+        assert not claim_job(test_id, 'alive', lease=60)
+        db.session.execute(
+            update(models.Test).where(models.Test.id == test_id)
+            .values(claimed_at=datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=61))
+        )
+        db.session.commit()
+        assert claim_job(test_id, 'alive', lease=60)
+        release_claim(test_id, 'alive')
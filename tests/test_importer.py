@@ -0,0 +1,42 @@
+# Потоковый импорт: вопросы пачки — одна вставка, варианты попадают к
+# своим вопросам (на SQLite id читаются обратно, см. drafts._inserted_question_ids).
+
+import io
+import json
+
+from sqlalchemy import event, select
+
+from conftest import app_module
+from importer import import_stream
+from models import db, Option, Question, Test
+
+
+def test_import_inserts_questions_per_batch():
+    questions = [{'text': f'Вопрос {i}', 'options': [f'ответ {i}', 'нет'], 'correct_option_index': 0}
+                 for i in range(120)]
+    data = json.dumps({'title': 'Пачки', 'questions': questions})
+
+    statements = []
+
+    def count_inserts(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('INSERT INTO QUESTIONS'):
+            statements.append(statement)
+
+    with app_module.app.app_context():
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', count_inserts)
+        try:
+            import_stream(db.session, io.StringIO(data), batch_size=50)
+            db.session.commit()
+        finally:
+            event.remove(engine, 'before_cursor_execute', count_inserts)
+
+        assert len(statements) == 3
+        rows = db.session.execute(
+            select(Question.text, Option.text)
+            .join(Option, Option.question_id == Question.id)
+            .join(Test, Test.id == Question.test_id)
+            .where(Test.title == 'Пачки', Option.is_correct.is_(True))
+        ).all()
+    assert len(rows) == 120
+    assert all(q_text.split()[-1] == o_text.split()[-1] for q_text, o_text in rows)
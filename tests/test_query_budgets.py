@@ -0,0 +1,112 @@
+# Бюджеты SQL-запросов маршрутов (config.query_budgets) для каждого
+# хранилища попыток: прохождение теста, профиль и страницы администратора.
+#
+#   python -m pytest -q tests
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+import config
+from conftest import app_module, login, register
+import models
+from models import db, Result, User, UserTestSummary
+from querycount import assert_max_queries
+
+
+def request_within_budget(client, budgets, endpoint, url, method='GET', data=None):
+    with app_module.app.app_context():
+        engine = db.engine
+    with assert_max_queries(engine, budgets[endpoint]) as counter:
+        response = client.open(url, method=method, data=data)
+    assert response.status_code in (200, 302), (endpoint, response.status_code)
+    return response, counter.count
+
+
+def current_options(client):
+    with client.session_transaction() as s:
+        attempt_id = s['attempt_id']
+    with app_module.app.app_context():
+        progress = app_module.attempts.get(attempt_id)
+        compiled = app_module.compiled_tests.get(progress['test_id'])
+        return [option.id for option in compiled.questions[progress['question_id']].options]
+
+
+def test_take_test_within_budget(test_id, store):
+    budgets = config.query_budgets(store)
+    client = app_module.app.test_client()
+    register(client, f'taker_{store}')
+
+    request_within_budget(client, budgets, 'index', '/')
+    response, _ = request_within_budget(client, budgets, 'test_start', f'/test/start/{test_id}')
+    assert response.location.endswith('/test/question')
+
+    # Вопросы до перехода на страницу результата.
+    for _ in range(100):
+        response, _ = request_within_budget(client, budgets, 'test_question', '/test/question')
+        if response.status_code != 200:
+            break
+        option_id = current_options(client)[0]
+        request_within_budget(client, budgets, 'test_answer', '/test/answer', method='POST',
+                              data={'option': option_id})
+    else:
+        pytest.fail('попытка не завершилась')
+
+    request_within_budget(client, budgets, 'profile', '/profile')
+
+
+def test_admin_pages_within_budget(test_id):
+    budgets = config.query_budgets(config.ATTEMPT_STORE)
+    client = app_module.app.test_client()
+    login(client, 'admin', 'admin')
+
+    request_within_budget(client, budgets, 'test_results', f'/admin/test_results/{test_id}')
+    request_within_budget(client, budgets, 'question_stats', f'/admin/question_stats/{test_id}')
+
+
+def seed_results(user_id, tests, per_test):
+    # per_test результатов в каждом из tests новых тестов, со сводками профиля.
+    with app_module.app.app_context():
+        test_ids = [
+            db.session.execute(
+                insert(models.Test).values(title=f'История {user_id}-{i}').returning(models.Test.id)
+            ).scalar_one()
+            for i in range(tests)
+        ]
+        started = datetime(2026, 1, 1)
+        db.session.execute(insert(Result), [
+            {'user_id': user_id, 'test_id': test_id, 'score': n % 3, 'total_questions': 3,
+             'date_completed': started + timedelta(minutes=len(test_ids) * n + i)}
+            for i, test_id in enumerate(test_ids) for n in range(per_test)
+        ])
+        db.session.execute(insert(UserTestSummary), [
+            {'user_id': user_id, 'test_id': test_id, 'attempts': per_test, 'best_score': 2, 'last_score': 1,
+             'last_attempt_at': started, 'total_questions': 3}
+            for test_id in test_ids
+        ])
+        db.session.commit()
+
+
+def test_profile_queries_do_not_grow_with_history(test_id):
+    # Число запросов профиля не зависит ни от числа результатов, ни от
+    # числа разных тестов в истории (N и 10·N).
+    budgets = config.query_budgets(config.ATTEMPT_STORE)
+    client = app_module.app.test_client()
+    register(client, 'history')
+    with app_module.app.app_context():
+        user_id = db.session.query(User.id).filter(User.username == 'history').scalar()
+
+    seed_results(user_id, tests=3, per_test=2)
+    response, small = request_within_budget(client, budgets, 'profile', '/profile')
+    assert response.get_data(as_text=True).count('class="result-item"') == 3 + 6
+    seed_results(user_id, tests=27, per_test=2)
+    response, large = request_within_budget(client, budgets, 'profile', '/profile')
+    assert response.get_data(as_text=True).count('class="result-item"') == 30 + config.RESULTS_PAGE_SIZE
+    assert large == small
+
+
+def test_profile_budget_grows_with_shards():
+    # История попыток в профиле — по запросу в каждый шард.
+    assert config.query_budgets('memory', 4)['profile'] == config.QUERY_BUDGETS['profile'] + 3
+    assert config.query_budgets('memory', 4)['test_results'] == config.QUERY_BUDGETS['test_results']
@@ -0,0 +1,64 @@
+# Процент результата считается от числа заданных вопросов, а не от числа
+# вопросов теста: при draw_count попытка короче банка вопросов.
+
+import io
+import json
+
+from conftest import app_module, login, register
+from models import db, Test
+
+
+def import_drawn_test(client):
+    questions = [{'text': f'Вопрос {i}', 'options': ['да', 'нет'], 'correct_option_index': 0}
+                 for i in range(10)]
+    data = json.dumps({'title': 'Выборка 2 из 10', 'draw_count': 2, 'selection_mode': 'shuffle',
+                       'questions': questions})
+    response = client.post('/admin/import_test', data={'file': (io.BytesIO(data.encode()), 'drawn.json')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+    with app_module.app.app_context():
+        return db.session.query(Test.id).filter(Test.title == 'Выборка 2 из 10').scalar()
+
+
+def test_score_uses_questions_asked(test_id):
+    admin = app_module.app.test_client()
+    login(admin, 'admin', 'admin')
+    drawn_id = import_drawn_test(admin)
+
+    client = app_module.app.test_client()
+    register(client, 'drawn_taker')
+    client.get(f'/test/start/{drawn_id}')
+    for _ in range(2):
+        assert client.get('/test/question').status_code == 200
+        with client.session_transaction() as s:
+            attempt_id = s['attempt_id']
+        with app_module.app.app_context():
+            progress = app_module.attempts.get(attempt_id)
+            compiled = app_module.compiled_tests.get(drawn_id)
+        correct = next(iter(compiled.answer_key[progress['question_id']]))
+        client.post('/test/answer', data={'option': correct, 'q_index': progress['current_q_index']})
+
+    profile = client.get('/profile').get_data(as_text=True)
+    assert 'Результат: 2 из 2' in profile and '(100.0%)' in profile
+
+    page = admin.get(f'/admin/test_results/{drawn_id}').get_data(as_text=True)
+    assert '2 / 2' in page and '2 / 10' not in page
+    assert 'class="pass"' in page
+
+    stats = admin.get(f'/admin/test_analytics/{drawn_id}').get_json()
+    assert stats['histogram'] == [{'score': 2, 'total_questions': 2, 'count': 1}]
+
+
+def test_record_result_upserts_summary(test_id):
+    import summaries
+    from models import User, UserTestSummary
+
+    with app_module.app.app_context():
+        db.session.add(User(username='summary', password_hash='-'))
+        db.session.commit()
+        user_id = db.session.query(User.id).filter(User.username == 'summary').scalar()
+        for score in (2, 1):
+            summaries.record_result(user_id, test_id, score, 2)
+            db.session.commit()
+        summary = db.session.get(UserTestSummary, (user_id, test_id))
+        assert (summary.attempts, summary.best_score, summary.last_score) == (2, 2, 1)
@@ -0,0 +1,86 @@
+import hashlib
+import os
+
+from flask import make_response, request
+from jinja2 import FileSystemBytecodeCache
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def install_bytecode_cache(app, directory):
+    # Скомпилированные шаблоны хранятся на диске и переживают перезапуск
+    # процессов; запись привязана к контрольной сумме исходника шаблона.
+    # Вызывается до первого обращения к app.jinja_env.
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(directory))
+
+
+def warm_templates(app):
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+
+
+class Assets:
+    # Отпечатки файлов static/ и шаблонов считаются один раз при старте.
+    # url_for('static') добавляет ?v=<отпечаток>: такой ответ браузеры и прокси
+    # кэшируют навсегда, а новый файл получает новый адрес. version меняется
+    # вместе с любым шаблоном или файлом static/ и входит в ETag страниц.
+
+    def __init__(self, app):
+        self.static = {}
+        for root, _, files in os.walk(app.static_folder):
+            for name in files:
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, app.static_folder).replace(os.sep, '/')
+                self.static[filename] = _file_digest(path)[:12]
+
+        digest = hashlib.sha256()
+        for filename, fingerprint in sorted(self.static.items()):
+            digest.update(f'{filename}:{fingerprint}\n'.encode('utf-8'))
+        template_folder = os.path.join(app.root_path, app.template_folder)
+        for root, _, files in os.walk(template_folder):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                digest.update(f'{os.path.relpath(path, template_folder)}:{_file_digest(path)}\n'.encode('utf-8'))
+        self.version = digest.hexdigest()[:12]
+
+        app.url_defaults(self._add_fingerprint)
+        app.after_request(self._static_headers)
+
+    def _add_fingerprint(self, endpoint, values):
+        if endpoint == 'static' and 'v' not in values:
+            fingerprint = self.static.get(values.get('filename'))
+            if fingerprint:
+                values['v'] = fingerprint
+
+    def _static_headers(self, response):
+        if request.endpoint == 'static' and response.status_code in (200, 304):
+            filename = (request.view_args or {}).get('filename')
+            if filename and request.args.get('v') == self.static.get(filename):
+                response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+
+def content_etag(*parts):
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()[:32]
+
+
+def conditional_response(etag, render, private=True):
+    # ETag считается по данным страницы до рендеринга: при совпадении с
+    # If-None-Match шаблон не рендерится, клиент получает пустой 304.
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = ('private' if private else 'public') + ', no-cache'
+    response.vary.add('Cookie')
+    return response
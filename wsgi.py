@@ -0,0 +1,6 @@
+# Точка входа для gunicorn (см. gunicorn.conf.py): схема БД готовится до
+# запуска процессов командой init-db, здесь — только фоновые задачи процесса.
+from app import app, start_background
+
+start_background()
+application = app